@@ -0,0 +1,294 @@
+"""
+Bounded alert store.
+
+Alerts live newest-first in a deque of fixed capacity with an id index, so
+adding, evicting and acknowledging are O(1). An alert is identified by its
+(key, oid, condition) key, where key names what the alert is about (a
+device id, not its display name, so renames don't orphan the alert):
+while it is active, raising the same key again only bumps its count and
+lastSeen instead of adding a new alert. The key is released by clear()
+(the condition went back to normal), after which the next raise opens a
+new alert. New alerts are rate limited per key with a token bucket.
+
+With a database path, every new or changed alert is also written (in
+batches, from a worker thread) to SQLite for paged history queries.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from metrics import Counter, Gauge
+
+ALERT_CAPACITY = int(os.getenv("NMS_ALERT_CAPACITY", "500"))
+ALERT_RATE_LIMIT = float(os.getenv("NMS_ALERT_RATE_LIMIT", "10"))      # new alerts per source ...
+ALERT_RATE_WINDOW = float(os.getenv("NMS_ALERT_RATE_WINDOW", "60"))    # ... per this many seconds
+ALERTS_DB_PATH = os.getenv(
+    "NMS_ALERTS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "alerts.db")
+)
+FLUSH_INTERVAL = 2.0
+
+ALERTS_RAISED = Counter("nms_alerts_raised_total", "New alerts opened", ("severity",))
+ALERTS_REPEATED = Counter("nms_alerts_repeated_total", "Occurrences folded into an already active alert")
+ALERTS_SUPPRESSED = Counter("nms_alerts_suppressed_total", "New alerts dropped by the per-source rate limit")
+ALERTS_ACTIVE = Gauge("nms_alerts_active", "Alerts whose condition hasn't cleared")
+HISTORY_RETENTION = 90 * 86400
+
+# Columns persisted for every alert (same names as the Alert model)
+FIELDS = ("id", "timestamp", "lastSeen", "severity", "source", "message", "oid", "condition",
+          "count", "acknowledged", "cleared")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    lastSeen TEXT,
+    severity TEXT NOT NULL,
+    source TEXT NOT NULL,
+    message TEXT NOT NULL,
+    oid TEXT,
+    condition TEXT,
+    count INTEGER NOT NULL,
+    acknowledged INTEGER NOT NULL,
+    cleared INTEGER NOT NULL,
+    created REAL NOT NULL           -- epoch seconds, for ordering and retention
+);
+CREATE INDEX IF NOT EXISTS alerts_created ON alerts (created);
+CREATE INDEX IF NOT EXISTS alerts_source ON alerts (source, created);
+"""
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+
+
+class AlertStore:
+    def __init__(self, capacity=ALERT_CAPACITY, rate_limit=ALERT_RATE_LIMIT,
+                 rate_window=ALERT_RATE_WINDOW, db_path=ALERTS_DB_PATH):
+        self.capacity = capacity
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._alerts = deque()      # newest first
+        self._by_id = {}
+        self._active = {}           # (key, oid, condition) -> alert
+        self._keys = {}             # id -> (key, oid, condition) the alert was raised under
+        self._unacked = {}          # severity -> unacknowledged alerts in the ring
+        self._buckets = {}          # source -> TokenBucket
+        self.suppressed = {}        # source -> new alerts dropped by the rate limit
+
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._dirty = {}            # id -> row waiting to be written
+        self._created = {}          # id -> epoch seconds
+        self._task = None
+        ALERTS_ACTIVE.set_function(lambda: len(self._active))
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def __iter__(self):
+        return iter(list(self._alerts))
+
+    def get(self, alert_id):
+        return self._by_id.get(alert_id)
+
+    def active(self, key, oid, condition):
+        return self._active.get((key, oid, condition))
+
+    def unacknowledged(self, severity):
+        return self._unacked.get(severity, 0)
+
+    # ---------- writes ----------
+
+    def _allow(self, source, now):
+        """Takes a token from source's bucket"""
+        if not self.rate_limit:
+            return True
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            bucket = self._buckets[source] = TokenBucket(self.rate_limit, now)
+        bucket.tokens = min(self.rate_limit,
+                            bucket.tokens + (now - bucket.updated) * self.rate_limit / self.rate_window)
+        bucket.updated = now
+        if bucket.tokens < 1:
+            self.suppressed[source] = self.suppressed.get(source, 0) + 1
+            ALERTS_SUPPRESSED.inc()
+            return False
+        bucket.tokens -= 1
+        return True
+
+    def raise_alert(self, make_alert, source, oid, condition, timestamp, message=None):
+        """
+        Records an occurrence of (source, oid, condition); source is the
+        identity key of the subject (the alert's display source may differ).
+        Returns (alert, is_new): the existing active alert with its count,
+        lastSeen (and message, if given) updated, a new alert from
+        make_alert(), or (None, False) when a new alert is rate limited.
+        """
+        key = (source, oid, condition)
+        alert = self._active.get(key)
+        if alert is not None:
+            alert.count += 1
+            alert.lastSeen = timestamp
+            if message is not None:
+                alert.message = message
+            self._mark(alert)
+            ALERTS_REPEATED.inc()
+            return alert, False
+
+        now = time.monotonic()
+        if not self._allow(source, now):
+            return None, False
+
+        alert = make_alert()
+        if len(self._alerts) >= self.capacity:
+            self._evict(self._alerts.pop())
+        self._alerts.appendleft(alert)
+        self._by_id[alert.id] = alert
+        self._active[key] = alert
+        if not alert.acknowledged:
+            self._unacked[alert.severity] = self._unacked.get(alert.severity, 0) + 1
+        self._created[alert.id] = time.time()
+        self._keys[alert.id] = key
+        self._mark(alert)
+        ALERTS_RAISED.labels(alert.severity).inc()
+        return alert, True
+
+    def _evict(self, alert):
+        self._by_id.pop(alert.id, None)
+        key = self._keys.pop(alert.id, None)
+        if key is not None and self._active.get(key) is alert:
+            del self._active[key]
+        if not alert.acknowledged:
+            self._unacked[alert.severity] -= 1
+        self._created.pop(alert.id, None)
+
+    def clear(self, source, oid, condition):
+        """The condition is back to normal: releases the key. Returns the cleared alert or None"""
+        alert = self._active.pop((source, oid, condition), None)
+        if alert is not None:
+            alert.cleared = True
+            self._mark(alert)
+        return alert
+
+    def clear_source(self, source):
+        """Clears every active alert raised under source (e.g. the device was removed); returns them"""
+        keys = [key for key in self._active if key[0] == source]
+        return [self.clear(*key) for key in keys]
+
+    def acknowledge(self, alert_id):
+        alert = self._by_id.get(alert_id)
+        if alert is not None and not alert.acknowledged:
+            alert.acknowledged = True
+            self._unacked[alert.severity] -= 1
+            self._mark(alert)
+        return alert
+
+    def acknowledge_all(self):
+        """Returns the ids that were acknowledged"""
+        ids = []
+        for alert in self._alerts:
+            if not alert.acknowledged:
+                alert.acknowledged = True
+                self._mark(alert)
+                ids.append(alert.id)
+        self._unacked.clear()
+        return ids
+
+    # ---------- persistence ----------
+
+    def _mark(self, alert):
+        if self.db_path:
+            self._dirty[alert.id] = tuple(getattr(alert, name) for name in FIELDS) + (
+                self._created.get(alert.id, time.time()),)
+
+    def open(self):
+        if self._conn is not None or not self.db_path:
+            return
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    def start(self):
+        self.open()
+        if self._conn is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Alert store error: {e}")
+
+    async def flush(self):
+        """Write changed alerts from a worker thread; returns how many"""
+        if not self._dirty or self._conn is None:
+            return 0
+        # Taken on the loop thread, where _mark adds to it: the worker only sees its own copy
+        rows, self._dirty = list(self._dirty.values()), {}
+        await asyncio.to_thread(self._write, rows)
+        return len(rows)
+
+    def _write(self, rows):
+        columns = FIELDS + ("created",)
+        # The periodic flush and a history query may both be writing
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO alerts ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows)
+            self._conn.execute("DELETE FROM alerts WHERE created < ?", (time.time() - HISTORY_RETENTION,))
+
+    def history(self, limit=50, offset=0, severity=None, source=None):
+        """
+        One page of persisted alerts, newest first.
+        Returns {"total", "alerts"}; empty without a database.
+        """
+        if self._conn is None:
+            return {"total": 0, "alerts": []}
+        where, params = [], []
+        if severity:
+            where.append("severity = ?")
+            params.append(severity)
+        if source:
+            where.append("source = ?")
+            params.append(source)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM alerts {clause}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM alerts {clause} ORDER BY created DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]).fetchall()
+        alerts = []
+        for row in rows:
+            alert = dict(zip(FIELDS, row))
+            alert["acknowledged"] = bool(alert["acknowledged"])
+            alert["cleared"] = bool(alert["cleared"])
+            alerts.append(alert)
+        return {"total": total, "alerts": alerts}
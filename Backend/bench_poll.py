@@ -0,0 +1,237 @@
+"""
+Polling benchmark against a fleet of simulated SNMP agents.
+
+Starts sim_agent.py fleets in a separate process (so their CPU doesn't
+count against the backend), registers every agent as a device and polls
+them all through the backend's own poll path (collect_realtime_once ->
+collect_sample -> SnmpClient with its in-flight limits), round after
+round. The first round is reported separately: it includes the metadata
+walks.
+
+Every comma-separated value of --agents/--interfaces/--loss/--latency
+is combined into one run per combination, so scaling can be read off a
+single report:
+
+    python bench_poll.py --agents 100,1000 --interfaces 8,48 --loss 0,0.02 --output bench.json
+
+Per run it reports devices/sec, p50/p99 poll latency, SNMP PDUs per
+device, CPU time and memory of the backend process, and the latency of
+GET /api/devices with that many devices. With --baseline a previous
+report is compared run by run; the exit code is 1 if a metric got worse
+by more than --threshold percent.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+import psutil
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Compared metrics: (section, key, higher is better)
+COMPARED = (
+    ("warm", "devices_per_sec", True),
+    ("warm", "p50_ms", False),
+    ("warm", "p99_ms", False),
+    ("warm", "pdus_per_device", False),
+    ("process", "cpu_ms_per_poll", False),
+    ("process", "rss_mb", False),
+    ("api", "get_devices_ms", False),
+)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list (0 for an empty one)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _csv(kind):
+    return lambda text: [kind(part) for part in text.split(",") if part]
+
+
+class Fleet:
+    """sim_agent.py fleet running in a child process"""
+
+    def __init__(self, agents, port, interfaces, latency, loss, dead):
+        self.args = [sys.executable, os.path.join(HERE, "sim_agent.py"),
+                     "--agents", str(agents), "--port", str(port), "--interfaces", str(interfaces),
+                     "--latency", str(latency), "--loss", str(loss), "--dead", str(dead)]
+        self.process = None
+
+    async def __aenter__(self):
+        self.process = await asyncio.create_subprocess_exec(*self.args, stdout=asyncio.subprocess.PIPE)
+        line = await asyncio.wait_for(self.process.stdout.readline(), 120)
+        if not line.startswith(b"ready"):
+            raise RuntimeError(f"Agent fleet failed to start: {line!r}")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.process.terminate()
+        await self.process.wait()
+
+
+async def run_one(main, config, rounds, port):
+    """Benchmarks one configuration; returns its report section"""
+    from snmp_utils import get_round_trips, invalidate_metadata
+
+    agents, interfaces = config["agents"], config["interfaces"]
+    dead = int(agents * config["dead"])
+    targets = [f"127.0.0.1:{port + i}" for i in range(agents)]
+    process = psutil.Process()
+
+    async with Fleet(agents, port, interfaces, config["latency"], config["loss"], dead):
+        for target in targets:
+            invalidate_metadata(target)
+            main.devices_store.add(main.Device(id=target, name=target, ip=target))
+
+        async def poll(target):
+            started = time.perf_counter()
+            result = await main.collect_realtime_once(target)
+            return (time.perf_counter() - started) * 1000.0, result["status"] == "Online"
+
+        async def poll_round():
+            pdus = get_round_trips()
+            started = time.perf_counter()
+            results = await asyncio.gather(*[poll(target) for target in targets])
+            elapsed = time.perf_counter() - started
+            latencies = [ms for ms, ok in results if ok]
+            return {
+                "seconds": round(elapsed, 3),
+                "devices_per_sec": round(len(targets) / elapsed, 1),
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "pdus_per_device": round((get_round_trips() - pdus) / len(targets), 2),
+                "failed": len(results) - len(latencies),
+            }
+
+        cold = await poll_round()
+        warm_rounds = []
+        cpu = process.cpu_times()
+        for _ in range(rounds):
+            warm_rounds.append(await poll_round())
+        cpu_after = process.cpu_times()
+        cpu_seconds = (cpu_after.user + cpu_after.system) - (cpu.user + cpu.system)
+
+        api_started = time.perf_counter()
+        api_calls = 20
+        for _ in range(api_calls):
+            await main.get_devices()
+        get_devices_ms = (time.perf_counter() - api_started) * 1000.0 / api_calls
+
+        for target in targets:
+            main.devices_store.remove(target)
+            main.interface_counters.forget(target)
+            invalidate_metadata(target)
+
+    seconds = sum(r["seconds"] for r in warm_rounds)
+    return {
+        "config": {**config, "dead_agents": dead},
+        "cold": cold,
+        "warm": {
+            "rounds": len(warm_rounds),
+            "devices_per_sec": round(len(targets) * len(warm_rounds) / seconds, 1),
+            "p50_ms": round(percentile([r["p50_ms"] for r in warm_rounds], 50), 2),
+            "p99_ms": round(max(r["p99_ms"] for r in warm_rounds), 2),
+            "pdus_per_device": round(sum(r["pdus_per_device"] for r in warm_rounds) / len(warm_rounds), 2),
+            "failed": sum(r["failed"] for r in warm_rounds),
+        },
+        "process": {
+            "cpu_seconds": round(cpu_seconds, 3),
+            "cpu_ms_per_poll": round(cpu_seconds * 1000.0 / (len(targets) * len(warm_rounds)), 3),
+            "cpu_percent": round(100.0 * cpu_seconds / seconds, 1),
+            "rss_mb": round(process.memory_info().rss / 2**20, 1),
+        },
+        "api": {"get_devices_ms": round(get_devices_ms, 2)},
+    }
+
+
+def run_key(run):
+    config = run["config"]
+    return tuple(config[name] for name in ("agents", "interfaces", "loss", "latency", "dead"))
+
+
+def compare(report, baseline, threshold):
+    """Prints the change of every compared metric; returns the regressions"""
+    previous = {run_key(run): run for run in baseline.get("runs", [])}
+    regressions = []
+    for run in report["runs"]:
+        old = previous.get(run_key(run))
+        if old is None:
+            continue
+        print(f"agents={run['config']['agents']} interfaces={run['config']['interfaces']} "
+              f"loss={run['config']['loss']} latency={run['config']['latency']}", file=sys.stderr)
+        for section, key, higher_better in COMPARED:
+            before, after = old.get(section, {}).get(key), run[section][key]
+            if not before:
+                continue
+            change = (after - before) * 100.0 / before
+            worse = -change if higher_better else change
+            flag = "REGRESSION" if worse > threshold else ""
+            print(f"  {section}.{key}: {before} -> {after} ({change:+.1f}%) {flag}", file=sys.stderr)
+            if flag:
+                regressions.append((run_key(run), f"{section}.{key}", change))
+    return regressions
+
+
+async def run_all(args):
+    # main is imported, not started: no poller, trap receiver or ping sweep runs next to the benchmark
+    sys.path.insert(0, HERE)
+    import main
+
+    runs = []
+    for agents, interfaces, loss, latency in itertools.product(args.agents, args.interfaces, args.loss, args.latency):
+        config = {"agents": agents, "interfaces": interfaces, "loss": loss, "latency": latency, "dead": args.dead}
+        print(f"run {config}", file=sys.stderr)
+        runs.append(await run_one(main, config, args.rounds, args.port))
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "rounds": args.rounds,
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SNMP polling against simulated agents")
+    parser.add_argument("--agents", type=_csv(int), default=[100], help="device counts, e.g. 100,1000")
+    parser.add_argument("--interfaces", type=_csv(int), default=[24], help="interfaces per agent")
+    parser.add_argument("--loss", type=_csv(float), default=[0.0], help="fractions of requests dropped")
+    parser.add_argument("--latency", type=_csv(float), default=[0.0], help="agent response delays (seconds)")
+    parser.add_argument("--dead", type=float, default=0.0, help="fraction of agents that never answer")
+    parser.add_argument("--rounds", type=int, default=5, help="warm poll rounds per run")
+    parser.add_argument("--port", type=int, default=16100, help="port of the first agent")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier report to compare with")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed worsening in percent")
+    args = parser.parse_args()
+
+    # The backend reports poll errors with print(); keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run_all(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
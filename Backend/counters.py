@@ -0,0 +1,201 @@
+"""
+Per-interface traffic rates from SNMP octet counters.
+
+Each poll hands in the raw counters of a device as {ifIndex: InterfaceSample}
+(octets with their width: 64 for ifHCIn/OutOctets, 32 for ifIn/OutOctets,
+plus the 32-bit error and discard counters). Rates come from the
+difference to the previous poll of the same interface:
+
+- a counter that went down wrapped around its 2**bits modulus (once; a
+  32-bit counter on a fast link can wrap several times between polls,
+  which is why the 64-bit columns are preferred)
+- sysUpTime going backwards means the agent restarted and every counter
+  started over, so the poll only sets a new baseline
+- the time base is the agent's own sysUpTime when available, so network
+  delay of the response doesn't skew the rate
+- a rate above the interface speed can't be real (a counter reset the
+  agent didn't report) and is dropped as well
+
+The latest rates of every interface of every device stay in memory. For
+top(), each device keeps its interfaces sorted per metric (re-sorted only
+after it was polled again), and the per-device lists are merged lazily,
+so a query costs O(devices + n log devices) instead of sorting every
+interface.
+"""
+import heapq
+import time
+from collections import namedtuple
+from itertools import islice
+
+SPEED_TOLERANCE = 1.1   # accepted rate as a multiple of ifSpeed
+
+# Raw counters of one interface from one poll (error/discard fields may be None)
+InterfaceSample = namedtuple(
+    'InterfaceSample',
+    'in_octets out_octets bits in_errors out_errors in_discards out_discards',
+    defaults=(None, None, None, None))
+
+
+def counter_delta(previous, current, bits):
+    """Increase of a counter between two reads, allowing for one wrap"""
+    if current >= previous:
+        return current - previous
+    return current + (1 << bits) - previous
+
+
+def _event_rate(previous, current, elapsed):
+    """Per-second rate of a 32-bit event counter, or 0 when it isn't served"""
+    if previous is None or current is None:
+        return 0.0
+    return counter_delta(previous, current, 32) / elapsed
+
+
+class InterfaceCounter:
+    """Last read of one interface and the rates it produced"""
+
+    __slots__ = ('sample', 'speed', 'in_bps', 'out_bps', 'in_errors', 'out_errors',
+                 'in_discards', 'out_discards')
+
+    def __init__(self, sample, speed=None):
+        self.sample = sample
+        self.speed = speed          # bps, or None if unknown
+        self.in_bps = None          # None until two consecutive reads
+        self.out_bps = None
+        self.in_errors = 0.0        # per second
+        self.out_errors = 0.0
+        self.in_discards = 0.0
+        self.out_discards = 0.0
+
+    @property
+    def utilization(self):
+        """Busier direction as a percentage of the interface speed"""
+        if not self.speed or self.in_bps is None:
+            return 0.0
+        return max(self.in_bps, self.out_bps) * 100.0 / self.speed
+
+    def to_dict(self):
+        return {
+            "inMbps": round(self.in_bps / 1_000_000, 3) if self.in_bps is not None else None,
+            "outMbps": round(self.out_bps / 1_000_000, 3) if self.out_bps is not None else None,
+            "speedMbps": self.speed / 1_000_000 if self.speed else None,
+            "utilization": round(self.utilization, 2),
+            "inErrors": round(self.in_errors, 3),
+            "outErrors": round(self.out_errors, 3),
+            "inDiscards": round(self.in_discards, 3),
+            "outDiscards": round(self.out_discards, 3),
+        }
+
+
+# Ranking keys of top(); only interfaces with a rate are ranked
+TOP_METRICS = {
+    "in": lambda c: c.in_bps,
+    "out": lambda c: c.out_bps,
+    "total": lambda c: c.in_bps + c.out_bps,
+    "utilization": lambda c: c.utilization,
+    "errors": lambda c: c.in_errors + c.out_errors,
+    "discards": lambda c: c.in_discards + c.out_discards,
+}
+
+
+class DeviceCounters:
+    __slots__ = ('key', 'uptime', 'time', 'interfaces', 'ranked')
+
+    def __init__(self, key):
+        self.key = key
+        self.uptime = None      # sysUpTime of the last read (ticks)
+        self.time = None        # wall clock of the last read
+        self.interfaces = {}    # ifIndex -> InterfaceCounter
+        self.ranked = {}        # metric -> [(value, ifIndex, key)] highest first, until the next read
+
+    def ranking(self, metric):
+        ranked = self.ranked.get(metric)
+        if ranked is None:
+            value = TOP_METRICS[metric]
+            ranked = self.ranked[metric] = sorted(
+                ((value(counter), idx, self.key) for idx, counter in self.interfaces.items()
+                 if counter.in_bps is not None),
+                reverse=True)
+        return ranked
+
+    def totals(self):
+        """(in bps, out bps) summed over interfaces that have a rate"""
+        total_in = total_out = 0.0
+        for counter in self.interfaces.values():
+            if counter.in_bps is not None:
+                total_in += counter.in_bps
+                total_out += counter.out_bps
+        return total_in, total_out
+
+
+class CounterTracker:
+    def __init__(self):
+        self._devices = {}      # key (target) -> DeviceCounters
+
+    def __len__(self):
+        """Number of tracked interfaces"""
+        return sum(len(device.interfaces) for device in self._devices.values())
+
+    def get(self, key):
+        return self._devices.get(key)
+
+    def forget(self, key):
+        self._devices.pop(key, None)
+
+    def update(self, key, samples, uptime=None, speeds=None, now=None):
+        """
+        Records one read of a device's counters ({ifIndex: InterfaceSample}).
+        uptime is sysUpTime in ticks, speeds {ifIndex: bps} bounds the rates.
+        Returns the DeviceCounters with the rates of each interface set
+        (in_bps/out_bps None on the first read, after a restart or a
+        rejected delta).
+        """
+        now = time.time() if now is None else now
+        device = self._devices.get(key)
+        if device is None:
+            device = self._devices[key] = DeviceCounters(key)
+
+        elapsed = None
+        if device.time is not None:
+            if uptime is not None and device.uptime is not None:
+                # Agent restarted (or sysUpTime wrapped after 497 days): new baseline
+                if uptime >= device.uptime:
+                    elapsed = (uptime - device.uptime) / 100.0
+            else:
+                elapsed = now - device.time
+        device.uptime = uptime
+        device.time = now
+
+        previous = device.interfaces
+        current = {}
+        for idx, sample in samples.items():
+            speed = speeds.get(idx) if speeds else None
+            counter = current[idx] = InterfaceCounter(sample, speed)
+            last = previous.get(idx)
+            if not elapsed or last is None or last.sample.bits != sample.bits:
+                continue
+            last = last.sample
+            in_bps = counter_delta(last.in_octets, sample.in_octets, sample.bits) * 8 / elapsed
+            out_bps = counter_delta(last.out_octets, sample.out_octets, sample.bits) * 8 / elapsed
+            if speed and max(in_bps, out_bps) > speed * SPEED_TOLERANCE:
+                continue
+            counter.in_bps = in_bps
+            counter.out_bps = out_bps
+            counter.in_errors = _event_rate(last.in_errors, sample.in_errors, elapsed)
+            counter.out_errors = _event_rate(last.out_errors, sample.out_errors, elapsed)
+            counter.in_discards = _event_rate(last.in_discards, sample.in_discards, elapsed)
+            counter.out_discards = _event_rate(last.out_discards, sample.out_discards, elapsed)
+        # Interfaces that went away (down, removed) are dropped
+        device.interfaces = current
+        device.ranked = {}
+        return device
+
+    def top(self, metric="total", n=20):
+        """
+        The n interfaces with the highest value of metric (a TOP_METRICS key)
+        across all devices: [(key, ifIndex, InterfaceCounter)], highest first.
+        """
+        if metric not in TOP_METRICS:
+            raise KeyError(metric)
+        rankings = [ranked for ranked in (device.ranking(metric) for device in self._devices.values()) if ranked]
+        return [(key, idx, self._devices[key].interfaces[idx])
+                for _, idx, key in islice(heapq.merge(*rankings, reverse=True), n)]
@@ -0,0 +1,138 @@
+"""
+In-memory device registry with O(1) lookups.
+
+Devices are kept in insertion order by id, with hash indexes on ip, mac,
+status, type and vendor. Status counts and the latency sum behind
+/api/stats are adjusted on every change instead of being recomputed.
+
+Indexed fields must be changed through update() so the indexes follow;
+other fields (cpuLoad, name, ...) may be set on the model directly.
+"""
+
+# Fields with a value -> ids index
+INDEXED_FIELDS = ("ip", "mac", "status", "type", "vendor")
+STATUSES = ("online", "offline", "warning")
+
+
+def normalize_mac(mac):
+    return mac.upper().replace("-", ":") if mac else mac
+
+
+class DeviceRegistry:
+    def __init__(self):
+        self._by_id = {}    # id -> Device, in insertion order
+        # field -> value -> {id: None} (dict used as an ordered set)
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        self._latency_sum = 0   # sum of lastResponse over measured devices not offline
+        self._latency_count = 0 # devices in that sum (lastResponse 0 = not measured yet)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        # Snapshot, so callers may add/remove devices while iterating
+        return iter(list(self._by_id.values()))
+
+    def __contains__(self, device_id):
+        return device_id in self._by_id
+
+    # ---------- index maintenance ----------
+
+    def _key(self, field, value):
+        return normalize_mac(value) if field == "mac" else value
+
+    def _index_add(self, device):
+        for field in INDEXED_FIELDS:
+            value = self._key(field, getattr(device, field))
+            if value is not None:
+                self._indexes[field].setdefault(value, {})[device.id] = None
+        if device.status != "offline" and device.lastResponse:
+            self._latency_sum += device.lastResponse
+            self._latency_count += 1
+
+    def _index_remove(self, device):
+        for field in INDEXED_FIELDS:
+            value = self._key(field, getattr(device, field))
+            ids = self._indexes[field].get(value)
+            if ids is not None:
+                ids.pop(device.id, None)
+                if not ids:
+                    del self._indexes[field][value]
+        if device.status != "offline" and device.lastResponse:
+            self._latency_sum -= device.lastResponse
+            self._latency_count -= 1
+
+    # ---------- CRUD ----------
+
+    def add(self, device):
+        if device.id in self._by_id:
+            raise ValueError(f"Device {device.id} already registered")
+        self._by_id[device.id] = device
+        self._index_add(device)
+        return device
+
+    def remove(self, device_id):
+        device = self._by_id.pop(device_id, None)
+        if device is not None:
+            self._index_remove(device)
+        return device
+
+    def update(self, device, **fields):
+        """Set fields on a registered device, re-indexing only when an indexed value changes"""
+        if all(getattr(device, name) == value for name, value in fields.items()):
+            return False
+        reindex = any(name in INDEXED_FIELDS or name == "lastResponse" for name in fields)
+        if reindex:
+            self._index_remove(device)
+        for name, value in fields.items():
+            setattr(device, name, value)
+        if reindex:
+            self._index_add(device)
+        return True
+
+    # ---------- lookups ----------
+
+    def get(self, device_id):
+        return self._by_id.get(device_id)
+
+    def _first(self, field, value):
+        ids = self._indexes[field].get(self._key(field, value))
+        if not ids:
+            return None
+        return self._by_id[next(iter(ids))]
+
+    def by_ip(self, ip):
+        return self._first("ip", ip)
+
+    def by_mac(self, mac):
+        return self._first("mac", mac)
+
+    def find(self, **criteria):
+        """Devices matching all given indexed fields, e.g. find(status="offline", type="switch")"""
+        if not criteria:
+            return list(self)
+        id_sets = []
+        for field, value in criteria.items():
+            if field not in INDEXED_FIELDS:
+                raise KeyError(f"'{field}' is not an indexed field")
+            id_sets.append(self._indexes[field].get(self._key(field, value), {}))
+        # Intersect starting from the smallest index bucket
+        id_sets.sort(key=len)
+        smallest, rest = id_sets[0], id_sets[1:]
+        return [self._by_id[i] for i in smallest if all(i in ids for ids in rest)]
+
+    def ips(self):
+        return self._indexes["ip"].keys()
+
+    def count(self, field, value):
+        return len(self._indexes[field].get(self._key(field, value), ()))
+
+    def stats(self):
+        """Totals per status and average lastResponse (ms) of reachable devices with a measurement"""
+        counts = {status: self.count("status", status) for status in STATUSES}
+        measured = self._latency_count
+        return {
+            "total": len(self._by_id),
+            **counts,
+            "avgLatency": round(self._latency_sum / measured) if measured else 0,
+        }
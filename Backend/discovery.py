@@ -0,0 +1,638 @@
+"""
+Asynchronous network discovery.
+
+A scan runs as a background job over any list of CIDRs and combines two
+probes:
+
+- ARP, for networks directly attached to one of our interfaces. Requests
+  are paced at a tunable rate from a worker thread while a sniffer
+  collects the replies.
+- SNMP sysDescr/sysObjectID GETs, for every network (including routed
+  subnets ARP can't reach). Probes go out on the shared asyncio SNMP
+  socket; the send rate adapts (AIMD) to how well the event loop and the
+  socket keep up.
+
+Each responder gets a reverse-DNS lookup (concurrent, with a timeout) and is
+then published to the job right away, so clients can follow results as they
+arrive through polling (hosts since an index) or a Server-Sent Events stream.
+
+Given a DiscoveryState, a scan is incremental: only new, changed or
+backed-off-but-due addresses get the full probe, known hosts are confirmed
+with one request and long-silent addresses are skipped (see discovery_state).
+"""
+import asyncio
+import ipaddress
+import itertools
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import snmp_codec
+from metrics import (Counter, Gauge, Histogram, THREADPOOL_QUEUE, THREADPOOL_THREADS,
+                     executor_queue_depth, executor_threads)
+from snmp_client import get_client, SnmpSession, SnmpTimeout, DEFAULT_PORT
+from snmp_utils import COMMUNITY
+from stream_hub import sse_frame, KEEPALIVE_INTERVAL
+
+METHODS = ("arp", "snmp")
+
+DISCOVERY_RATE = int(os.getenv("NMS_DISCOVERY_RATE", "500"))   # ARP requests per second
+REPLY_TIMEOUT = 2.0         # seconds to keep listening after the last ARP request
+SEND_SLICE = 0.02           # pacing granularity of the senders (seconds)
+PROGRESS_INTERVAL = 0.5     # seconds between progress events
+SNIFFER_START_TIMEOUT = 2.0 # max wait for the reply capture to come up
+DNS_TIMEOUT = 1.0           # per reverse lookup
+DNS_WORKERS = 32            # concurrent reverse lookups
+MAX_JOBS = 20               # finished jobs kept for polling
+
+# SNMP sweep: starting rate and bounds in probed addresses per second
+SWEEP_RATE = int(os.getenv("NMS_SWEEP_RATE", "1000"))
+SWEEP_MIN_RATE = 50
+SWEEP_MAX_RATE = int(os.getenv("NMS_SWEEP_MAX_RATE", "10000"))
+SWEEP_RATE_STEP = 100       # additive increase per adjustment
+SWEEP_ADJUST_INTERVAL = 0.5 # seconds between rate adjustments
+SWEEP_LAG_FACTOR = 3        # slices taking this many times too long (on average) mean congestion
+SWEEP_LAG_SMOOTHING = 0.2   # EWMA weight of the latest slice, so a single GC pause doesn't halve the rate
+SWEEP_TIMEOUT = float(os.getenv("NMS_SWEEP_TIMEOUT", "1.0"))
+SWEEP_MAX_IN_FLIGHT = 20000
+SWEEP_COMMUNITIES = [c for c in os.getenv("NMS_SWEEP_COMMUNITIES", f"{COMMUNITY},public").split(",") if c]
+
+OID_SYS_DESCR = '1.3.6.1.2.1.1.1.0'
+OID_SYS_OBJECT_ID = '1.3.6.1.2.1.1.2.0'
+OID_SYS_UPTIME = '1.3.6.1.2.1.1.3.0'
+
+# Reverse DNS is blocking (gethostbyaddr); give it its own pool so slow
+# resolvers can't starve asyncio.to_thread users elsewhere in the app
+_dns_pool = ThreadPoolExecutor(max_workers=DNS_WORKERS, thread_name_prefix="rdns")
+
+SCAN_SECONDS = Histogram("nms_scan_duration_seconds", "Duration of finished discovery scans", ("status",),
+                         buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+SCAN_HOSTS = Counter("nms_scan_hosts_found_total", "Hosts reported by discovery scans")
+SCANS_RUNNING = Gauge("nms_scans_running", "Discovery scans in progress")
+THREADPOOL_QUEUE.labels("rdns").set_function(lambda: executor_queue_depth(_dns_pool))
+THREADPOOL_THREADS.labels("rdns").set_function(lambda: executor_threads(_dns_pool))
+
+
+async def reverse_dns(ip, timeout=DNS_TIMEOUT):
+    """Hostname of ip, or "Unknown" on failure/timeout"""
+    loop = asyncio.get_running_loop()
+    try:
+        name, _, _ = await asyncio.wait_for(
+            loop.run_in_executor(_dns_pool, socket.gethostbyaddr, ip), timeout)
+        return name
+    except (asyncio.TimeoutError, OSError):
+        return "Unknown"
+
+
+def _hosts(net):
+    # Network and broadcast addresses are skipped, except on /31 and /32
+    return net.hosts() if net.num_addresses > 2 else iter(net)
+
+
+def _host_count(net):
+    return net.num_addresses - 2 if net.num_addresses > 2 else net.num_addresses
+
+
+def _collapse(ranges):
+    """Parses CIDRs / addresses and merges overlaps so no address is probed twice"""
+    networks = [ipaddress.ip_network(r.strip(), strict=False) for r in ranges if r.strip()]
+    if not networks:
+        raise ValueError("No address ranges given")
+    if any(net.version != 4 for net in networks):
+        raise ValueError("Only IPv4 ranges are supported")
+    return list(ipaddress.collapse_addresses(networks))
+
+
+def _notify(on_host, host):
+    if on_host is not None:
+        try:
+            on_host(host)
+        except Exception as e:
+            print(f"Discovery callback error for {host['ip']}: {e}")
+
+
+class ScanJob:
+    """State and results of one discovery run"""
+
+    def __init__(self, ranges, methods=METHODS, rate=DISCOVERY_RATE, timeout=REPLY_TIMEOUT,
+                 sweep_rate=SWEEP_RATE, state=None, full=False):
+        unknown = [m for m in methods if m not in METHODS]
+        if unknown:
+            raise ValueError(f"Unknown discovery methods: {', '.join(unknown)}")
+        self.id = str(uuid.uuid4())
+        self.networks = _collapse(ranges)
+        self.methods = tuple(methods)
+        self.rate = rate                # ARP requests per second
+        self.sweep_rate = sweep_rate    # current SNMP probe rate (adapted while running)
+        self.timeout = timeout
+        self.state = state              # DiscoveryState, or None to probe every address
+        self.full = full                # ignore the state when planning (still recorded)
+        self.plan = None                # ScanPlan, set when the job starts (with a state)
+        self.arp_networks = []          # networks ARP could reach
+        self.status = "pending"         # pending, running, done, cancelled, error
+        self.error = None
+        self.total = sum(_host_count(net) for net in self.networks)
+        self.sent = {method: 0 for method in self.methods}
+        self.hosts = []                 # discovered hosts, in order of discovery
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+        self._by_ip = {}                # ip -> host dict (published)
+        self._resolving = {}            # ip -> fields waiting for reverse DNS
+        self._queues = set()
+        self._pending = set()           # in-flight reverse lookups
+        self._planned = None            # int(address) set of the plan
+
+    # ---------- results ----------
+
+    def contains(self, ip):
+        addr = ipaddress.ip_address(ip)
+        return any(addr in net for net in self.networks)
+
+    def probed(self, ip):
+        """Whether ip was probed (addresses skipped by an incremental scan were not)"""
+        if self.plan is None:
+            return self.contains(ip)
+        if self._planned is None:
+            self._planned = {int(addr) for addr in itertools.chain(self.plan.full, self.plan.confirm)}
+        return int(ipaddress.ip_address(ip)) in self._planned
+
+    def targets(self, networks=None):
+        """(address, confirm) pairs to probe in plan order, optionally only those inside networks"""
+        if self.plan is None:
+            addresses = itertools.chain.from_iterable(_hosts(net) for net in (networks or self.networks))
+            return ((addr, False) for addr in addresses)
+        targets = itertools.chain(((addr, False) for addr in self.plan.full),
+                                  ((addr, True) for addr in self.plan.confirm))
+        if networks is None:
+            return targets
+        return ((addr, confirm) for addr, confirm in targets if any(addr in net for net in networks))
+
+    @property
+    def hosts_per_second(self):
+        """Addresses probed per second (by the furthest-along method)"""
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        probed = max(self.sent.values(), default=0)
+        return round(probed / elapsed, 1) if elapsed > 0 else 0.0
+
+    def progress(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "ranges": [str(net) for net in self.networks],
+            "methods": list(self.methods),
+            "total": self.total,
+            "incremental": self.plan is not None and not self.full,
+            "confirm": len(self.plan.confirm) if self.plan is not None else 0,
+            "skipped": self.plan.skipped if self.plan is not None else 0,
+            "sent": dict(self.sent),
+            "found": len(self.hosts),
+            "hostsPerSecond": self.hosts_per_second,
+            "sweepRate": round(self.sweep_rate) if "snmp" in self.methods else None,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+
+    def to_dict(self, since=0):
+        return {**self.progress(), "hosts": self.hosts[since:]}
+
+    @property
+    def finished(self):
+        return self.status in ("done", "cancelled", "error")
+
+    # ---------- streaming ----------
+
+    def _publish(self, event, data):
+        frame = sse_frame(event, data)
+        for queue in self._queues:
+            queue.put_nowait(frame)
+
+    async def stream(self):
+        """SSE frames: hosts found so far, then host/progress events until the job ends"""
+        queue = asyncio.Queue()
+        self._queues.add(queue)
+        try:
+            yield sse_frame("snapshot", self.to_dict())
+            if self.finished:
+                return
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield frame
+                if frame.startswith("event: done"):
+                    return
+        finally:
+            self._queues.discard(queue)
+
+    # ---------- reply handling (event loop thread) ----------
+
+    def found(self, ip, fields, on_host):
+        """
+        Records a responder. The first sighting of an IP waits for reverse DNS
+        before being published; later sightings (another method answering)
+        update the host and publish it again.
+        """
+        fields = {k: v for k, v in fields.items() if v is not None}
+        host = self._by_ip.get(ip)
+        if host is not None:
+            if any(host.get(k) != v for k, v in fields.items()):
+                host.update(fields)
+                self._observe(host)
+                self._publish("host", host)
+                _notify(on_host, host)
+            return
+        pending = self._resolving.get(ip)
+        if pending is not None:
+            pending.update(fields)
+            return
+        if not self.contains(ip):
+            return
+        self._resolving[ip] = {"ip": ip, "mac": None, "name": None, **fields}
+        task = asyncio.ensure_future(self._add_host(ip, on_host))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _observe(self, host):
+        if self.state is not None and self.state.observe(host["ip"], host):
+            host["changed"] = True
+
+    async def _add_host(self, ip, on_host):
+        name = await reverse_dns(ip)
+        host = self._resolving.pop(ip)
+        host["name"] = name
+        self._observe(host)
+        self._by_ip[ip] = host
+        self.hosts.append(host)
+        self._publish("host", host)
+        _notify(on_host, host)
+
+
+# ==================== ARP ====================
+
+def _arp_interfaces(networks):
+    """Groups the directly attached networks by interface; routed ones are left out"""
+    from scapy.all import conf
+
+    by_iface = {}
+    for net in networks:
+        if net.is_loopback:
+            continue
+        iface, _, gateway = conf.route.route(str(net.network_address))
+        if gateway == '0.0.0.0':
+            by_iface.setdefault(iface, []).append(net)
+    return by_iface
+
+
+def _send_arp(job, iface, addresses):
+    """Paced ARP who-has for every address (runs in a worker thread)"""
+    from scapy.all import ARP, Ether, conf, get_if_hwaddr, raw
+
+    sock = conf.L2socket(iface=iface)
+    try:
+        per_slice = max(1, int(job.rate * SEND_SLICE))
+        next_slice = time.monotonic()
+        template = None
+        while True:
+            batch = list(itertools.islice(addresses, per_slice))
+            if not batch:
+                break
+            if template is None:
+                # Build the frame once, then patch the target address (ARP
+                # pdst sits at byte 38 of the Ethernet frame) for every host
+                template = bytearray(raw(Ether(dst="ff:ff:ff:ff:ff:ff", src=get_if_hwaddr(iface)) / ARP(pdst=str(batch[0]))))
+            for addr in batch:
+                template[38:42] = addr.packed
+                sock.send(bytes(template))
+            job.sent["arp"] += len(batch)
+            if job.status == "cancelled":
+                return
+            next_slice += SEND_SLICE
+            delay = next_slice - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_slice = time.monotonic()
+    finally:
+        sock.close()
+
+
+async def _arp_scan(job, on_host):
+    """
+    ARP sweep of the attached networks. A failure (not root, no capture
+    driver) is recorded on the job instead of raised, so the SNMP sweep
+    still finishes and the job ends normally.
+    """
+    try:
+        await _arp_probe(job, on_host)
+    except Exception as e:
+        # Nothing was reliably asked over ARP: its silent hosts aren't misses
+        job.arp_networks = []
+        job.error = f"ARP scan failed: {e}"
+        print(f"[!] ARP scan ล้มเหลว (สแกนต่อด้วย SNMP): {e}")
+
+
+async def _arp_probe(job, on_host):
+    from scapy.all import ARP, AsyncSniffer, get_if_hwaddr
+
+    loop = asyncio.get_running_loop()
+    by_iface = await asyncio.to_thread(_arp_interfaces, job.networks)
+    if not by_iface:
+        return
+    job.arp_networks = [net for networks in by_iface.values() for net in networks]
+    sniffers = []
+
+    def on_packet(pkt):
+        arp = pkt[ARP]
+        loop.call_soon_threadsafe(job.found, arp.psrc, {"mac": arp.hwsrc}, on_host)
+
+    try:
+        for iface in by_iface:
+            # Don't send before the capture socket is open, or early replies are lost
+            ready = threading.Event()
+            own_mac = get_if_hwaddr(iface)
+            sniffer = AsyncSniffer(iface=iface, store=False, prn=on_packet,
+                                   # replies only, and not the ones this host sends itself
+                                   lfilter=lambda p, own_mac=own_mac: (
+                                       ARP in p and p[ARP].op == 2 and p[ARP].hwsrc != own_mac),
+                                   started_callback=ready.set)
+            sniffer.start()
+            sniffers.append(sniffer)
+            await asyncio.to_thread(ready.wait, SNIFFER_START_TIMEOUT)
+
+        await asyncio.gather(*[
+            asyncio.to_thread(_send_arp, job, iface, (addr for addr, _ in job.targets(networks)))
+            for iface, networks in by_iface.items()
+        ])
+        if job.status != "cancelled":
+            await asyncio.sleep(job.timeout)
+    finally:
+        for sniffer in sniffers:
+            try:
+                await asyncio.to_thread(sniffer.stop)
+            except Exception:
+                pass
+
+
+# ==================== SNMP sweep ====================
+
+class RateController:
+    """
+    AIMD rate control: the rate grows by a fixed step while sending keeps up
+    and is halved when the pacing loop falls behind or the socket backs up.
+    """
+
+    def __init__(self, rate, min_rate=SWEEP_MIN_RATE, max_rate=SWEEP_MAX_RATE, step=SWEEP_RATE_STEP):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.rate = min(max(rate, min_rate), max_rate)
+
+    def increase(self):
+        self.rate = min(self.max_rate, self.rate + self.step)
+
+    def decrease(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+
+
+async def _snmp_probe(client, ip, communities, timeout, job, on_host):
+    """GET sysDescr/sysObjectID with every community at once; first answer wins"""
+    sessions = [SnmpSession(ip, DEFAULT_PORT, community, snmp_codec.VERSION_2C, ip)
+                for community in communities]
+    results = await asyncio.gather(*[
+        client.request(session, snmp_codec.GET_REQUEST, [OID_SYS_DESCR, OID_SYS_OBJECT_ID],
+                       timeout=timeout, retries=0, count=False)
+        for session in sessions
+    ], return_exceptions=True)
+
+    for community, msg in zip(communities, results):
+        if isinstance(msg, SnmpTimeout):
+            continue
+        if isinstance(msg, Exception):
+            print(f"SNMP sweep error for {ip}: {msg}")
+            continue
+        values = {oid: value for oid, value in msg.varbinds if not snmp_codec.is_exception(value)}
+        descr = values.get(OID_SYS_DESCR)
+        object_id = values.get(OID_SYS_OBJECT_ID)
+        job.found(ip, {
+            "sysDescr": bytes(descr).decode('utf-8', errors='ignore') if descr is not None else None,
+            "sysObjectID": str(object_id) if object_id is not None else None,
+            "community": community.decode(),
+        }, on_host)
+        return
+
+
+async def _snmp_confirm(client, ip, community, timeout, job, on_host):
+    """
+    Confirms a known SNMP host with a single request: sysUpTime, plus
+    sysObjectID so a replaced device is noticed (and re-probed in full)
+    """
+    session = SnmpSession(ip, DEFAULT_PORT, community.encode(), snmp_codec.VERSION_2C, ip)
+    try:
+        msg = await client.request(session, snmp_codec.GET_REQUEST, [OID_SYS_UPTIME, OID_SYS_OBJECT_ID],
+                                   timeout=timeout, retries=0, count=False)
+    except SnmpTimeout:
+        return
+    except Exception as e:
+        print(f"SNMP sweep error for {ip}: {e}")
+        return
+    values = {oid: value for oid, value in msg.varbinds if not snmp_codec.is_exception(value)}
+    object_id = values.get(OID_SYS_OBJECT_ID)
+    record = job.state.get(ip)
+    job.found(ip, {
+        "sysDescr": record.sys_descr,
+        "sysObjectID": str(object_id) if object_id is not None else record.sys_object_id,
+        "community": community,
+    }, on_host)
+
+
+async def _snmp_sweep(job, on_host, communities=None, timeout=SWEEP_TIMEOUT):
+    client = await get_client()
+    loop = asyncio.get_running_loop()
+    communities = [c.encode() for c in (communities or SWEEP_COMMUNITIES)]
+    controller = RateController(job.sweep_rate)
+    tasks = set()
+
+    budget = 0.0
+    avg_slice = SEND_SLICE
+    last_slice = last_adjust = loop.time()
+    for addr, confirm in job.targets():
+        if job.status == "cancelled":
+            break
+        if confirm:
+            # Hosts only ever seen through ARP have nothing to confirm over SNMP
+            community = job.state.community(addr)
+            if community is None:
+                continue
+        while budget < 1:
+            await asyncio.sleep(SEND_SLICE)
+            now = loop.time()
+            elapsed = now - last_slice
+            last_slice = now
+            avg_slice += SWEEP_LAG_SMOOTHING * (elapsed - avg_slice)
+            # The loop not waking up on time, or datagrams queuing in user
+            # space because the kernel buffer is full, both mean too fast
+            congested = avg_slice > SEND_SLICE * SWEEP_LAG_FACTOR or client.write_buffer_size() > 0
+            if now - last_adjust >= SWEEP_ADJUST_INTERVAL:
+                if congested:
+                    controller.decrease()
+                else:
+                    controller.increase()
+                last_adjust = now
+            job.sweep_rate = controller.rate
+            budget += controller.rate * min(elapsed, SEND_SLICE * SWEEP_LAG_FACTOR)
+            while len(tasks) >= SWEEP_MAX_IN_FLIGHT:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        budget -= 1
+        if confirm:
+            probe = _snmp_confirm(client, str(addr), community, timeout, job, on_host)
+        else:
+            probe = _snmp_probe(client, str(addr), communities, timeout, job, on_host)
+        task = asyncio.ensure_future(probe)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        job.sent["snmp"] += 1
+
+    if tasks:
+        await asyncio.gather(*list(tasks), return_exceptions=True)
+
+
+# ==================== jobs ====================
+
+async def _report_progress(job):
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        job._publish("progress", job.progress())
+
+
+def _covered(job, addr, confirm):
+    """Whether a probe of this job actually reached addr (an unanswered one then counts as a miss)"""
+    if "arp" in job.methods and any(addr in net for net in job.arp_networks):
+        return True
+    return "snmp" in job.methods and (not confirm or job.state.community(addr) is not None)
+
+
+def _make_plan(job):
+    job.state.load()
+    addresses = itertools.chain.from_iterable(_hosts(net) for net in job.networks)
+    return job.state.plan(addresses, full=job.full)
+
+
+async def _plan(job):
+    # Only lookups into the state, so planning a /16 can leave the event loop
+    job.plan = await asyncio.to_thread(_make_plan, job)
+    job.total = len(job.plan)
+
+
+async def _record(job):
+    state = job.state
+    state.finish(job.plan, job._by_ip, lambda addr, confirm: _covered(job, addr, confirm))
+    try:
+        await asyncio.to_thread(state.write, state.dumps())
+    except OSError as e:
+        print(f"Discovery state save error: {e}")
+
+
+async def run_scan(job, on_host=None):
+    """Runs a scan job to completion; on_host(host) is called for every new or updated host"""
+    job.status = "running"
+    job.started_at = time.time()
+    SCANS_RUNNING.inc()
+    reporter = asyncio.create_task(_report_progress(job))
+    try:
+        if job.state is not None:
+            await _plan(job)
+        probes = []
+        if "arp" in job.methods:
+            probes.append(asyncio.create_task(_arp_scan(job, on_host)))
+        if "snmp" in job.methods:
+            probes.append(asyncio.create_task(_snmp_sweep(job, on_host)))
+        try:
+            await asyncio.gather(*probes)
+        finally:
+            # One method failing (or the job being cancelled) stops the other: no host
+            # may be reported after the job has ended
+            for probe in probes:
+                probe.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+        raise
+    except Exception as e:
+        job.status = "error"
+        job.error = str(e)
+        print(f"[!] เกิดข้อผิดพลาดขณะสแกน: {e}")
+        if "Npcap" in str(e) or "WinPcap" in str(e):
+            print("[!] ตรวจพบปัญหาเกี่ยวกับ Driver: คุณได้ติดตั้ง Npcap หรือยัง?")
+    finally:
+        reporter.cancel()
+        # Let hosts that already answered finish their reverse lookup
+        if job._pending:
+            await asyncio.gather(*list(job._pending), return_exceptions=True)
+        if job.status == "running":
+            job.status = "done"
+            if job.plan is not None:
+                await _record(job)
+        job.finished_at = time.time()
+        SCANS_RUNNING.dec()
+        SCAN_SECONDS.labels(job.status).observe(job.finished_at - job.started_at)
+        SCAN_HOSTS.inc(len(job.hosts))
+        job._publish("done", job.progress())
+    return job
+
+
+class DiscoveryManager:
+    """Starts scan jobs and keeps the most recent ones for polling"""
+
+    def __init__(self, max_jobs=MAX_JOBS, state=None):
+        self.max_jobs = max_jobs
+        self.state = state      # DiscoveryState shared by all jobs (incremental scans)
+        self._jobs = OrderedDict()
+
+    def start(self, ranges, methods=None, rate=None, sweep_rate=None, timeout=None,
+              on_host=None, on_done=None, full=False):
+        job = ScanJob(ranges,
+                      methods=methods or METHODS,
+                      rate=rate or DISCOVERY_RATE,
+                      sweep_rate=sweep_rate or SWEEP_RATE,
+                      timeout=REPLY_TIMEOUT if timeout is None else timeout,
+                      state=self.state,
+                      full=full)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            oldest = next(iter(self._jobs.values()))
+            if not oldest.finished:
+                break
+            self._jobs.popitem(last=False)
+
+        async def run():
+            await run_scan(job, on_host)
+            if on_done is not None and job.status == "done":
+                on_done(job)
+            return job
+
+        job.task = asyncio.create_task(run())
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.status = "cancelled"   # the ARP sender thread checks this between slices
+        job.task.cancel()
+        return job
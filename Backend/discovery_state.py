@@ -0,0 +1,240 @@
+"""
+Discovery state kept between scans.
+
+Every probed IPv4 address gets a record (MAC, SNMP identity, first/last
+seen, consecutive misses). Later scans use it to plan their work:
+
+- addresses never probed, or whose identity changed last time, get the
+  full probe (ARP + SNMP with every community)
+- known live hosts are only confirmed: ARP on the local segment, and a
+  single sysUpTime GET with the community that worked before (a full
+  probe is still repeated every REVERIFY_INTERVAL)
+- addresses that keep not answering are skipped with exponential backoff
+
+The state is saved to a JSON file after each scan.
+"""
+import ipaddress
+import json
+import os
+import threading
+import time
+
+DISCOVERY_STATE_PATH = os.getenv(
+    "NMS_DISCOVERY_STATE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "discovery.json")
+)
+
+DEAD_BACKOFF_BASE = 900.0       # first skip period for a silent address (seconds)
+DEAD_BACKOFF_MAX = 86400.0      # longest skip period
+KNOWN_HOST_GRACE = 3            # misses before a host that was once alive is backed off too
+REVERIFY_INTERVAL = float(os.getenv("NMS_DISCOVERY_REVERIFY", "86400"))   # max age of a full probe result
+
+
+class HostRecord:
+    __slots__ = ('mac', 'sys_descr', 'sys_object_id', 'community', 'first_seen', 'last_seen',
+                 'last_probed', 'misses', 'next_probe', 'changed', 'verified')
+
+    def __init__(self):
+        self.mac = None
+        self.sys_descr = None
+        self.sys_object_id = None
+        self.community = None
+        self.first_seen = None
+        self.last_seen = None
+        self.last_probed = None
+        self.misses = 0
+        self.next_probe = 0.0
+        self.changed = False
+        self.verified = None    # time of the last full probe it answered
+
+    def to_list(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        record = cls()
+        for name, value in zip(cls.__slots__, values):
+            setattr(record, name, value)
+        return record
+
+    def to_dict(self):
+        return {
+            "mac": self.mac,
+            "sysDescr": self.sys_descr,
+            "sysObjectID": self.sys_object_id,
+            "community": self.community,
+            "firstSeen": self.first_seen,
+            "lastSeen": self.last_seen,
+            "lastProbed": self.last_probed,
+            "misses": self.misses,
+            "nextProbe": self.next_probe,
+            "verified": self.verified,
+        }
+
+
+class ScanPlan:
+    """Addresses one scan will probe, split by probe kind"""
+
+    __slots__ = ('full', 'confirm', 'skipped')
+
+    def __init__(self, full, confirm, skipped):
+        self.full = full            # [IPv4Address] for the full probe, highest priority first
+        self.confirm = confirm      # [IPv4Address] known live hosts to confirm cheaply
+        self.skipped = skipped      # addresses in range left out (backed off)
+
+    def __len__(self):
+        return len(self.full) + len(self.confirm)
+
+
+class DiscoveryState:
+    def __init__(self, path=DISCOVERY_STATE_PATH):
+        self.path = path
+        self._records = {}      # int(address) -> HostRecord
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, ip):
+        return self._records.get(int(ipaddress.IPv4Address(ip)))
+
+    def community(self, addr):
+        record = self._records.get(int(addr))
+        return record.community if record is not None else None
+
+    # ---------- persistence ----------
+
+    def load(self):
+        """Reads the saved state once (jobs call it from worker threads before planning)"""
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._records = {
+                int(ipaddress.IPv4Address(ip)): HostRecord.from_list(values)
+                for ip, values in data.get("hosts", {}).items()
+            }
+        except (OSError, ValueError) as e:
+            print(f"Discovery state load error: {e}")
+
+    def dumps(self):
+        """Serialized state; called on the event loop so scans can't change it mid-dump"""
+        return json.dumps({"hosts": {str(ipaddress.IPv4Address(ip)): r.to_list()
+                                     for ip, r in self._records.items()}}, separators=(',', ':'))
+
+    def write(self, text):
+        """Writes a dumps() result atomically (may run in a worker thread)"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+
+    def save(self):
+        self.write(self.dumps())
+
+    # ---------- planning ----------
+
+    def plan(self, addresses, full=False, now=None):
+        """
+        Splits the addresses of a scan into full probes, confirm probes and
+        skipped ones. Order of the full list: never probed, changed or due
+        for re-verification, then silent addresses whose backoff has expired.
+        """
+        now = time.time() if now is None else now
+        if full:
+            return ScanPlan(list(addresses), [], 0)
+
+        unknown, changed, due, confirm = [], [], [], []
+        skipped = 0
+        records = self._records
+        for addr in addresses:
+            record = records.get(int(addr))
+            if record is None:
+                unknown.append(addr)
+            elif record.last_seen is not None and record.misses < KNOWN_HOST_GRACE:
+                if record.changed or record.verified is None or now - record.verified > REVERIFY_INTERVAL:
+                    changed.append(addr)
+                else:
+                    confirm.append(addr)
+            elif record.next_probe <= now:
+                due.append(addr)
+            else:
+                skipped += 1
+        return ScanPlan(unknown + changed + due, confirm, skipped)
+
+    # ---------- results ----------
+
+    def observe(self, ip, host, now=None):
+        """
+        Records a live host from a scan result dict.
+        Returns True if its MAC or SNMP identity differs from what was known.
+        """
+        now = time.time() if now is None else now
+        key = int(ipaddress.IPv4Address(ip))
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = HostRecord()
+            record.first_seen = now
+
+        changed = False
+        for name, field in (("mac", "mac"), ("sys_object_id", "sysObjectID")):
+            value = host.get(field)
+            if value is None:
+                continue
+            old = getattr(record, name)
+            if old is not None and old.lower() != value.lower():
+                changed = True
+            setattr(record, name, value)
+        if host.get("sysDescr") is not None:
+            record.sys_descr = host["sysDescr"]
+        if host.get("community") is not None:
+            record.community = host["community"]
+
+        record.last_seen = record.last_probed = now
+        record.misses = 0
+        record.next_probe = 0.0
+        if changed:
+            # Re-probed in full next time, so the rest of its identity is refreshed
+            record.changed = True
+        return changed
+
+    def finish(self, plan, found, covered, now=None):
+        """
+        Closes a completed scan: addresses of the plan that answered (ip
+        strings in found) are marked verified if they got the full probe,
+        the ones a probe actually reached (covered(addr, confirm)) but that
+        stayed silent count a miss.
+        """
+        now = time.time() if now is None else now
+        records = self._records
+        for confirm, addresses in ((False, plan.full), (True, plan.confirm)):
+            for addr in addresses:
+                if str(addr) in found:
+                    if not confirm:
+                        record = records[int(addr)]
+                        record.verified = now
+                        record.changed = False
+                elif covered(addr, confirm):
+                    self._missed(int(addr), now)
+
+    def _missed(self, key, now):
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = HostRecord()
+        record.last_probed = now
+        record.misses += 1
+        record.changed = False
+        if record.last_seen is None or record.misses >= KNOWN_HOST_GRACE:
+            exponent = record.misses - (1 if record.last_seen is None else KNOWN_HOST_GRACE)
+            record.next_probe = now + min(DEAD_BACKOFF_BASE * 2 ** exponent, DEAD_BACKOFF_MAX)
@@ -0,0 +1,118 @@
+"""
+Metrics of the machine the backend runs on, sampled in the background.
+
+A single task reads psutil (CPU, memory, per-NIC counters and link state)
+every LOCAL_INTERVAL seconds in a worker thread and keeps the snapshots of
+the last LOCAL_HISTORY seconds. Requests only read the latest snapshot, so
+concurrent callers never touch the counters and rates always cover one
+full sampling interval. NIC rates go through a CounterTracker like the
+SNMP interfaces, so they also rank in the interface top-N.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+import psutil
+
+from counters import CounterTracker, InterfaceSample
+
+LOCAL_INTERVAL = float(os.getenv("NMS_LOCAL_INTERVAL", "1.0"))     # seconds between samples
+LOCAL_HISTORY = float(os.getenv("NMS_LOCAL_HISTORY", "300"))       # seconds of snapshots kept
+LOCAL_KEY = '127.0.0.1'
+
+
+def _is_loopback(name, stats):
+    return 'loopback' in getattr(stats, 'flags', '') or name == 'lo' or 'loopback' in name.lower()
+
+
+def read_psutil():
+    """One raw read of every psutil source (blocking; runs in a worker thread)"""
+    return {
+        "time": time.time(),
+        "cpu": psutil.cpu_percent(interval=None),
+        "memory": psutil.virtual_memory(),
+        "io": psutil.net_io_counters(pernic=True),
+        "stats": psutil.net_if_stats(),
+    }
+
+
+class LocalCollector:
+    def __init__(self, interval=LOCAL_INTERVAL, history=LOCAL_HISTORY, tracker=None, key=LOCAL_KEY):
+        self.interval = interval
+        self.key = key
+        self.tracker = tracker if tracker is not None else CounterTracker()
+        self.history = deque(maxlen=max(1, int(history / interval)))
+        self._task = None
+
+    def latest(self):
+        """Most recent snapshot, or None before the first sample"""
+        return self.history[-1] if self.history else None
+
+    def window(self, seconds=None):
+        """Snapshots of the last seconds (all kept ones by default), oldest first"""
+        if seconds is None:
+            return list(self.history)
+        since = time.time() - seconds
+        return [snapshot for snapshot in self.history if snapshot["time"] >= since]
+
+    def start(self):
+        if self._task is None:
+            # Primes cpu_percent: its first call has no previous reading to compare with
+            psutil.cpu_percent(interval=None)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.collect()
+            except Exception as e:
+                print(f"Local collector error: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def collect(self):
+        """Takes one sample now and returns its snapshot"""
+        raw = await asyncio.to_thread(read_psutil)
+        # Rates are computed on the event loop: the tracker is shared with request handlers
+        snapshot = self._snapshot(raw)
+        self.history.append(snapshot)
+        return snapshot
+
+    def _snapshot(self, raw):
+        mem = raw["memory"]
+        used = mem.total - mem.available
+
+        samples, speeds = {}, {}
+        for name, stats in raw["stats"].items():
+            io = raw["io"].get(name)
+            if io is None or not stats.isup or _is_loopback(name, stats):
+                continue
+            samples[name] = InterfaceSample(io.bytes_recv, io.bytes_sent, 64,
+                                            io.errin, io.errout, io.dropin, io.dropout)
+            if stats.speed:
+                speeds[name] = stats.speed * 1_000_000
+        counters = self.tracker.update(self.key, samples, speeds=speeds, now=raw["time"])
+        in_bps, out_bps = counters.totals()
+
+        return {
+            "time": raw["time"],
+            "cpu": raw["cpu"],
+            "ram": {
+                "total": round(mem.total / (1024**3), 2),
+                "used": round(used / (1024**3), 2),
+                "percent": round(used / mem.total * 100, 1),
+            },
+            "net_in_mbps": round(in_bps / 1_000_000, 2),
+            "net_out_mbps": round(out_bps / 1_000_000, 2),
+            "nics": {name: counter.to_dict() for name, counter in counters.interfaces.items()},
+        }
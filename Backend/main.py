@@ -1,14 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from scapy.all import ARP, Ether, srp
 from pysnmp.hlapi import *
-from snmp_utils import get_cpu_loader, get_ram_usage, get_net_io_counters
-from scan_lan_logic import scan, get_local_network
+from snmp_utils import collect_sample, probe_alive, invalidate_metadata, METADATA_CACHE, SNMP_ROUND_TRIPS, get_round_trips
+from scan_lan_logic import get_local_networks
+from poller import DevicePoller
+from metric_store import MetricStore
+from recent_store import RecentStore
+from stream_hub import StreamHub, TOPICS, sse_frame
+from device_registry import DeviceRegistry
+from alert_store import AlertStore
+from rules import RuleEngine
+from discovery import DiscoveryManager
+from discovery_state import DiscoveryState
+import trap_receiver
+from trap_receiver import TrapReceiver
+from counters import CounterTracker, TOP_METRICS
+from local_collector import LocalCollector
+from reachability import Pinger
+import metrics
+from metrics import HttpMetricsMiddleware, Gauge, THREADPOOL_QUEUE, THREADPOOL_THREADS
+import oui
+import os
 import time
 import asyncio
-import psutil
 import uuid
 from datetime import datetime
 
@@ -22,6 +40,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# เวลาตอบของทุก endpoint (label ตาม route template) สำหรับ /metrics
+app.add_middleware(HttpMetricsMiddleware)
 
 # ==================== Data Models ====================
 
@@ -36,7 +56,12 @@ class Device(BaseModel):
     uptime: str = "0d 0h 0m"
     cpuLoad: int = 0
     memoryUsage: int = 0
-    lastResponse: int = 0
+    lastResponse: float = 0             # RTT เฉลี่ยของ ping ล่าสุด (ms), 0 = ยังไม่ได้วัด/ไม่ตอบ
+    rttMin: Optional[float] = None
+    rttMax: Optional[float] = None
+    packetLoss: Optional[float] = None  # % ของ ping ล่าสุด
+    lastPolled: Optional[str] = None
+    pollInterval: Optional[float] = None  # วินาที (None = ตามประเภท: router/switch/firewall ถี่กว่า)
 
 class Alert(BaseModel):
     id: str
@@ -46,79 +71,159 @@ class Alert(BaseModel):
     message: str
     acknowledged: bool = False
     oid: Optional[str] = None
+    condition: Optional[str] = None  # key สำหรับ dedup: (source, oid, condition)
+    count: int = 1                   # จำนวนครั้งที่เกิดซ้ำระหว่างยัง active
+    lastSeen: Optional[str] = None
+    cleared: bool = False            # condition กลับเป็นปกติแล้ว
 
 class DeviceInput(BaseModel):
     name: str
     ip: str
     type: str = "server"
     vendor: str = "Unknown"
+    pollInterval: Optional[float] = None
+
+class RulesConfig(BaseModel):
+    groups: Dict[str, List[str]] = {}   # ชื่อกลุ่ม -> รายการ IP
+    rules: List[Dict[str, Any]]         # ดูรูปแบบใน rules.py
+
+class ScanRequest(BaseModel):
+    ranges: Optional[List[str]] = None  # CIDR เช่น "192.168.1.0/24", "10.20.0.0/16" (default = ทุกวง LAN ของเครื่อง)
+    methods: Optional[List[str]] = None # "arp" (เฉพาะวงที่ต่อตรง) และ/หรือ "snmp" (sweep ได้ทุกวง รวม routed subnet)
+    rate: Optional[int] = None          # ARP requests ต่อวินาที
+    sweepRate: Optional[int] = None     # SNMP probes ต่อวินาทีเริ่มต้น (ปรับอัตโนมัติระหว่างสแกน)
+    timeout: Optional[float] = None     # วินาทีที่รอ ARP reply หลังส่งครบ
+    full: bool = False                  # True = probe ทุก address (ไม่ใช้ผลสแกนครั้งก่อน)
+
+class PingRequest(BaseModel):
+    ips: Optional[List[str]] = None        # IP/hostname ใดก็ได้ (ไม่จำเป็นต้องอยู่ใน devices)
+    deviceIds: Optional[List[str]] = None  # ไม่ระบุทั้งสองอย่าง = ping ทุก device
+    count: Optional[int] = None            # echo requests ต่อ host (1-10)
+    timeout: Optional[float] = None        # วินาทีที่รอแต่ละ reply (สูงสุด 5)
 
 # ==================== In-Memory Storage ====================
 
-devices_store: List[Device] = []
-alerts_store: List[Alert] = []
+# devices index ตาม id / ip / mac / status / type / vendor (แก้ field ที่ index ผ่าน devices_store.update)
+devices_store = DeviceRegistry()
+Gauge("nms_devices", "Monitored devices").set_function(lambda: len(devices_store))
+# alerts: ring buffer + id index, dedup ตาม (source, oid, condition), rate limit ต่อ source, history ลง SQLite
+alerts_store = AlertStore()
+# threshold rules (data/rules.json, แก้ผ่าน /api/rules) ประเมินทุก sample ที่ poller ได้มา
+rule_engine = RuleEngine()
+OID_UNREACHABLE = "1.3.6.1.4.1.9.9.43.1.1.6.1.3"
 
-# Global vars for Network Speed calculation (Local)
-LAST_NET_BYTES_RECV = 0
-LAST_NET_BYTES_SENT = 0
-LAST_NET_TIME = 0
+# Network speed: counter ล่าสุดแยกต่อ interface (ifHC* 64-bit ถ้ามี, แก้ wrap/reset ให้)
+# เก็บ rate ล่าสุด (traffic, errors, discards) ของทุก interface ไว้ให้ /api/interfaces/top จัดอันดับ
+interface_counters = CounterTracker()
 
-# Cache for Remote Network Speed: { ip: (last_recv, last_sent, last_time) }
-REMOTE_NET_CACHE = {}
+# Ping: ICMP socket เดียวสำหรับทุก host (ไม่มีสิทธิ์ -> ใช้คำสั่ง ping แบบ async subprocess)
+# ping ทุก device เป็นรอบทุก PING_SWEEP_INTERVAL วินาที -> lastResponse / avgLatency เป็น RTT จริง
+pinger = Pinger()
+PING_SWEEP_INTERVAL = float(os.getenv("NMS_PING_SWEEP", "60"))   # 0 = ไม่ ping อัตโนมัติ
+ping_task = None
+
+# Metrics ของเครื่องที่รัน backend: อ่าน psutil เป็นรอบใน background, request อ่านแค่ snapshot ล่าสุด
+local_collector = LocalCollector(tracker=interface_counters)
+
+# Single-flight ของ collect_realtime: caller ที่ถาม target เดียวกันพร้อมกันจะรอผลชุดเดียวกัน
+# และผลที่อายุไม่เกิน REALTIME_FRESHNESS วินาทีจะถูกส่งซ้ำโดยไม่ collect ใหม่
+REALTIME_FRESHNESS = float(os.getenv("NMS_REALTIME_FRESHNESS", "0.5"))
+realtime_in_flight = {}   # target -> Task ที่กำลัง collect
+realtime_last = {}        # target -> (monotonic time, result)
+
+# เก็บประวัติ metrics ลง SQLite (key ตาม IP ของ device)
+metric_store = MetricStore()
+
+# ประวัติล่าสุด (1 ชั่วโมง) แบบ ring buffer ในหน่วยความจำ
+recent_store = RecentStore()
+
+# ส่ง realtime / device / alert ให้ client ที่เปิด /api/stream อยู่
+stream_hub = StreamHub()
+STATS_PUSH_INTERVAL = 2.0   # วินาที ระหว่างการเช็คว่า stats เปลี่ยนหรือไม่
+
+# LAN discovery แบบ background job (ผลทยอยออกมาระหว่างสแกน)
+# สแกนแบบ incremental: จำผลแต่ละ IP ไว้ (data/discovery.json) -> host เดิมแค่ยืนยันด้วย probe เดียว, IP ที่เงียบนานถูกข้าม
+discovery = DiscoveryManager(state=DiscoveryState())
 
 # ==================== Helper Functions ====================
 
-def generate_alert(severity: str, source: str, message: str, oid: str = None):
-    """สร้าง Alert ใหม่และเพิ่มลง store"""
-    alert = Alert(
-        id=str(uuid.uuid4()),
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        severity=severity,
-        source=source,
-        message=message,
-        acknowledged=False,
-        oid=oid
-    )
-    alerts_store.insert(0, alert)  # เพิ่มที่หัวลิสต์
-    # เก็บแค่ 100 alerts ล่าสุด
-    if len(alerts_store) > 100:
-        alerts_store.pop()
+def generate_alert(severity: str, source: str, message: str, oid: str = None, condition: str = None,
+                   key: str = None):
+    """
+    สร้าง Alert ใหม่ หรือนับซ้ำถ้า (key, oid, condition) เดิมยัง active อยู่
+    key = ตัวตนของสิ่งที่ alert (device id; default = source) ส่วน source เป็นแค่ชื่อที่แสดง
+    return None ถ้าโดน rate limit ของ key
+    """
+    key = source if key is None else key
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    alert, _ = alerts_store.raise_alert(
+        lambda: Alert(
+            id=str(uuid.uuid4()),
+            timestamp=timestamp,
+            severity=severity,
+            source=source,
+            message=message,
+            acknowledged=False,
+            oid=oid,
+            condition=condition or message,
+            lastSeen=timestamp,
+        ),
+        key, oid, condition or message, timestamp, message=message)
+    if alert is not None:
+        stream_hub.publish("alerts", "alert", alert.dict())
     return alert
 
-def get_device_type_from_mac(mac: str) -> str:
-    """ประเมิน device type จาก MAC OUI"""
-    mac_prefix = mac[:8].upper().replace("-", ":")
-    # Common vendor prefixes
-    cisco_prefixes = ["00:1A:2B", "00:1B:2C", "00:1C:2D", "00:0C:29"]
-    ubiquiti_prefixes = ["FC:EC:DA", "24:5A:4C", "DC:9F:DB"]
-    
-    if any(mac_prefix.startswith(p) for p in cisco_prefixes):
-        return "switch"
-    elif any(mac_prefix.startswith(p) for p in ubiquiti_prefixes):
-        return "ap"
-    return "server"
-
-def get_vendor_from_mac(mac: str) -> str:
-    """ประเมิน vendor จาก MAC OUI"""
-    mac_prefix = mac[:8].upper().replace("-", ":")
-    vendors = {
-        "00:1A:2B": "Cisco", "00:1B:2C": "Cisco", "00:0C:29": "VMware",
-        "FC:EC:DA": "Ubiquiti", "24:5A:4C": "Ubiquiti",
-        "00:50:56": "VMware", "08:00:27": "VirtualBox",
-        "B4:2E:99": "HP", "3C:D9:2B": "HP",
-        "D4:BE:D9": "Dell", "18:A9:05": "Dell",
-    }
-    for prefix, vendor in vendors.items():
-        if mac_prefix.startswith(prefix):
-            return vendor
-    return "Unknown"
+def clear_alert(key: str, oid: str, condition: str):
+    """Condition กลับเป็นปกติ -> alert ที่ active ถูก mark cleared (ครั้งหน้าเกิดใหม่จะเป็น alert ใหม่)"""
+    alert = alerts_store.clear(key, oid, condition)
+    if alert is not None:
+        stream_hub.publish("alerts", "alert", alert.dict())
+    return alert
+
+def clear_device_alerts(device: "Device"):
+    """Clear ทุก alert ที่ active ของ device (ถูกลบ หรือเปลี่ยน IP -> condition เริ่มนับใหม่)"""
+    for alert in alerts_store.clear_source(device.id):
+        stream_hub.publish("alerts", "alert", alert.dict())
+
+def device_source(device: "Device") -> str:
+    """ชื่อที่แสดงใน alert (ไม่ใช่ key: เปลี่ยนชื่อ/IP แล้ว alert เดิมยัง clear ได้)"""
+    return f"{device.name} ({device.ip})"
+
+def publish_device(device: "Device"):
+    """ส่ง device ที่เปลี่ยนไปให้ stream subscribers"""
+    stream_hub.publish("devices", "device", device.dict())
+
+def publish_devices():
+    """ส่งรายการ devices ทั้งหมด (ใช้หลังการเปลี่ยนแปลงหลายตัวพร้อมกัน เช่น scan)"""
+    stream_hub.publish("devices", "devices", [d.dict() for d in devices_store])
 
 # ==================== API Endpoints ====================
 
-@app.get("/api/realtime")
-async def get_realtime_data(target: str = '127.0.0.1'):
-    global LAST_NET_BYTES_RECV, LAST_NET_BYTES_SENT, LAST_NET_TIME, REMOTE_NET_CACHE
+def normalize_target(target: str) -> str:
+    return '127.0.0.1' if target == 'localhost' else target
+
+async def collect_realtime(target: str):
+    """
+    ดึงค่า CPU/RAM/Network ของ target (ใช้โดย background poller, /api/realtime และ stream)
+    ทุก caller ของ target เดียวกันใช้ collection เดียวกัน ทำให้ delta ของ network
+    (interface_counters) ถูกคำนวณทีละครั้งตามลำดับเวลาเสมอ
+    """
+    target = normalize_target(target)
+    last = realtime_last.get(target)
+    if last is not None and time.monotonic() - last[0] < REALTIME_FRESHNESS:
+        return dict(last[1])
     
+    task = realtime_in_flight.get(target)
+    if task is None:
+        task = asyncio.ensure_future(collect_realtime_once(target))
+        realtime_in_flight[target] = task
+        task.add_done_callback(lambda t: realtime_in_flight.pop(target, None))
+    # shield: caller ที่ถูก cancel ไม่ยกเลิก collection ที่คนอื่นรออยู่
+    result = await asyncio.shield(task)
+    return dict(result)
+
+async def collect_realtime_once(target: str):
+    """Collect จริงหนึ่งครั้ง (เรียกผ่าน collect_realtime เท่านั้น)"""
     is_local = target in ['127.0.0.1', 'localhost']
     
     cpu_usage = 0
@@ -128,76 +233,33 @@ async def get_realtime_data(target: str = '127.0.0.1'):
     is_online = True
 
     if is_local:
-        cpu_usage = psutil.cpu_percent(interval=None)
-        mem = psutil.virtual_memory()
-        
-        mem_used_bytes = mem.total - mem.available
-        ram_data = {
-            "total": round(mem.total / (1024**3), 2),
-            "used": round(mem_used_bytes / (1024**3), 2),
-            "percent": round((mem_used_bytes / mem.total) * 100, 1)
-        }
-        
-        net_io_per_nic = psutil.net_io_counters(pernic=True)
-        net_stats = psutil.net_if_stats()
-        
-        current_total_recv = 0
-        current_total_sent = 0
-        
-        for nic, stats in net_stats.items():
-            if stats.isup and "loopback" not in nic.lower():
-                if nic in net_io_per_nic:
-                    io = net_io_per_nic[nic]
-                    current_total_recv += io.bytes_recv
-                    current_total_sent += io.bytes_sent
-
-        curr_time = time.time()
-        
-        if LAST_NET_TIME > 0:
-            time_diff = curr_time - LAST_NET_TIME
-            if time_diff > 0:
-                bytes_recv_diff = current_total_recv - LAST_NET_BYTES_RECV
-                bytes_sent_diff = current_total_sent - LAST_NET_BYTES_SENT
-                
-                if bytes_recv_diff < 0: bytes_recv_diff = 0
-                if bytes_sent_diff < 0: bytes_sent_diff = 0
-                
-                net_in_mbps = round((bytes_recv_diff * 8) / (time_diff * 1_000_000), 2)
-                net_out_mbps = round((bytes_sent_diff * 8) / (time_diff * 1_000_000), 2)
-        
-        LAST_NET_BYTES_RECV = current_total_recv
-        LAST_NET_BYTES_SENT = current_total_sent
-        LAST_NET_TIME = curr_time
+        # snapshot ล่าสุดจาก local collector (ยังไม่มี = ก่อน startup -> sample ทันทีหนึ่งครั้ง)
+        snapshot = local_collector.latest() or await local_collector.collect()
+        cpu_usage = snapshot["cpu"]
+        ram_data = snapshot["ram"]
+        net_in_mbps = snapshot["net_in_mbps"]
+        net_out_mbps = snapshot["net_out_mbps"]
         
     else:
         try:
-             cpu_usage = await asyncio.to_thread(get_cpu_loader, target)
-             ram_data = await asyncio.to_thread(get_ram_usage, target)
+             # CPU/RAM/Network อ่านใน GET เดียวจาก metadata ที่ cache ไว้
+             # (จำนวน SNMP request ที่วิ่งพร้อมกัน ทั้งระบบและต่อ device จำกัดใน SnmpClient)
+             sample = await collect_sample(target)
              
              # Check if SNMP connection failed (returns None)
-             if cpu_usage is None:
+             if sample is None:
                  is_online = False
                  cpu_usage = 0
                  ram_data = {"total": 0, "used": 0, "percent": 0}
              else:
-                 # SNMP successful - get network stats
-                 curr_recv, curr_sent = await asyncio.to_thread(get_net_io_counters, target)
-                 curr_time = time.time()
-                 
-                 if target in REMOTE_NET_CACHE:
-                     last_recv, last_sent, last_time = REMOTE_NET_CACHE[target]
-                     time_diff = curr_time - last_time
-                     if time_diff > 0:
-                         bytes_recv_diff = curr_recv - last_recv
-                         bytes_sent_diff = curr_sent - last_sent
-                         
-                         if bytes_recv_diff < 0: bytes_recv_diff = 0
-                         if bytes_sent_diff < 0: bytes_sent_diff = 0
-                         
-                         net_in_mbps = round((bytes_recv_diff * 8) / (time_diff * 1_000_000), 2)
-                         net_out_mbps = round((bytes_sent_diff * 8) / (time_diff * 1_000_000), 2)
-                 
-                 REMOTE_NET_CACHE[target] = (curr_recv, curr_sent, curr_time)
+                 cpu_usage = sample['cpu']
+                 ram_data = sample['ram']
+                 # rate ต่อ interface จาก counter รอบก่อน (เวลาตาม sysUpTime ของ agent, agent restart = เริ่มนับใหม่)
+                 counters = interface_counters.update(target, sample['interfaces'], sample['sysUpTime'],
+                                                   sample['speeds'])
+                 in_bps, out_bps = counters.totals()
+                 net_in_mbps = round(in_bps / 1_000_000, 2)
+                 net_out_mbps = round(out_bps / 1_000_000, 2)
 
         except Exception as e:
              print(f"Error getting realtime data for {target}: {e}")
@@ -205,7 +267,7 @@ async def get_realtime_data(target: str = '127.0.0.1'):
              ram_data = {"total": 0, "used": 0, "percent": 0}
              is_online = False
 
-    return {
+    result = {
         "status": "Online" if is_online else "Offline",
         "cpu_usage": cpu_usage,
         "ram_total": ram_data['total'],
@@ -214,121 +276,307 @@ async def get_realtime_data(target: str = '127.0.0.1'):
         "net_in_mbps": net_in_mbps,
         "net_out_mbps": net_out_mbps
     }
+    realtime_last[target] = (time.monotonic(), result)
+    return result
 
-@app.get("/api/scan-lan")
-async def get_lan_devices():
-    """Scan LAN และอัพเดท devices_store"""
-    global devices_store
-    
-    def scan_lan_logic():
-        _, ip_range = get_local_network()
-        if ip_range:
-            return scan(ip_range)
-        return []
+def merge_scanned_host(item: dict):
+    """เพิ่ม/อัพเดท device จาก host ที่ discovery เจอ"""
+    ip = item.get('ip', '')
+    mac = item.get('mac', '')
     
-    scanned = await asyncio.to_thread(scan_lan_logic)
+    # หา existing device
+    existing = devices_store.by_ip(ip)
     
-    # อัพเดท devices_store
-    for item in scanned:
-        ip = item.get('ip', '')
-        mac = item.get('mac', '')
-        
-        # หา existing device
-        existing = next((d for d in devices_store if d.ip == ip), None)
-        
-        if existing:
-            existing.status = "online"
-            existing.mac = mac
-        else:
-            # สร้าง device ใหม่
-            device = Device(
-                id=str(uuid.uuid4()),
-                name=f"device-{ip.split('.')[-1]}",
-                ip=ip,
-                mac=mac,
-                type=get_device_type_from_mac(mac) if mac else "server",
-                status="online",
-                vendor=get_vendor_from_mac(mac) if mac else "Unknown",
-                uptime="0d 0h 0m",
-                cpuLoad=0,
-                memoryUsage=0,
-                lastResponse=0
-            )
-            devices_store.append(device)
-    
-    # Mark devices not in scan as potentially offline
-    scanned_ips = [item.get('ip') for item in scanned]
+    if existing:
+        # SNMP sweep ไม่รู้ MAC -> ไม่ทับค่าเดิม
+        changes = {"status": "online", "mac": mac} if mac else {"status": "online"}
+        if devices_store.update(existing, **changes):
+            publish_device(existing)
+    else:
+        # สร้าง device ใหม่ (vendor/type เติมทีเดียวตอนสแกนจบ: apply_scan_vendors)
+        device = Device(
+            id=str(uuid.uuid4()),
+            name=f"device-{ip.split('.')[-1]}",
+            ip=ip,
+            mac=mac,
+            type="server",
+            status="online",
+            vendor="Unknown",
+            uptime="0d 0h 0m",
+            cpuLoad=0,
+            memoryUsage=0,
+            lastResponse=0
+        )
+        devices_store.add(device)
+        publish_device(device)
+
+def mark_missing_offline(job):
+    """Device ที่ถูก probe แต่ไม่ตอบ -> offline (IP ที่ incremental scan ข้ามไม่นับ)"""
+    found_ips = {host['ip'] for host in job.hosts}
     for device in devices_store:
-        if device.ip not in scanned_ips and device.ip != '127.0.0.1':
-            device.status = "offline"
-    
+        if device.ip not in found_ips and device.ip != '127.0.0.1' and job.probed(device.ip):
+            devices_store.update(device, status="offline")
+
+def apply_scan_vendors(job):
+    """
+    Lookup vendor ของทุก host ที่มี MAC ในครั้งเดียว (batch)
+    แล้วเติมให้ device ที่ยังเป็น Unknown (เช่น SNMP เจอก่อน แล้ว ARP ได้ MAC ทีหลัง)
+    """
+    hosts = [host for host in job.hosts if host.get('mac')]
+    for host, vendor in zip(hosts, oui.vendors_for([host['mac'] for host in hosts])):
+        host['vendor'] = vendor or "Unknown"
+        device = devices_store.by_ip(host['ip'])
+        if vendor and device is not None and device.vendor == "Unknown":
+            changes = {"vendor": vendor}
+            if device.type == "server":
+                changes["type"] = oui.device_type_for(vendor)
+            devices_store.update(device, **changes)
+
+def on_scan_done(job):
+    apply_scan_vendors(job)
+    mark_missing_offline(job)
+    publish_devices()
+
+def start_scan(request: ScanRequest):
+    ranges = request.ranges or get_local_networks()
+    if not ranges:
+        raise HTTPException(status_code=500, detail="Cannot determine local network")
+    # โหลด OUI registry ระหว่างสแกน (ไม่ทำตอน startup)
+    oui.preload()
+    try:
+        return discovery.start(ranges, request.methods, request.rate, request.sweepRate, request.timeout,
+                               on_host=merge_scanned_host, on_done=on_scan_done, full=request.full)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/scan-lan")
+async def get_lan_devices():
+    """Scan LAN และอัพเดท devices_store (รอจนสแกนเสร็จ)"""
+    job = start_scan(ScanRequest())
+    await asyncio.shield(job.task)
     return {"devices": [d.dict() for d in devices_store]}
 
-@app.get("/api/devices")
-async def get_devices():
-    """ดึงรายการ devices ทั้งหมด พร้อม realtime data"""
-    result = []
+@app.post("/api/scan")
+async def create_scan(request: ScanRequest):
+    """เริ่ม scan job แล้ว return ทันที (ติดตามผลด้วย GET /api/scan/{id} หรือ /api/scan/{id}/stream)"""
+    job = start_scan(request)
+    return job.progress()
+
+@app.get("/api/scan")
+async def list_scans():
+    """รายการ scan job ล่าสุด"""
+    return {"jobs": [job.progress() for job in discovery.jobs()]}
+
+@app.get("/api/scan/{job_id}")
+async def get_scan(job_id: str, since: int = 0):
+    """สถานะ job และ hosts ที่เจอตั้งแต่ลำดับที่ since (สำหรับ polling)"""
+    job = discovery.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job.to_dict(since)
+
+@app.get("/api/scan/{job_id}/stream")
+async def stream_scan(job_id: str):
+    """Server-Sent Events: snapshot แล้วตามด้วย host / progress / done"""
+    job = discovery.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return StreamingResponse(job.stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.delete("/api/scan/{job_id}")
+async def cancel_scan(job_id: str):
+    """ยกเลิก scan job"""
+    job = discovery.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job.progress()
+
+def apply_poll_result(device: Device, realtime: dict):
+    """อัพเดทสถานะ device จากผลการ poll และสร้าง/clear alert ตามเงื่อนไข"""
+    device.lastPolled = realtime.get('lastPolled')
+    source = device_source(device)
+
+    # ตรวจสอบว่า connection สำเร็จหรือไม่ (ดูจาก status เท่านั้น)
+    if realtime.get('status') == 'Offline':
+        # SNMP/Connection failed - only alert if status changed
+        if device.status != "offline":
+            devices_store.update(device, status="offline", cpuLoad=0, memoryUsage=0)
+            # สร้าง alert สำหรับ device ที่เข้าไม่ถึง
+            error = realtime.get('error')
+            generate_alert(
+                "critical",
+                source,
+                f"Device unreachable - {error[:50]}" if error else "Device unreachable - SNMP/Connection timeout",
+                OID_UNREACHABLE,
+                "unreachable",
+                key=device.id,
+            )
+        return
+
+    # Connection successful
+    clear_alert(device.id, OID_UNREACHABLE, "unreachable")
+    sample = {
+        "cpu": realtime.get('cpu_usage'),
+        "memory": realtime.get('ram_usage_percent'),
+        "net_in": realtime.get('net_in_mbps'),
+        "net_out": realtime.get('net_out_mbps'),
+    }
+
+    # ประเมิน rules ของ metric ใน sample นี้ (firing ซ้ำ = นับ count ใน alert เดิม)
+    for event, rule, value in rule_engine.evaluate(device.ip, device.type, sample, time.time()):
+        if event == "firing":
+            generate_alert(rule.severity, source, rule.format(value), rule.oid, rule.id, key=device.id)
+        else:
+            clear_alert(device.id, rule.oid, rule.id)
+    warning = any(rule.severity != "info" for rule in rule_engine.firing(device.ip).values())
+
+    devices_store.update(
+        device,
+        cpuLoad=int(realtime.get('cpu_usage', 0)),
+        memoryUsage=int(realtime.get('ram_usage_percent', 0)),
+        status="warning" if warning else "online",
+    )
     
-    for device in devices_store:
-        # ดึง realtime data สำหรับแต่ละ device
-        try:
-            realtime = await get_realtime_data(device.ip)
-            
-            # ตรวจสอบว่า connection สำเร็จหรือไม่ (ดูจาก status เท่านั้น)
-            if realtime.get('status') == 'Offline':
-                # SNMP/Connection failed - only alert if status changed
-                if device.status != "offline":
-                    device.status = "offline"
-                    device.cpuLoad = 0
-                    device.memoryUsage = 0
-                    # สร้าง alert สำหรับ device ที่เข้าไม่ถึง
-                    generate_alert(
-                        "critical", 
-                        f"{device.name} ({device.ip})", 
-                        "Device unreachable - SNMP/Connection timeout",
-                        "1.3.6.1.4.1.9.9.43.1.1.6.1.3"
-                    )
-            else:
-                # Connection successful
-                device.cpuLoad = int(realtime.get('cpu_usage', 0))
-                device.memoryUsage = int(realtime.get('ram_usage_percent', 0))
-                device.status = "online"
-                device.lastResponse = 1  # Connected
-                
-                # ตรวจสอบ warning conditions
-                if device.cpuLoad > 80 or device.memoryUsage > 85:
-                    device.status = "warning"
-                    if device.cpuLoad > 80:
-                        generate_alert(
-                            "warning", 
-                            f"{device.name} ({device.ip})", 
-                            f"High CPU utilization ({device.cpuLoad}%)",
-                            "1.3.6.1.4.1.9.2.1.56"
-                        )
-                    if device.memoryUsage > 85:
-                        generate_alert(
-                            "warning", 
-                            f"{device.name} ({device.ip})", 
-                            f"High memory usage ({device.memoryUsage}%)",
-                            "1.3.6.1.4.1.9.9.48.1.1.1.6"
-                        )
-                        
-        except Exception as e:
-            # Connection/SNMP error
-            if device.status != "offline":
-                device.status = "offline"
-                device.cpuLoad = 0
-                device.memoryUsage = 0
-                generate_alert(
-                    "critical", 
-                    f"{device.name} ({device.ip})", 
-                    f"Device unreachable - {str(e)[:50]}",
-                    "1.3.6.1.4.1.9.9.43.1.1.6.1.3"
-                )
-        
-        result.append(device.dict())
+    # บันทึก sample ลง metric store และ recent store
+    metric_store.record(device.ip, sample)
+    recent_store.record(device.ip, sample, interval=poller.base_interval(device))
+
+def on_poll_result(device: Device, realtime: dict):
+    """อัพเดท device แล้ว push ผลให้ stream (realtime ทุกครั้ง, device เฉพาะเมื่อค่าเปลี่ยน)"""
+    before = device.dict(exclude={"lastPolled"})
+    apply_poll_result(device, realtime)
+    stream_hub.publish("realtime", "realtime", {"target": device.ip, **realtime}, target=device.ip)
+    if device.dict(exclude={"lastPolled"}) != before:
+        publish_device(device)
+
+def interface_name(ip: str, trap) -> str:
+    """ชื่อ interface ของ trap: ifDescr ใน varbind, หรือจาก metadata ที่ walk ไว้, หรือ ifIndex"""
+    descr = trap.value(trap_receiver.OID_IF_DESCR)
+    if isinstance(descr, bytes):
+        return descr.decode('utf-8', errors='replace')
+    if_index = trap.if_index
+    if if_index is None:
+        return "unknown interface"
+    metadata = METADATA_CACHE.get(normalize_target(ip))
+    name = metadata.if_descr.get(str(if_index)) if metadata is not None else None
+    return name or f"ifIndex {if_index}"
+
+def on_trap(trap):
+    """
+    Trap/Inform เข้ามา -> alert ทันที ไม่ต้องรอรอบ poll
+    linkDown/linkUp/coldStart/warmStart ยังสั่ง poll device นั้นทันที (ข้อมูล interface เปลี่ยน)
+    """
+    ip = trap.agent
+    device = devices_store.by_ip(ip)
+    source = device_source(device) if device is not None else ip
+    key = device.id if device is not None else ip
+    trap_oid = trap.trap_oid
+
+    if trap_oid in (trap_receiver.TRAP_LINK_DOWN, trap_receiver.TRAP_LINK_UP):
+        name = interface_name(ip, trap)
+        condition = f"linkDown:{trap.if_index}"
+        if trap_oid == trap_receiver.TRAP_LINK_DOWN:
+            generate_alert("critical", source, f"Link down on {name}", trap_receiver.TRAP_LINK_DOWN, condition,
+                           key=key)
+        else:
+            clear_alert(key, trap_receiver.TRAP_LINK_DOWN, condition)
+            generate_alert("info", source, f"Link up on {name}", trap_receiver.TRAP_LINK_UP,
+                           f"linkUp:{trap.if_index}", key=key)
+            clear_alert(key, trap_receiver.TRAP_LINK_UP, f"linkUp:{trap.if_index}")
+    elif trap_oid in (trap_receiver.TRAP_COLD_START, trap_receiver.TRAP_WARM_START):
+        kind = "cold" if trap_oid == trap_receiver.TRAP_COLD_START else "warm"
+        generate_alert("warning", source, f"Device restarted ({kind} start)", trap_oid, "restart", key=key)
+        clear_alert(key, trap_oid, "restart")
+    elif trap_oid == trap_receiver.TRAP_AUTH_FAILURE:
+        generate_alert("warning", source, "SNMP authentication failure", trap_oid, "authenticationFailure",
+                       key=key)
+    else:
+        generate_alert("info", source, f"Trap {trap_oid}", trap_oid, trap_oid, key=key)
+
+    if device is not None and trap_oid in (trap_receiver.TRAP_LINK_DOWN, trap_receiver.TRAP_LINK_UP,
+                                           trap_receiver.TRAP_COLD_START, trap_receiver.TRAP_WARM_START):
+        invalidate_metadata(normalize_target(ip))
+        poller.poll_soon(ip)
+
+# รับ SNMP trap/inform (UDP 162, ตั้งพอร์ตด้วย NMS_TRAP_PORT, 0 = ปิด)
+trap_listener = TrapReceiver(on_trap)
+
+async def poll_collect(device: Device):
+    return await collect_realtime(device.ip)
+
+async def poll_probe(device: Device):
+    """Liveness check ก่อน poll เต็มชุด สำหรับ device ที่ poll ไม่สำเร็จ (GET sysUpTime ครั้งเดียว)"""
+    target = normalize_target(device.ip)
+    if target == '127.0.0.1':
+        return True
+    return await probe_alive(target)
+
+# Background poller: เขียนผลลง snapshot ให้ endpoint อ่านได้ทันที
+# device ที่มีคนเปิด stream อยู่จะถูก poll ถี่ขึ้น (ครั้งเดียวต่อรอบ ไม่ว่าจะมีกี่ client)
+# device ที่ติดต่อไม่ได้ถูก backoff (รอบยาวขึ้นเท่าตัวทุกครั้งที่ fail) และเช็คด้วย probe เดียวก่อน
+poller = DevicePoller(lambda: devices_store, poll_collect, on_poll_result,
+                      is_watched=stream_hub.watched, probe=poll_probe)
+
+# target ที่ stream อยู่แต่ไม่ได้อยู่ใน devices_store -> task poll แยก (หนึ่ง task ต่อ target)
+unmonitored_streams = {}
+
+async def stream_unmonitored(target: str):
+    """Poll target ที่ไม่ได้ monitor ตราบที่ยังมีคนดูอยู่"""
+    try:
+        while stream_hub.watched(target):
+            realtime = await collect_realtime(target)
+            realtime["lastPolled"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            stream_hub.publish("realtime", "realtime", {"target": target, **realtime}, target=target)
+            await asyncio.sleep(poller.stream_interval)
+    finally:
+        unmonitored_streams.pop(target, None)
+
+def compute_stats():
+    # นับจาก counter ของ registry (อัพเดททุกครั้งที่ device เปลี่ยน) ไม่ต้องวนทุก device
+    stats = devices_store.stats()
+    critical_alerts = alerts_store.unacknowledged("critical")
     
-    return {"devices": result}
+    return {
+        "total": stats["total"],
+        "online": stats["online"],
+        "offline": stats["offline"],
+        "warning": stats["warning"],
+        "criticalAlerts": critical_alerts,
+        "avgLatency": stats["avgLatency"]
+    }
+
+async def push_stats_loop():
+    """คำนวณ stats ครั้งเดียวต่อรอบ แล้ว push เมื่อค่าเปลี่ยน"""
+    last = None
+    while True:
+        await asyncio.sleep(STATS_PUSH_INTERVAL)
+        if not stream_hub.has_subscribers("devices"):
+            last = None
+            continue
+        stats = compute_stats()
+        if stats != last:
+            stream_hub.publish("devices", "stats", stats)
+            last = stats
+
+stats_task = None
+
+@app.get("/api/realtime")
+async def get_realtime_data(target: str = '127.0.0.1'):
+    """อ่านค่า realtime ล่าสุดจาก poller snapshot"""
+    cached = poller.get(target)
+    if cached is not None:
+        return cached
+    # target ที่ไม่ได้อยู่ในรายการ monitor -> ดึงสดครั้งเดียว
+    return await collect_realtime(target)
+
+@app.get("/api/devices")
+async def get_devices(status: Optional[str] = None, type: Optional[str] = None, vendor: Optional[str] = None):
+    """ดึงรายการ devices (ค่าล่าสุดจาก background poller) กรองด้วย status/type/vendor ได้"""
+    criteria = {k: v for k, v in (("status", status), ("type", type), ("vendor", vendor)) if v is not None}
+    return {"devices": [d.dict() for d in devices_store.find(**criteria)]}
 
 @app.post("/api/devices")
 async def add_device(device_input: DeviceInput):
@@ -339,129 +587,325 @@ async def add_device(device_input: DeviceInput):
         ip=device_input.ip,
         type=device_input.type,
         vendor=device_input.vendor,
+        pollInterval=device_input.pollInterval,
         status="online",
         uptime="0d 0h 0m",
         cpuLoad=0,
         memoryUsage=0,
         lastResponse=0
     )
-    devices_store.append(device)
+    devices_store.add(device)
+    publish_device(device)
     
-    generate_alert("info", f"{device.name} ({device.ip})", 
-                  "Device added to monitoring", "1.3.6.1.6.3.1.1.5.4")
+    generate_alert("info", device_source(device),
+                  "Device added to monitoring", "1.3.6.1.6.3.1.1.5.4", key=device.id)
     
     return device.dict()
 
 @app.put("/api/devices/{device_id}")
 async def update_device(device_id: str, device_input: DeviceInput):
     """อัพเดท device"""
-    device = next((d for d in devices_store if d.id == device_id), None)
+    device = devices_store.get(device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    device.name = device_input.name
-    device.ip = device_input.ip
-    device.type = device_input.type
-    device.vendor = device_input.vendor
+    if device.ip != device_input.ip:
+        # IP เปลี่ยน -> ล้าง snapshot เก่าและ poll ใหม่ทันที (สถานะ rule เริ่มใหม่ -> clear alert เดิมด้วย)
+        poller.forget(device.id, device.ip)
+        rule_engine.forget(device.ip)
+        clear_device_alerts(device)
+    elif device.pollInterval != device_input.pollInterval or device.type != device_input.type:
+        # รอบ poll เปลี่ยน -> poll ทันทีแล้วนับรอบใหม่
+        poller.poll_soon(device.ip)
+    
+    devices_store.update(
+        device,
+        name=device_input.name,
+        ip=device_input.ip,
+        type=device_input.type,
+        vendor=device_input.vendor,
+        pollInterval=device_input.pollInterval,
+    )
+    publish_device(device)
     
     return device.dict()
 
 @app.delete("/api/devices/{device_id}")
 async def delete_device(device_id: str):
     """ลบ device"""
-    global devices_store
-    device = next((d for d in devices_store if d.id == device_id), None)
+    device = devices_store.remove(device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    devices_store = [d for d in devices_store if d.id != device_id]
+    recent_store.forget(device.ip)
+    poller.forget(device.id, device.ip)
+    rule_engine.forget(device.ip)
+    invalidate_metadata(device.ip)
+    interface_counters.forget(device.ip)
+    realtime_last.pop(device.ip, None)
+    stream_hub.publish("devices", "device_removed", {"id": device_id})
     
-    generate_alert("info", f"{device.name} ({device.ip})", 
-                  "Device removed from monitoring", "1.3.6.1.6.3.1.1.5.4")
+    # ไม่มีใคร clear alert ของ device ที่ถูกลบแล้ว -> clear ทั้งหมดตอนนี้
+    clear_device_alerts(device)
+    generate_alert("info", device_source(device),
+                  "Device removed from monitoring", "1.3.6.1.6.3.1.1.5.4", key=device.id)
+    clear_alert(device.id, "1.3.6.1.6.3.1.1.5.4", "Device removed from monitoring")
     
     return {"message": "Device deleted"}
 
 @app.get("/api/alerts")
 async def get_alerts():
-    """ดึง alerts ทั้งหมด"""
-    return {"alerts": [a.dict() for a in alerts_store]}
+    """ดึง alerts ทั้งหมด (ใหม่สุดก่อน)"""
+    return {"alerts": [a.dict() for a in alerts_store], "suppressed": dict(alerts_store.suppressed)}
+
+@app.get("/api/alerts/history")
+async def get_alert_history(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    severity: Optional[str] = None,
+    source: Optional[str] = None,
+):
+    """ประวัติ alert จาก SQLite ทีละหน้า (รวม alert ที่หลุดจาก ring buffer แล้ว)"""
+    await alerts_store.flush()
+    return await asyncio.to_thread(alerts_store.history, limit, offset, severity, source)
 
 @app.post("/api/alerts/{alert_id}/acknowledge")
 async def acknowledge_alert(alert_id: str):
     """Acknowledge alert"""
-    alert = next((a for a in alerts_store if a.id == alert_id), None)
+    alert = alerts_store.acknowledge(alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
-    alert.acknowledged = True
+    stream_hub.publish("alerts", "alert_ack", {"ids": [alert_id]})
     return alert.dict()
 
 @app.post("/api/alerts/acknowledge-all")
 async def acknowledge_all_alerts():
     """Acknowledge all alerts"""
-    for alert in alerts_store:
-        alert.acknowledged = True
+    alerts_store.acknowledge_all()
+    stream_hub.publish("alerts", "alert_ack", {"all": True})
     return {"message": "All alerts acknowledged"}
 
+@app.get("/api/rules")
+async def get_rules():
+    """Threshold rules ที่ใช้อยู่"""
+    return rule_engine.config
+
+@app.put("/api/rules")
+async def put_rules(config: RulesConfig):
+    """แทนที่ rules ทั้งชุด (compile ครั้งเดียว แล้วบันทึกลงไฟล์)"""
+    try:
+        previous = rule_engine.compile(config.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # condition เริ่มนับใหม่หมด -> clear alert ของ rule ที่เคย firing
+    for ip, rules in previous.items():
+        device = devices_store.by_ip(ip)
+        if device is not None:
+            for rule in rules.values():
+                clear_alert(device.id, rule.oid, rule.id)
+    await asyncio.to_thread(rule_engine.save)
+    return rule_engine.config
+
 @app.get("/api/stats")
 async def get_stats():
     """ดึงสถิติรวม"""
-    total = len(devices_store)
-    online = len([d for d in devices_store if d.status == "online"])
-    offline = len([d for d in devices_store if d.status == "offline"])
-    warning = len([d for d in devices_store if d.status == "warning"])
-    critical_alerts = len([a for a in alerts_store if a.severity == "critical" and not a.acknowledged])
-    
-    # คำนวณ avg latency (สมมติว่า devices ที่ online มี response time)
-    online_devices = [d for d in devices_store if d.status != "offline"]
-    avg_latency = round(sum(d.lastResponse for d in online_devices) / len(online_devices), 0) if online_devices else 0
-    
+    return compute_stats()
+
+@app.get("/api/local")
+async def get_local_metrics():
+    """Metrics ล่าสุดของเครื่องที่รัน backend แยกทุก NIC"""
+    return local_collector.latest() or await local_collector.collect()
+
+@app.get("/api/local/history")
+async def get_local_history(window: Optional[float] = Query(None, gt=0)):
+    """Snapshots ของเครื่อง local ย้อนหลัง window วินาที (สูงสุด NMS_LOCAL_HISTORY)"""
+    return {"interval": local_collector.interval, "snapshots": local_collector.window(window)}
+
+@app.get("/api/interfaces/top")
+async def get_top_interfaces(metric: str = "total", n: int = Query(20, ge=1, le=1000)):
+    """Interface ที่ค่า metric สูงสุด n อันดับจากทุก device (partial sort ของ rate ล่าสุด)"""
+    if metric not in TOP_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(TOP_METRICS)}")
+    interfaces = []
+    for target, if_index, counter in interface_counters.top(metric, n):
+        device = devices_store.by_ip(target)
+        metadata = METADATA_CACHE.get(target)
+        interfaces.append({
+            "deviceId": device.id if device is not None else None,
+            "device": device.name if device is not None else target,
+            "ip": target,
+            "ifIndex": if_index,
+            # NIC ของเครื่อง local ใช้ชื่อเป็น key อยู่แล้ว
+            "name": metadata.if_descr.get(if_index) if metadata is not None else if_index,
+            **counter.to_dict(),
+        })
+    return {"metric": metric, "interfaces": interfaces, "total": len(interface_counters)}
+
+@app.get("/api/snmp/stats")
+async def get_snmp_stats():
+    """จำนวน SNMP round trip (request PDU) ต่อ target"""
     return {
-        "total": total,
-        "online": online,
-        "offline": offline,
-        "warning": warning,
-        "criticalAlerts": critical_alerts,
-        "avgLatency": int(avg_latency)
+        "roundTrips": dict(SNMP_ROUND_TRIPS),
+        "total": get_round_trips(),
+        "traps": {"listening": trap_listener.listening, **trap_listener.stats},
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Metrics ทั้งหมดในรูปแบบ Prometheus text exposition"""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/history")
+async def get_history(
+    device: str,
+    metric: str = "cpu",
+    from_: Optional[float] = Query(None, alias="from"),
+    to: Optional[float] = None,
+    step: Optional[int] = None,
+):
+    """ดึงประวัติ metric ของ device (device = id หรือ IP, from/to = epoch seconds, step = วินาที)"""
+    found = devices_store.get(device)
+    ip = found.ip if found else device
+    
+    end = to if to is not None else time.time()
+    start = from_ if from_ is not None else end - 3600
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    
+    points = await asyncio.to_thread(metric_store.query, ip, metric, start, end, step)
+    return {"device": ip, "metric": metric, "points": points}
+
+@app.get("/api/recent")
+async def get_recent(device: str, metric: str = "cpu", window: Optional[float] = None):
+    """ค่าล่าสุดทุก sample ภายใน window วินาที (default 1 ชั่วโมง) จาก ring buffer"""
+    found = devices_store.get(device)
+    ip = found.ip if found else device
+    return {"device": ip, "metric": metric, "points": recent_store.points(ip, metric, window)}
+
+@app.get("/api/recent/summary")
+async def get_recent_summary(metric: str = "cpu", window: Optional[float] = None, percentile: float = 95):
+    """min/max/avg/percentile ของ metric ทุก device (และรวมทั้งระบบ)"""
+    if not 0 <= percentile <= 100:
+        raise HTTPException(status_code=400, detail="percentile must be between 0 and 100")
+    result = recent_store.summary(metric, window, percentile)
+    result["memory"] = recent_store.memory_usage()
+    return result
+
+@app.get("/api/stream")
+async def stream(topics: Optional[str] = None, targets: List[str] = Query([])):
+    """
+    Server-Sent Events: ส่ง snapshot ตอนเชื่อมต่อ แล้วตามด้วย delta
+    topics = devices,alerts,realtime (default ทั้งหมด), targets = IP ที่ต้องการ realtime (ระบุซ้ำได้)
+    events: snapshot, realtime, device, devices, device_removed, stats, alert, alert_ack
+    """
+    wanted = [t for t in topics.split(",") if t] if topics else list(TOPICS)
+    unknown = [t for t in wanted if t not in TOPICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown topics: {', '.join(unknown)}")
+    
+    sub = stream_hub.subscribe(wanted, targets)
+    
+    snapshot = {}
+    if "devices" in sub.topics:
+        snapshot["devices"] = [d.dict() for d in devices_store]
+        snapshot["stats"] = compute_stats()
+    if "alerts" in sub.topics:
+        snapshot["alerts"] = [a.dict() for a in alerts_store]
+    if "realtime" in sub.topics:
+        snapshot["realtime"] = {}
+        for target in sub.targets:
+            cached = poller.get(target)
+            if cached is not None:
+                snapshot["realtime"][target] = {"target": target, **cached}
+            if devices_store.by_ip(target) is not None:
+                poller.poll_soon(target)
+            elif target not in unmonitored_streams:
+                unmonitored_streams[target] = asyncio.create_task(stream_unmonitored(target))
+    
+    async def events():
+        try:
+            async for frame in stream_hub.stream(sub, sse_frame("snapshot", snapshot)):
+                yield frame
+        finally:
+            stream_hub.unsubscribe(sub)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+def record_ping(device: Device, result):
+    """บันทึก RTT min/avg/max และ packet loss ของ ping ลง device (ไม่ตอบ = lastResponse 0)"""
+    changed = devices_store.update(
+        device,
+        lastResponse=result.avg or 0,
+        rttMin=result.min,
+        rttMax=result.max,
+        packetLoss=result.loss,
+    )
+    if changed:
+        publish_device(device)
+
+async def ping_sweep_loop():
+    """Ping ทุก device พร้อมกันเป็นรอบ (ไม่เปลี่ยน status: บาง device กรอง ICMP แต่ SNMP ยังตอบ)"""
+    while True:
+        await asyncio.sleep(PING_SWEEP_INTERVAL)
+        try:
+            devices = list(devices_store)
+            results = await pinger.ping_many([d.ip for d in devices])
+            for device in devices:
+                if device.id in devices_store and device.ip in results:
+                    record_ping(device, results[device.ip])
+        except Exception as e:
+            print(f"Ping sweep error: {e}")
+
+@app.post("/api/ping")
+async def ping_batch(request: PingRequest):
+    """Ping หลาย host พร้อมกัน; host ที่เป็น device จะถูกบันทึก RTT/loss ลง device"""
+    if request.count is not None and not 1 <= request.count <= 10:
+        raise HTTPException(status_code=400, detail="count must be between 1 and 10")
+    if request.timeout is not None and not 0 < request.timeout <= 5:
+        raise HTTPException(status_code=400, detail="timeout must be between 0 and 5 seconds")
+
+    hosts = list(request.ips or [])
+    for device_id in request.deviceIds or []:
+        device = devices_store.get(device_id)
+        if device is None:
+            raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
+        hosts.append(device.ip)
+    if request.ips is None and request.deviceIds is None:
+        hosts = [d.ip for d in devices_store]
+
+    results = await pinger.ping_many(hosts, request.count, request.timeout)
+    for host, result in results.items():
+        device = devices_store.by_ip(host)
+        if device is not None:
+            record_ping(device, result)
+    return {"mode": pinger.mode, "results": [result.to_dict() for result in results.values()]}
+
 @app.post("/api/ping/{device_id}")
 async def ping_device(device_id: str):
-    """Ping device และ return ผลลัพธ์"""
-    device = next((d for d in devices_store if d.id == device_id), None)
+    """Ping device และ return ผลลัพธ์ (ไม่ block event loop)"""
+    device = devices_store.get(device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    
-    import subprocess
-    import platform
-    
-    param = "-n" if platform.system().lower() == "windows" else "-c"
-    
-    try:
-        result = subprocess.run(
-            ["ping", param, "4", device.ip],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        lines = result.stdout.strip().split("\n")
-        # อัพเดท device response time
-        if result.returncode == 0:
-            device.status = "online"
-            device.lastResponse = 2  # Estimate
-        else:
-            device.status = "offline"
-            
-        return {
-            "success": result.returncode == 0,
-            "output": lines[-5:] if len(lines) > 5 else lines
-        }
-    except subprocess.TimeoutExpired:
-        device.status = "offline"
-        generate_alert("critical", f"{device.name} ({device.ip})", 
-                      "Device unreachable - ping timeout", "1.3.6.1.4.1.9.9.43.1.1.6.1.3")
-        return {"success": False, "output": ["Request timed out."]}
+
+    result = await pinger.ping(device.ip, count=4)
+    record_ping(device, result)
+    if result.alive:
+        devices_store.update(device, status="online")
+        output = [f"Reply from {device.ip}: time={rtt:.2f} ms" for rtt in result.rtts]
+        output.append(f"Packets: sent = {result.sent}, received = {result.received}, lost = {result.loss}%")
+        output.append(f"RTT min/avg/max = {result.min:.2f}/{result.avg:.2f}/{result.max:.2f} ms")
+    else:
+        devices_store.update(device, status="offline")
+        generate_alert("critical", device_source(device),
+                       "Device unreachable - ping timeout", OID_UNREACHABLE, "unreachable", key=device.id)
+        output = [result.error or "Request timed out."]
+    publish_device(device)
+
+    return {"success": result.alive, "output": output, **result.to_dict()}
 
 # ==================== Startup Event ====================
 
@@ -479,12 +923,45 @@ async def startup_event():
         uptime="0d 0h 0m",
         cpuLoad=0,
         memoryUsage=0,
-        lastResponse=1
+        lastResponse=0
     )
-    devices_store.append(localhost)
+    devices_store.add(localhost)
     
     # สร้าง welcome alert
     generate_alert("info", "NMS System", "Network Monitoring System started", "1.3.6.1.6.3.1.1.5.4")
+    
+    # thread pool ของ asyncio.to_thread (สร้างเมื่อใช้ครั้งแรก)
+    loop = asyncio.get_running_loop()
+    THREADPOOL_QUEUE.labels("default").set_function(
+        lambda: metrics.executor_queue_depth(getattr(loop, "_default_executor", None)))
+    THREADPOOL_THREADS.labels("default").set_function(
+        lambda: metrics.executor_threads(getattr(loop, "_default_executor", None)))
+
+    # เริ่ม background poller
+    global stats_task, ping_task
+    metric_store.start()
+    alerts_store.start()
+    local_collector.start()
+    poller.start()
+    await trap_listener.start()
+    stats_task = asyncio.create_task(push_stats_loop())
+    if PING_SWEEP_INTERVAL > 0:
+        ping_task = asyncio.create_task(ping_sweep_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if stats_task is not None:
+        stats_task.cancel()
+    if ping_task is not None:
+        ping_task.cancel()
+    pinger.close()
+    for task in list(unmonitored_streams.values()):
+        task.cancel()
+    trap_listener.stop()
+    await poller.stop()
+    await local_collector.stop()
+    await metric_store.stop()
+    await alerts_store.stop()
 
 if __name__ == "__main__":
     import uvicorn
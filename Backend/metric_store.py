@@ -0,0 +1,240 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+# SQLite file for persistent metric history
+METRICS_DB_PATH = os.getenv(
+    "NMS_METRICS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "metrics.db")
+)
+
+FLUSH_INTERVAL = 2.0        # seconds between batched writes
+PRUNE_INTERVAL = 3600.0     # seconds between retention sweeps
+
+# Retention per resolution (seconds)
+RAW_RETENTION = 2 * 86400
+MINUTE_RETENTION = 35 * 86400
+HOUR_RETENTION = 400 * 86400
+
+# Max points returned by one query when no step is given
+DEFAULT_MAX_POINTS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    device TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    UNIQUE (device, metric)
+);
+CREATE TABLE IF NOT EXISTS samples_raw (
+    series_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,            -- epoch milliseconds
+    value REAL NOT NULL,
+    PRIMARY KEY (series_id, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS samples_1m (
+    series_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,            -- bucket start, epoch milliseconds
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (series_id, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS samples_1h (
+    series_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (series_id, ts)
+) WITHOUT ROWID;
+"""
+
+# Rollups are maintained on insert, so no job ever has to rescan raw samples
+_ROLLUP_UPSERT = """
+INSERT INTO {table} (series_id, ts, min, max, sum, count) VALUES (?, ?, ?, ?, ?, 1)
+ON CONFLICT (series_id, ts) DO UPDATE SET
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max),
+    sum = sum + excluded.sum,
+    count = count + 1
+"""
+
+# (table, bucket size in ms, retention in seconds), finest first
+_RESOLUTIONS = [
+    ("samples_raw", 0, RAW_RETENTION),
+    ("samples_1m", 60_000, MINUTE_RETENTION),
+    ("samples_1h", 3_600_000, HOUR_RETENTION),
+]
+
+
+class MetricStore:
+    """
+    Persistent time-series store on SQLite.
+
+    Samples are buffered in memory and written in batches from a worker
+    thread. Every raw sample is also folded into 1-minute and 1-hour
+    aggregates (min/max/sum/count). Each resolution has its own retention,
+    and range queries read the coarsest table that still fits the step.
+    """
+
+    def __init__(self, path=METRICS_DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()   # one connection shared by worker threads
+        self._series = {}               # (device, metric) -> series id
+        self._buffer = []               # (device, metric, ts_ms, value)
+        self._task = None
+
+    # ---------- lifecycle ----------
+
+    def open(self):
+        if self._conn is not None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        for series_id, device, metric in conn.execute("SELECT id, device, metric FROM series"):
+            self._series[(device, metric)] = series_id
+        self._conn = conn
+
+    def start(self):
+        self.open()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    async def _run(self):
+        last_prune = 0.0
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.flush)
+                if time.monotonic() - last_prune >= PRUNE_INTERVAL:
+                    last_prune = time.monotonic()
+                    await asyncio.to_thread(self.prune)
+            except Exception as e:
+                print(f"Metric store error: {e}")
+
+    # ---------- writes ----------
+
+    def record(self, device, values, ts=None):
+        """Queue one sample per metric, e.g. record('10.0.0.1', {'cpu': 12.5})"""
+        ts_ms = int((time.time() if ts is None else ts) * 1000)
+        for metric, value in values.items():
+            if value is not None:
+                self._buffer.append((device, metric, ts_ms, float(value)))
+
+    def _series_id(self, device, metric):
+        key = (device, metric)
+        series_id = self._series.get(key)
+        if series_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO series (device, metric) VALUES (?, ?)", key)
+            series_id = self._conn.execute(
+                "SELECT id FROM series WHERE device = ? AND metric = ?", key).fetchone()[0]
+            self._series[key] = series_id
+        return series_id
+
+    def flush(self):
+        """Write buffered samples (runs in a worker thread)"""
+        if not self._buffer or self._conn is None:
+            return 0
+        # Swap the buffer; record() keeps appending to the new list
+        batch, self._buffer = self._buffer, []
+
+        with self._lock, self._conn:
+            raw, minute, hour = [], [], []
+            for device, metric, ts_ms, value in batch:
+                series_id = self._series_id(device, metric)
+                raw.append((series_id, ts_ms, value))
+                minute.append((series_id, ts_ms - ts_ms % 60_000, value, value, value))
+                hour.append((series_id, ts_ms - ts_ms % 3_600_000, value, value, value))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO samples_raw (series_id, ts, value) VALUES (?, ?, ?)", raw)
+            self._conn.executemany(_ROLLUP_UPSERT.format(table="samples_1m"), minute)
+            self._conn.executemany(_ROLLUP_UPSERT.format(table="samples_1h"), hour)
+        return len(batch)
+
+    def prune(self):
+        """Apply retention per resolution (per series, so deletes use the primary key)"""
+        if self._conn is None:
+            return
+        now_ms = int(time.time() * 1000)
+        with self._lock, self._conn:
+            series_ids = list(self._series.values())
+            for table, _, retention in _RESOLUTIONS:
+                cutoff = now_ms - retention * 1000
+                self._conn.executemany(
+                    f"DELETE FROM {table} WHERE series_id = ? AND ts < ?",
+                    [(series_id, cutoff) for series_id in series_ids])
+
+    # ---------- queries ----------
+
+    def query(self, device, metric, start, end, step=None):
+        """
+        Range query between start and end (epoch seconds), bucketed by step seconds.
+        Returns list of {"t", "avg", "min", "max"}, t in epoch seconds.
+        """
+        if self._conn is None:
+            return []
+        series_id = self._series.get((device, metric))
+        if series_id is None:
+            return []
+
+        start_ms = int(start * 1000)
+        end_ms = int(end * 1000)
+        if not step:
+            step = max(1, int((end - start) / DEFAULT_MAX_POINTS))
+        step_ms = int(step * 1000)
+
+        # Coarsest table whose bucket fits in the step, moved to a coarser
+        # one if start is already past that table's retention
+        now_ms = int(time.time() * 1000)
+        fitting = [r for r in _RESOLUTIONS if r[1] <= step_ms]
+        table, bucket_ms, _ = fitting[-1]
+        for name, size_ms, retention in _RESOLUTIONS:
+            if size_ms >= bucket_ms and (start_ms >= now_ms - retention * 1000 or name == _RESOLUTIONS[-1][0]):
+                table, bucket_ms = name, size_ms
+                break
+        step_ms = max(step_ms, bucket_ms)
+
+        if table == "samples_raw":
+            sql = """
+                SELECT (ts / ?) * ? AS bucket, AVG(value), MIN(value), MAX(value)
+                FROM samples_raw
+                WHERE series_id = ? AND ts >= ? AND ts <= ?
+                GROUP BY bucket ORDER BY bucket
+            """
+        else:
+            sql = f"""
+                SELECT (ts / ?) * ? AS bucket, SUM(sum) / SUM(count), MIN(min), MAX(max)
+                FROM {table}
+                WHERE series_id = ? AND ts >= ? AND ts <= ?
+                GROUP BY bucket ORDER BY bucket
+            """
+        with self._lock:
+            rows = self._conn.execute(sql, (step_ms, step_ms, series_id, start_ms, end_ms)).fetchall()
+
+        return [
+            {"t": bucket / 1000, "avg": round(avg, 3), "min": round(lo, 3), "max": round(hi, 3)}
+            for bucket, avg, lo, hi in rows
+        ]
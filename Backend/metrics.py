@@ -0,0 +1,266 @@
+"""
+In-process counters, gauges and histograms, exposed in the Prometheus text format.
+
+Metrics are created once at import time by the module they instrument and
+registered in REGISTRY. labels(...) returns the child for one label set;
+children are created on first use and cached, so hot paths look them up
+once (or keep them, e.g. per SNMP session) and afterwards only do a plain
+attribute increment. All updates happen on the event loop thread, so no
+locking is needed; render() reads the values when /metrics is scraped.
+
+Gauges can be computed at scrape time instead (set_function), for values
+that are cheaper to read than to keep up to date (queue depths, sizes).
+"""
+import bisect
+import math
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; SNMP round trips and HTTP handlers
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ('value', '_function')
+
+    def __init__(self):
+        self.value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Reads the value from function() at every scrape"""
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function is not None else self.value
+
+
+class HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # per bucket (not cumulative), last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """A metric family: one child per label set"""
+
+    kind = None
+    child_class = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values):
+        """Child for one label set (created on first use, then cached)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def remove(self, *values):
+        self._children.pop(values, None)
+
+    def samples(self):
+        """[(suffix, label text, value)] of every child"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+    child_class = CounterChild
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+    def samples(self):
+        return [("", _label_text(self.labelnames, values), child.value)
+                for values, child in list(self._children.items())]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    child_class = GaugeChild
+
+    def set(self, value):
+        self._default.value = value
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+    def dec(self, amount=1):
+        self._default.value -= amount
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+    def samples(self):
+        result = []
+        for values, child in list(self._children.items()):
+            try:
+                value = child.get()
+            except Exception:
+                continue    # a callback that fails leaves the sample out rather than the scrape
+            result.append(("", _label_text(self.labelnames, values), value))
+        return result
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.bounds = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def samples(self):
+        result = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), list(child.counts)):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                result.append(("_bucket", _label_text(self.labelnames, values, le), cumulative))
+            labels = _label_text(self.labelnames, values)
+            result.append(("_sum", labels, child.sum))
+            result.append(("_count", labels, cumulative))
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def executor_queue_depth(executor):
+    """Work items waiting for a thread of a ThreadPoolExecutor (0 if it doesn't exist yet)"""
+    queue = getattr(executor, "_work_queue", None)
+    return queue.qsize() if queue is not None else 0
+
+
+def executor_threads(executor):
+    return len(getattr(executor, "_threads", ()))
+
+
+class HttpMetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request until its response starts
+    (streams are not timed to their end). Requests are labelled with the
+    route template ("/api/devices/{device_id}"), not the raw path, so the
+    label sets stay bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500, None]    # status code, seconds until the response started
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                status[1] = time.perf_counter() - started
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            elapsed = status[1] if status[1] is not None else time.perf_counter() - started
+            HTTP_REQUEST_SECONDS.labels(scope["method"], path, status[0]).observe(elapsed)
+
+
+THREADPOOL_QUEUE = Gauge("nms_threadpool_queue_depth", "Work items waiting for a worker thread", ("pool",))
+THREADPOOL_THREADS = Gauge("nms_threadpool_threads", "Worker threads started", ("pool",))
+HTTP_REQUEST_SECONDS = Histogram(
+    "nms_http_request_duration_seconds", "Time until the response of an API request started",
+    ("method", "route", "status"))
@@ -1,5 +1,6 @@
+import asyncio
 import time
-from pysnmp.hlapi import SnmpEngine, CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity, getCmd
+from snmp_client import get_client
 
 TARGET_IP = '127.0.0.1'
 COMMUNITY_STRING = 'public'
@@ -14,47 +15,45 @@ OID_IF_OUT = f'1.3.6.1.2.1.2.2.1.16.{INTERFACE_INDEX}'
 
 print(f"--- เริ่ม Monitor Traffic ของ Interface ID: {INTERFACE_INDEX} (กด Ctrl+C เพื่อหยุด) ---")
 
-def get_snmp_value(oid):
-    errorIndication, errorStatus, errorIndex, varBinds = next(
-        getCmd(SnmpEngine(),
-               CommunityData(COMMUNITY_STRING, mpModel=1),
-               UdpTransportTarget((TARGET_IP, 161)),
-               ContextData(),
-               ObjectType(ObjectIdentity(oid)))
-    )
-    if errorIndication or errorStatus:
-        return 0
-    return int(varBinds[0][1])
-
-# ค่าเริ่มต้น
-last_in = get_snmp_value(OID_IF_IN)
-last_out = get_snmp_value(OID_IF_OUT)
-last_time = time.time()
+async def get_counters(client):
+    """ดึง In/Out ใน GET เดียว (ใช้ session/socket เดิมทุกรอบ)"""
+    try:
+        varBinds = await client.get(TARGET_IP, [OID_IF_IN, OID_IF_OUT], COMMUNITY_STRING)
+        return int(varBinds[0][1]), int(varBinds[1][1])
+    except Exception:
+        return 0, 0
+
+async def main():
+    client = await get_client()
+
+    # ค่าเริ่มต้น
+    last_in, last_out = await get_counters(client)
+    last_time = time.time()
 
-try:
     while True:
-        time.sleep(1) # รอ 1 วินาที
-        
-        current_in = get_snmp_value(OID_IF_IN)
-        current_out = get_snmp_value(OID_IF_OUT)
+        await asyncio.sleep(1) # รอ 1 วินาที
+
+        current_in, current_out = await get_counters(client)
         current_time = time.time()
-        
+
         # คำนวณส่วนต่าง
         time_diff = current_time - last_time
         in_diff = current_in - last_in
         out_diff = current_out - last_out
-        
+
         # แปลงเป็น Mbps (Bits per second / 1,000,000)
         # * 8 เพราะ 1 Byte = 8 Bits
         speed_in_mbps = (in_diff * 8) / (time_diff * 1000000)
         speed_out_mbps = (out_diff * 8) / (time_diff * 1000000)
-        
+
         print(f"Download: {speed_in_mbps:.2f} Mbps | Upload: {speed_out_mbps:.2f} Mbps")
-        
+
         # อัปเดตค่าเก่า
         last_in = current_in
         last_out = current_out
         last_time = current_time
 
+try:
+    asyncio.run(main())
 except KeyboardInterrupt:
-    print("\nหยุดการทำงาน")
\ No newline at end of file
+    print("\nหยุดการทำงาน")
@@ -0,0 +1,274 @@
+"""
+MAC vendor lookup from the IEEE OUI registry.
+
+Reads the registry files (IEEE CSV exports oui.csv / mam.csv / oui36.csv,
+or a Wireshark "manuf" file) into a compact index: per prefix length
+(24-bit MA-L, 28-bit MA-M, 36-bit MA-S/IAB) a sorted array of prefixes
+and a parallel array of vendor ids, searched by bisection with the
+longest prefix winning. Tens of thousands of entries take well under a
+megabyte.
+
+Nothing is read until the first lookup. Without any registry file the
+small built-in table below is used. The IEEE files are not part of the
+repository; download them (again, to pick up new assignments) with
+
+    python oui.py --update
+
+which writes oui.csv, mam.csv and oui36.csv to data/.
+"""
+import argparse
+import csv
+import os
+import sys
+import threading
+import urllib.request
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:  # optional: batch lookups fall back to bisect per MAC
+    np = None
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+OUI_FILES = [p for p in os.getenv(
+    "NMS_OUI_FILES",
+    os.pathsep.join(os.path.join(_DATA_DIR, name) for name in ("oui.csv", "mam.csv", "oui36.csv", "manuf"))
+).split(os.pathsep) if p]
+
+PREFIX_BITS = (36, 28, 24)     # longest first
+
+# IEEE registry exports: MA-L (24-bit), MA-M (28-bit), MA-S (36-bit)
+IEEE_URLS = {
+    "oui.csv": "https://standards-oui.ieee.org/oui/oui.csv",
+    "mam.csv": "https://standards-oui.ieee.org/oui28/mam.csv",
+    "oui36.csv": "https://standards-oui.ieee.org/oui36/oui36.csv",
+}
+DOWNLOAD_TIMEOUT = 60
+
+BUILTIN_VENDORS = {
+    "00:1A:2B": "Cisco", "00:1B:2C": "Cisco", "00:1C:2D": "Cisco", "00:0C:29": "VMware",
+    "FC:EC:DA": "Ubiquiti", "24:5A:4C": "Ubiquiti", "DC:9F:DB": "Ubiquiti",
+    "00:50:56": "VMware", "08:00:27": "VirtualBox",
+    "B4:2E:99": "HP", "3C:D9:2B": "HP",
+    "D4:BE:D9": "Dell", "18:A9:05": "Dell",
+}
+
+# Device type guessed from the vendor name (first match wins)
+VENDOR_TYPES = (
+    ("ubiquiti", "ap"), ("ruckus", "ap"), ("aruba", "ap"), ("cambium", "ap"),
+    ("fortinet", "firewall"), ("palo alto", "firewall"), ("sonicwall", "firewall"),
+    ("watchguard", "firewall"), ("check point", "firewall"),
+    ("mikrotik", "router"), ("routerboard", "router"),
+    ("cisco", "switch"), ("juniper", "switch"), ("arista", "switch"), ("extreme networks", "switch"),
+)
+
+
+def mac_to_int(mac):
+    """48-bit integer of a MAC in any common notation, or None"""
+    if not mac:
+        return None
+    digits = mac.replace(":", "").replace("-", "").replace(".", "")
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+def _read_ieee_csv(path):
+    """(prefix, bits, vendor) from an IEEE registry CSV (Registry,Assignment,Organization Name,...)"""
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 3:
+                continue
+            assignment = row[1].strip()
+            try:
+                yield int(assignment, 16), len(assignment) * 4, row[2].strip()
+            except ValueError:
+                continue
+
+
+def _read_manuf(path):
+    """(prefix, bits, vendor) from a Wireshark manuf file (00:1B:C5:00:00:00/36<TAB>Short<TAB>Long)"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2:
+                continue
+            prefix, _, bits = fields[0].partition("/")
+            digits = prefix.replace(":", "").replace("-", "")
+            bits = int(bits) if bits else len(digits) * 4
+            try:
+                value = int(digits, 16) >> (len(digits) * 4 - bits)
+            except ValueError:
+                continue
+            yield value, bits, (fields[2] if len(fields) > 2 and fields[2] else fields[1]).strip()
+
+
+def _read_builtin():
+    for prefix, vendor in BUILTIN_VENDORS.items():
+        yield int(prefix.replace(":", ""), 16), 24, vendor
+
+
+class OuiIndex:
+    def __init__(self, entries):
+        self.vendors = []           # vendor id -> name
+        vendor_ids = {}
+        by_bits = {bits: {} for bits in PREFIX_BITS}
+        for prefix, bits, vendor in entries:
+            table = by_bits.get(bits)
+            if table is None or prefix in table:
+                continue    # first file wins on duplicates
+            vendor_id = vendor_ids.get(vendor)
+            if vendor_id is None:
+                vendor_id = vendor_ids[vendor] = len(self.vendors)
+                self.vendors.append(vendor)
+            table[prefix] = vendor_id
+
+        # bits -> (sorted prefixes, vendor ids)
+        self._tables = {}
+        for bits, table in by_bits.items():
+            if table:
+                prefixes = sorted(table)
+                self._tables[bits] = (array('Q', prefixes), array('I', (table[p] for p in prefixes)))
+
+    def __len__(self):
+        return sum(len(prefixes) for prefixes, _ in self._tables.values())
+
+    @classmethod
+    def load(cls, paths=None):
+        sources = []
+        for path in (OUI_FILES if paths is None else paths):
+            if os.path.exists(path):
+                reader = _read_ieee_csv if path.lower().endswith(".csv") else _read_manuf
+                sources.append(reader(path))
+        sources.append(_read_builtin())
+        return cls(entry for source in sources for entry in source)
+
+    def nbytes(self):
+        return sum(p.itemsize * len(p) + v.itemsize * len(v) for p, v in self._tables.values())
+
+    def lookup(self, mac):
+        """Vendor name of mac, or None"""
+        value = mac_to_int(mac)
+        if value is None:
+            return None
+        for bits, (prefixes, vendor_ids) in self._tables.items():
+            key = value >> (48 - bits)
+            i = bisect_left(prefixes, key)
+            if i < len(prefixes) and prefixes[i] == key:
+                return self.vendors[vendor_ids[i]]
+        return None
+
+    def lookup_many(self, macs):
+        """Vendor names (or None) for a list of MACs in one pass per prefix length"""
+        if np is None:
+            return [self.lookup(mac) for mac in macs]
+        values = [mac_to_int(mac) for mac in macs]
+        valid = np.array([v is not None for v in values], dtype=bool)
+        keys = np.array([v or 0 for v in values], dtype=np.uint64)
+        result = np.full(len(values), -1, dtype=np.int64)
+        for bits, (prefixes, vendor_ids) in self._tables.items():
+            table = np.frombuffer(prefixes, dtype=np.uint64)
+            ids = np.frombuffer(vendor_ids, dtype=np.uint32)
+            wanted = keys >> np.uint64(48 - bits)
+            pos = np.minimum(np.searchsorted(table, wanted), len(table) - 1)
+            hit = valid & (result < 0) & (table[pos] == wanted)
+            result[hit] = ids[pos[hit]]
+        return [self.vendors[i] if i >= 0 else None for i in result.tolist()]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The shared index, loaded on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = OuiIndex.load()
+    return _index
+
+
+def preload():
+    """Loads the index in a background thread (e.g. when a scan starts)"""
+    if _index is None:
+        threading.Thread(target=get_index, name="oui-load", daemon=True).start()
+
+
+def vendor_for(mac):
+    return get_index().lookup(mac)
+
+
+def vendors_for(macs):
+    return get_index().lookup_many(macs)
+
+
+def update(directory=_DATA_DIR, urls=IEEE_URLS):
+    """
+    Downloads the IEEE registry files into directory. Each file replaces
+    the old one only once it is complete, and the index is reloaded on the
+    next lookup. Returns the entries read from each file.
+    """
+    global _index
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for name, url in urls.items():
+        path = os.path.join(directory, name)
+        # The IEEE server turns away urllib's default User-Agent
+        request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0 (NMS OUI update)"})
+        with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response, \
+                open(path + ".tmp", "wb") as f:
+            while True:
+                chunk = response.read(1 << 16)
+                if not chunk:
+                    break
+                f.write(chunk)
+        counts[name] = sum(1 for _ in _read_ieee_csv(path + ".tmp"))
+        if not counts[name]:
+            os.remove(path + ".tmp")
+            raise ValueError(f"{url} returned no registry entries")
+        os.replace(path + ".tmp", path)
+    with _index_lock:
+        _index = None
+    return counts
+
+
+def device_type_for(vendor):
+    """Device type guessed from a vendor name ("server" when nothing matches)"""
+    if vendor:
+        name = vendor.lower()
+        for keyword, device_type in VENDOR_TYPES:
+            if keyword in name:
+                return device_type
+    return "server"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MAC vendor lookup from the IEEE OUI registry")
+    parser.add_argument("--update", action="store_true", help="download the IEEE registry files to data/")
+    parser.add_argument("macs", nargs="*", help="MAC addresses to look up")
+    args = parser.parse_args()
+
+    if args.update:
+        try:
+            counts = update()
+        except (OSError, ValueError) as e:
+            print(f"OUI update failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        for name, count in counts.items():
+            print(f"{name}: {count} entries")
+    for mac in args.macs:
+        print(f"{mac}\t{vendor_for(mac) or 'Unknown'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from metrics import Gauge, Histogram
+
+# Default poll intervals (seconds)
+POLL_INTERVAL = float(os.getenv("NMS_POLL_INTERVAL", "10"))              # remote devices (SNMP)
+CRITICAL_POLL_INTERVAL = float(os.getenv("NMS_CRITICAL_POLL_INTERVAL", "5")) # network gear (CRITICAL_TYPES)
+LOCAL_POLL_INTERVAL = float(os.getenv("NMS_LOCAL_POLL_INTERVAL", "1"))   # localhost (psutil is cheap)
+STREAM_POLL_INTERVAL = float(os.getenv("NMS_STREAM_POLL_INTERVAL", "1")) # devices open on a live dashboard
+POLL_TICK = 0.5                                                          # scheduler resolution
+CRITICAL_TYPES = ("router", "switch", "firewall")
+
+# Unreachable devices: the interval doubles per failed poll up to this many seconds
+POLL_BACKOFF_MAX = float(os.getenv("NMS_POLL_BACKOFF_MAX", "300"))
+
+POLL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+POLL_SECONDS = Histogram("nms_poll_duration_seconds", "Duration of one device poll", ("status",),
+                         buckets=POLL_BUCKETS)
+POLL_LAG = Histogram("nms_poll_lag_seconds", "Delay between a poll falling due and it starting",
+                     buckets=POLL_BUCKETS)
+POLL_PASS_SECONDS = Histogram("nms_poll_scheduler_pass_seconds", "Duration of one scheduler pass over all devices")
+POLLS_IN_FLIGHT = Gauge("nms_polls_in_flight", "Device polls currently running")
+_POLL_ONLINE = POLL_SECONDS.labels("online")
+_POLL_OFFLINE = POLL_SECONDS.labels("offline")
+
+
+class DevicePoller:
+    """
+    Background polling engine.
+
+    Every device is polled on its own schedule and the latest result is
+    written into `snapshot` (keyed by IP), so API handlers can answer from
+    memory instead of running SNMP walks inside the request.
+
+    Due devices are polled concurrently, one task per device; a device whose
+    previous poll is still running is skipped until that poll finishes.
+
+    Intervals: device.pollInterval if set, else local_interval for
+    localhost, critical_interval for CRITICAL_TYPES and interval for the
+    rest. A device whose poll fails is backed off exponentially (up to
+    backoff_max) and, while failing, first gets the cheap probe(device);
+    the full collect only runs once the probe answers again.
+
+    collect(device)            -> awaitable returning the realtime dict
+    on_result(device, result)  -> called after each poll to update the device
+    get_devices()              -> returns the current list of devices
+    is_watched(ip)             -> True while someone streams the device live;
+                                  such devices are polled every stream_interval
+    probe(device)              -> awaitable returning True if the device answers
+    """
+
+    def __init__(self, get_devices, collect, on_result,
+                 interval=POLL_INTERVAL, local_interval=LOCAL_POLL_INTERVAL, tick=POLL_TICK,
+                 is_watched=None, stream_interval=STREAM_POLL_INTERVAL, probe=None,
+                 critical_interval=CRITICAL_POLL_INTERVAL, backoff_max=POLL_BACKOFF_MAX):
+        self.get_devices = get_devices
+        self.collect = collect
+        self.on_result = on_result
+        self.interval = interval
+        self.local_interval = local_interval
+        self.tick = tick
+        self.is_watched = is_watched
+        self.stream_interval = stream_interval
+        self.probe = probe
+        self.critical_interval = critical_interval
+        self.backoff_max = backoff_max
+
+        self.snapshot = {}      # ip -> last realtime result (with lastPolled)
+        self._next_due = {}     # device id -> monotonic time of next poll
+        self._in_flight = {}    # device id -> poll task
+        self._wake = set()      # IPs to poll on the next tick regardless of schedule
+        self._failures = {}     # device id -> consecutive failed polls
+        self._task = None
+        POLLS_IN_FLIGHT.set_function(lambda: len(self._in_flight))
+
+    def base_interval(self, device):
+        """Interval while the device answers"""
+        if getattr(device, "pollInterval", None):
+            interval = device.pollInterval
+        elif device.ip in ['127.0.0.1', 'localhost']:
+            interval = self.local_interval
+        elif device.type in CRITICAL_TYPES:
+            interval = self.critical_interval
+        else:
+            interval = self.interval
+        if self.is_watched is not None and self.is_watched(device.ip):
+            return min(interval, self.stream_interval)
+        return interval
+
+    def interval_for(self, device):
+        interval = self.base_interval(device)
+        failures = self._failures.get(device.id)
+        if failures:
+            return min(interval * 2 ** failures, max(interval, self.backoff_max))
+        return interval
+
+    def failures(self, device_id):
+        return self._failures.get(device_id, 0)
+
+    def poll_soon(self, ip):
+        """Poll the device with this IP on the next tick (e.g. a viewer just subscribed)"""
+        self._wake.add(ip)
+
+    def get(self, ip):
+        """O(1) lookup of the last polled result for an IP"""
+        return self.snapshot.get(ip)
+
+    def forget(self, device_id, ip=None):
+        """Drop schedule/snapshot state of a removed or re-addressed device"""
+        self._next_due.pop(device_id, None)
+        self._failures.pop(device_id, None)
+        if ip is not None:
+            self.snapshot.pop(ip, None)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        tasks = list(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._in_flight.clear()
+
+    async def _collect(self, device):
+        if self._failures.get(device.id) and self.probe is not None:
+            if not await self.probe(device):
+                return {"status": "Offline", "error": "No response to liveness probe"}
+        return await self.collect(device)
+
+    async def poll_device(self, device):
+        started = time.monotonic()
+        try:
+            result = await self._collect(device)
+        except Exception as e:
+            print(f"Poll error for {device.ip}: {e}")
+            result = {"status": "Offline", "error": str(e)}
+        offline = result.get("status") == "Offline"
+        (_POLL_OFFLINE if offline else _POLL_ONLINE).observe(time.monotonic() - started)
+
+        if device.id not in self._next_due:
+            # Device was removed while the poll was in flight
+            return result
+
+        if offline:
+            self._failures[device.id] = self._failures.get(device.id, 0) + 1
+            # The interval was picked when the poll started; stretch it to the backoff
+            self._next_due[device.id] = time.monotonic() + self.interval_for(device)
+        elif self._failures.pop(device.id, None):
+            self._next_due[device.id] = time.monotonic() + self.interval_for(device)
+
+        result["lastPolled"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.snapshot[device.ip] = result
+        self.on_result(device, result)
+        return result
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            wake, self._wake = self._wake, set()
+            for device in self.get_devices():
+                if device.id in self._in_flight:
+                    if device.ip in wake:
+                        self._wake.add(device.ip)   # retry once the running poll ends
+                    continue
+                due = self._next_due.get(device.id, 0)
+                if due > now and device.ip not in wake:
+                    continue
+                if 0 < due <= now:
+                    # Late by up to a tick, or by however long the previous poll overran
+                    POLL_LAG.observe(now - due)
+                self._next_due[device.id] = now + self.interval_for(device)
+                task = asyncio.create_task(self.poll_device(device))
+                self._in_flight[device.id] = task
+                task.add_done_callback(lambda t, device_id=device.id: self._in_flight.pop(device_id, None))
+            POLL_PASS_SECONDS.observe(time.monotonic() - now)
+
+            await asyncio.sleep(self.tick)
@@ -0,0 +1,283 @@
+"""
+Asynchronous ICMP echo (ping) for many hosts at once.
+
+One ICMP socket serves every ping; replies are matched to requests by
+sequence number, so thousands of hosts can be pinged concurrently from
+the event loop. The socket kind is picked once:
+
+- unprivileged ICMP datagram socket (Linux with net.ipv4.ping_group_range,
+  macOS): no root needed, the kernel fills in the identifier
+- raw ICMP socket (root / CAP_NET_RAW, Windows administrators)
+- otherwise the system ping command, run as an async subprocess (flags
+  for Windows, Linux, macOS and FreeBSD; other systems get their ping's
+  default per-reply wait, bounded by the overall timeout)
+"""
+import asyncio
+import ipaddress
+import os
+import platform
+import re
+import socket
+import struct
+import time
+
+PING_COUNT = int(os.getenv("NMS_PING_COUNT", "3"))
+PING_TIMEOUT = float(os.getenv("NMS_PING_TIMEOUT", "1.0"))         # seconds to wait for each reply
+PING_INTERVAL = 0.2             # seconds between the echo requests to one host
+PING_CONCURRENCY = int(os.getenv("NMS_PING_CONCURRENCY", "512"))   # hosts pinged at the same time
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+_PAYLOAD = b'nms-ping' + bytes(24)
+
+_SYSTEM = platform.system().lower()
+_RTT_LINE = re.compile(r'(?:time|Zeit|tiempo)[=<]\s*([\d.]+)\s*ms', re.IGNORECASE)
+
+
+def checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def echo_request(ident, seq):
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum(header + _PAYLOAD), ident, seq) + _PAYLOAD
+
+
+class PingResult:
+    __slots__ = ('host', 'sent', 'rtts', 'error')
+
+    def __init__(self, host, sent=0, rtts=None, error=None):
+        self.host = host
+        self.sent = sent
+        self.rtts = rtts or []      # milliseconds of the replies received
+        self.error = error
+
+    @property
+    def received(self):
+        return len(self.rtts)
+
+    @property
+    def alive(self):
+        return bool(self.rtts)
+
+    @property
+    def loss(self):
+        """Packet loss in percent"""
+        return round(100.0 * (self.sent - self.received) / self.sent, 1) if self.sent else 100.0
+
+    @property
+    def min(self):
+        return round(min(self.rtts), 3) if self.rtts else None
+
+    @property
+    def avg(self):
+        return round(sum(self.rtts) / len(self.rtts), 3) if self.rtts else None
+
+    @property
+    def max(self):
+        return round(max(self.rtts), 3) if self.rtts else None
+
+    def to_dict(self):
+        return {
+            "host": self.host,
+            "alive": self.alive,
+            "sent": self.sent,
+            "received": self.received,
+            "loss": self.loss,
+            "min": self.min,
+            "avg": self.avg,
+            "max": self.max,
+            "error": self.error,
+        }
+
+
+class Pinger:
+    def __init__(self, timeout=PING_TIMEOUT, count=PING_COUNT, concurrency=PING_CONCURRENCY):
+        self.timeout = timeout
+        self.count = count
+        self.concurrency = concurrency
+        self.mode = None            # "dgram", "raw" or "subprocess" once started
+        self._sock = None
+        self._ident = os.getpid() & 0xffff
+        self._seq = 0
+        self._pending = {}          # (ip, seq) -> Future resolved with the receive time
+        self._lock = None
+
+    # ---------- socket ----------
+
+    async def start(self):
+        if self.mode is not None:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.mode is None:
+                self.mode = self._open()
+
+    def _open(self):
+        loop = asyncio.get_running_loop()
+        for kind, mode in ((socket.SOCK_DGRAM, "dgram"), (socket.SOCK_RAW, "raw")):
+            try:
+                sock = socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP)
+            except OSError:
+                continue
+            sock.setblocking(False)
+            try:
+                loop.add_reader(sock.fileno(), self._on_readable)
+            except NotImplementedError:
+                # Proactor event loop (Windows) has no add_reader
+                sock.close()
+                break
+            self._sock = sock
+            return mode
+        return "subprocess"
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            except RuntimeError:
+                pass
+            self._sock.close()
+            self._sock = None
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self.mode = None
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, addr = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received = time.perf_counter()
+            # Raw sockets, and datagram sockets on macOS/BSD, deliver the IP header too
+            # (an ICMP message never starts with 0x4_: no echo type is 64-79)
+            has_ip_header = bool(data) and data[0] >> 4 == 4
+            if has_ip_header:
+                data = data[(data[0] & 0x0f) * 4:]
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+            # Those sockets also see other processes' pings and keep our id; the
+            # Linux datagram socket only gets its own replies, with an id set by the kernel
+            if icmp_type != ICMP_ECHO_REPLY or (has_ip_header and ident != self._ident):
+                continue
+            future = self._pending.get((addr[0], seq))
+            if future is not None and not future.done():
+                future.set_result(received)
+
+    def _next_seq(self):
+        # Replies are keyed by (ip, seq): 65536 requests in flight to one host before reuse
+        self._seq = (self._seq + 1) & 0xffff
+        return self._seq
+
+    async def _echo(self, ip, timeout):
+        """RTT in ms of one echo request, or None on timeout"""
+        seq = self._next_seq()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[(ip, seq)] = future
+        try:
+            sent = time.perf_counter()
+            self._sock.sendto(echo_request(self._ident, seq), (ip, 0))
+            received = await asyncio.wait_for(future, timeout)
+            return (received - sent) * 1000.0
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._pending.pop((ip, seq), None)
+
+    # ---------- ping ----------
+
+    async def ping(self, host, count=None, timeout=None):
+        """Pings one host (IP or name) count times; returns a PingResult"""
+        await self.start()
+        count = self.count if count is None else count
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            ip = await _resolve(host)
+        except OSError as e:
+            return PingResult(host, error=f"Cannot resolve host: {e}")
+
+        if self.mode == "subprocess":
+            return await _ping_subprocess(host, ip, count, timeout)
+
+        result = PingResult(host)
+        for i in range(count):
+            if i:
+                await asyncio.sleep(PING_INTERVAL)
+            result.sent += 1
+            try:
+                rtt = await self._echo(ip, timeout)
+            except OSError as e:
+                # Unreachable network etc.: no reply can come
+                result.error = str(e)
+                break
+            if rtt is not None:
+                result.rtts.append(rtt)
+        return result
+
+    async def ping_many(self, hosts, count=None, timeout=None):
+        """Pings all hosts concurrently (up to `concurrency` at a time); returns {host: PingResult}"""
+        await self.start()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(host):
+            async with semaphore:
+                return await self.ping(host, count, timeout)
+
+        hosts = list(dict.fromkeys(hosts))
+        results = await asyncio.gather(*[run(host) for host in hosts])
+        return dict(zip(hosts, results))
+
+
+async def _resolve(host):
+    try:
+        return str(ipaddress.IPv4Address(host))
+    except ValueError:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, family=socket.AF_INET)
+        return infos[0][4][0]
+
+
+def _ping_args(ip, count, timeout):
+    """Command line of the system ping; the per-reply wait flag differs per platform"""
+    if _SYSTEM == "windows":
+        return ["ping", "-n", str(count), "-w", str(int(timeout * 1000)), ip]
+    args = ["ping", "-c", str(count)]
+    if _SYSTEM == "linux":
+        # iputils: -W in seconds
+        args += ["-W", str(max(1, round(timeout))), "-i", str(PING_INTERVAL)]
+    elif _SYSTEM == "darwin":
+        # -W in milliseconds; intervals below 1 s are allowed without root down to 0.1 s
+        args += ["-W", str(max(1, int(timeout * 1000))), "-i", str(PING_INTERVAL)]
+    elif _SYSTEM == "freebsd":
+        # -W in milliseconds; intervals below 1 s need root, so keep the default
+        args += ["-W", str(max(1, int(timeout * 1000)))]
+    return args + [ip]
+
+
+async def _ping_subprocess(host, ip, count, timeout):
+    """Fallback: the system ping command, parsing the per-reply times"""
+    args = _ping_args(ip, count, timeout)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    except OSError as e:
+        return PingResult(host, error=f"ping unavailable: {e}")
+    try:
+        # Sends are at least PING_INTERVAL apart (1 s where -i isn't passed)
+        stdout, _ = await asyncio.wait_for(process.communicate(), count * (timeout + 1) + 2)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return PingResult(host, count)
+    rtts = [float(match) for match in _RTT_LINE.findall(stdout.decode(errors="replace"))]
+    return PingResult(host, count, rtts[:count])
@@ -0,0 +1,184 @@
+import heapq
+import sys
+import time
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:  # optional: falls back to pure-Python aggregation
+    np = None
+
+RECENT_WINDOW = 3600.0      # seconds of history kept per series
+DEFAULT_CAPACITY = 720      # samples per series when the poll interval is unknown
+
+
+class RingSeries:
+    """
+    Fixed-size ring buffer of (timestamp, value) in two typed arrays:
+    float64 epoch seconds and float32 values, 12 bytes per sample.
+    """
+
+    __slots__ = ('ts', 'values', 'capacity', 'head', 'count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = array('d', bytes(8 * capacity))
+        self.values = array('f', bytes(4 * capacity))
+        self.head = 0      # next write position
+        self.count = 0
+
+    def append(self, ts, value):
+        self.ts[self.head] = ts
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def grow(self, capacity):
+        """Re-allocates with a larger capacity, keeping the samples in order"""
+        ts = array('d')
+        values = array('f')
+        for start, end in self._segments():
+            ts.extend(self.ts[start:end])
+            values.extend(self.values[start:end])
+        count = len(ts)
+        ts.extend(array('d', bytes(8 * (capacity - count))))
+        values.extend(array('f', bytes(4 * (capacity - count))))
+        self.ts, self.values = ts, values
+        self.capacity = capacity
+        self.head = count % capacity
+        self.count = count
+
+    def _segments(self):
+        """Chronological (start, end) index ranges of the ring"""
+        if self.count < self.capacity:
+            return [(0, self.count)]
+        return [(self.head, self.capacity), (0, self.head)]
+
+    def window(self, since):
+        """Returns (timestamps, values) newer than since, oldest first"""
+        ts_out = array('d')
+        val_out = array('f')
+        for start, end in self._segments():
+            # Each segment is sorted by time, so bisect to the first sample in range
+            first = bisect_left(self.ts, since, start, end)
+            ts_out.extend(self.ts[first:end])
+            val_out.extend(self.values[first:end])
+        return ts_out, val_out
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return self.ts[i], self.values[i]
+
+    def nbytes(self):
+        return (sys.getsizeof(self) + sys.getsizeof(self.ts) + sys.getsizeof(self.values))
+
+
+def _percentile(values, percentile):
+    """Linear-interpolated percentile without sorting the whole array"""
+    n = len(values)
+    rank = (n - 1) * percentile / 100
+    lo = int(rank)
+    hi = min(lo + 1, n - 1)
+    if percentile >= 50:
+        # Only the top n - lo values matter, in descending order
+        top = heapq.nlargest(n - lo, values)
+        lo_val, hi_val = top[-1], top[n - 1 - hi]
+    else:
+        bottom = heapq.nsmallest(hi + 1, values)
+        lo_val, hi_val = bottom[lo], bottom[hi]
+    return lo_val + (hi_val - lo_val) * (rank - lo)
+
+
+def _stats(values, percentile):
+    """min/max/avg/percentile of a float array"""
+    if not values:
+        return None
+    if np is not None:
+        data = np.frombuffer(values, dtype=np.float32)
+        return {
+            "min": round(float(data.min()), 2),
+            "max": round(float(data.max()), 2),
+            "avg": round(float(data.mean()), 2),
+            "p": round(float(np.percentile(data, percentile)), 2),
+        }
+    return {
+        "min": round(min(values), 2),
+        "max": round(max(values), 2),
+        "avg": round(sum(values) / len(values), 2),
+        "p": round(_percentile(values, percentile), 2),
+    }
+
+
+class RecentStore:
+    """
+    In-memory recent history: one RingSeries per (device, metric).
+    Sized so each series holds RECENT_WINDOW seconds at its poll interval;
+    a series grows when the device is later polled faster (never shrinks).
+    """
+
+    def __init__(self, window=RECENT_WINDOW):
+        self.window_seconds = window
+        self._series = {}   # device -> {metric: RingSeries}
+
+    def record(self, device, values, ts=None, interval=None):
+        ts = time.time() if ts is None else ts
+        metrics = self._series.get(device)
+        if metrics is None:
+            metrics = self._series[device] = {}
+        for metric, value in values.items():
+            if value is None:
+                continue
+            series = metrics.get(metric)
+            capacity = int(self.window_seconds / interval) + 1 if interval else DEFAULT_CAPACITY
+            if series is None:
+                series = metrics[metric] = RingSeries(capacity)
+            elif capacity > series.capacity:
+                # Polled faster than when the series was sized (e.g. a dashboard started streaming it)
+                series.grow(capacity)
+            series.append(ts, value)
+
+    def forget(self, device):
+        self._series.pop(device, None)
+
+    def points(self, device, metric, window=None):
+        """Raw samples of one series within the window: [{"t", "v"}]"""
+        series = self._series.get(device, {}).get(metric)
+        if series is None:
+            return []
+        since = time.time() - (window or self.window_seconds)
+        ts, values = series.window(since)
+        return [{"t": t, "v": round(v, 3)} for t, v in zip(ts, values)]
+
+    def summary(self, metric, window=None, percentile=95):
+        """
+        Per-device and fleet-wide min/max/avg/percentile of one metric.
+        """
+        since = time.time() - (window or self.window_seconds)
+        per_device = {}
+        fleet = array('f')
+        for device, metrics in self._series.items():
+            series = metrics.get(metric)
+            if series is None:
+                continue
+            _, values = series.window(since)
+            stats = _stats(values, percentile)
+            if stats is not None:
+                per_device[device] = stats
+                fleet.extend(values)
+        return {"devices": per_device, "fleet": _stats(fleet, percentile)}
+
+    def memory_usage(self):
+        """Bytes held by the ring buffers, total and per device"""
+        total = sys.getsizeof(self._series)
+        for metrics in self._series.values():
+            total += sys.getsizeof(metrics) + sum(s.nbytes() for s in metrics.values())
+        devices = len(self._series)
+        return {
+            "devices": devices,
+            "totalBytes": total,
+            "bytesPerDevice": round(total / devices) if devices else 0,
+        }
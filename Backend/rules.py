@@ -0,0 +1,312 @@
+"""
+Threshold rule engine, evaluated on every poll sample.
+
+A rule watches one metric of the poll sample (cpu, memory, net_in,
+net_out) and fires while the value, or its rate of change per `per`
+seconds for kind "rate", crosses the threshold:
+
+    {"id": "cpu_high", "metric": "cpu", "op": ">", "threshold": 80,
+     "clear": 70, "for": 60, "severity": "warning",
+     "message": "High CPU utilization ({value:.0f}%)"}
+
+- "for": the condition must hold that many seconds before the rule fires
+- "clear": hysteresis; a firing rule clears only once the value is back
+  past this level (default: the threshold itself)
+- scope: "devices" (IPs), "groups" (names from the top-level "groups"
+  map of IP lists) or "types" (device types); no scope = every device
+
+Several rules may share an id to override each other per scope. For each
+device the most specific one applies (device > group > type > global).
+Rules are compiled once into per-metric rule sets, so a sample only costs
+the rules of the metrics it carries.
+"""
+import json
+import os
+import operator
+
+RULES_PATH = os.getenv(
+    "NMS_RULES_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rules.json")
+)
+
+METRICS = ("cpu", "memory", "net_in", "net_out")
+SEVERITIES = ("critical", "warning", "info")
+KINDS = ("threshold", "rate")
+
+_OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+# Clearing is the opposite comparison against the clear level
+_RECOVERED = {">": operator.le, ">=": operator.lt, "<": operator.ge, "<=": operator.gt}
+
+DEFAULT_CONFIG = {
+    "groups": {},
+    "rules": [
+        {"id": "cpu_high", "metric": "cpu", "op": ">", "threshold": 80, "clear": 70,
+         "severity": "warning", "oid": "1.3.6.1.4.1.9.2.1.56",
+         "message": "High CPU utilization ({value:.0f}%)"},
+        {"id": "memory_high", "metric": "memory", "op": ">", "threshold": 85, "clear": 75,
+         "severity": "warning", "oid": "1.3.6.1.4.1.9.9.48.1.1.1.6",
+         "message": "High memory usage ({value:.0f}%)"},
+    ],
+}
+
+
+class Rule:
+    """One compiled rule"""
+
+    __slots__ = ('id', 'metric', 'kind', 'op', 'threshold', 'clear', 'duration', 'per',
+                 'severity', 'message', 'oid', 'devices', 'groups', 'types', 'breached', 'recovered')
+
+    def __init__(self, spec):
+        def fail(reason):
+            raise ValueError(f"Rule {spec.get('id', '?')}: {reason}")
+
+        self.id = spec.get("id")
+        if not self.id:
+            fail("missing id")
+        self.metric = spec.get("metric")
+        if self.metric not in METRICS:
+            fail(f"metric must be one of {', '.join(METRICS)}")
+        self.kind = spec.get("kind", "threshold")
+        if self.kind not in KINDS:
+            fail(f"kind must be one of {', '.join(KINDS)}")
+        self.op = spec.get("op", ">")
+        if self.op not in _OPERATORS:
+            fail(f"op must be one of {', '.join(_OPERATORS)}")
+        try:
+            self.threshold = float(spec["threshold"])
+            self.clear = float(spec.get("clear", self.threshold))
+            self.duration = float(spec.get("for", 0))
+            self.per = float(spec.get("per", 1))
+        except KeyError:
+            fail("missing threshold")
+        except (TypeError, ValueError):
+            fail("threshold, clear, for and per must be numbers")
+        self.severity = spec.get("severity", "warning")
+        if self.severity not in SEVERITIES:
+            fail(f"severity must be one of {', '.join(SEVERITIES)}")
+        self.message = spec.get("message") or f"{self.metric} {self.op} {self.threshold:g} ({{value:.1f}})"
+        self.oid = spec.get("oid")
+        self.devices = frozenset(spec.get("devices") or ())
+        self.groups = tuple(spec.get("groups") or ())
+        self.types = frozenset(spec.get("types") or ())
+        if sum(1 for scope in (self.devices, self.groups, self.types) if scope) > 1:
+            fail("use only one of devices, groups and types")
+
+        threshold, clear = self.threshold, self.clear
+        breached, recovered = _OPERATORS[self.op], _RECOVERED[self.op]
+        self.breached = lambda value: breached(value, threshold)
+        self.recovered = lambda value: recovered(value, clear)
+
+    def format(self, value):
+        try:
+            return self.message.format(value=value, threshold=self.threshold)
+        except (KeyError, IndexError, ValueError):
+            return self.message
+
+
+class RuleSet:
+    """Rules sharing one id, by scope"""
+
+    __slots__ = ('id', 'metric', 'by_device', 'by_group', 'by_type', 'default')
+
+    def __init__(self, rule_id, metric):
+        self.id = rule_id
+        self.metric = metric
+        self.by_device = {}
+        self.by_group = {}
+        self.by_type = {}
+        self.default = None
+
+    def add(self, rule):
+        if rule.devices:
+            targets = [(self.by_device, ip) for ip in rule.devices]
+        elif rule.groups:
+            targets = [(self.by_group, name) for name in rule.groups]
+        elif rule.types:
+            targets = [(self.by_type, device_type) for device_type in rule.types]
+        else:
+            if self.default is not None:
+                raise ValueError(f"Rule {rule.id}: more than one rule without scope")
+            self.default = rule
+            return
+        for table, key in targets:
+            table[key] = rule
+
+    def resolve(self, ip, device_type, groups):
+        rule = self.by_device.get(ip)
+        if rule is not None:
+            return rule
+        if self.by_group:
+            for name in groups:
+                rule = self.by_group.get(name)
+                if rule is not None:
+                    return rule
+        rule = self.by_type.get(device_type)
+        return rule if rule is not None else self.default
+
+
+class RuleState:
+    __slots__ = ('since', 'firing')
+
+    def __init__(self):
+        self.since = None   # when the condition started holding
+        self.firing = False
+
+
+class RuleEngine:
+    def __init__(self, config=None, path=RULES_PATH):
+        self.path = path
+        self.config = None
+        self._general = {}      # metric -> (RuleSet with a global or per-type rule)
+        self._scoped = {}       # (metric, ip) -> (RuleSet with only device/group rules covering ip)
+        self._groups_of = {}    # ip -> (group names)
+        self._state = {}        # (ip, rule id) -> RuleState
+        self._last = {}         # (ip, metric) -> (ts, value) for rate rules
+        self._firing = {}       # ip -> {rule id: Rule}
+        self.load(config)
+
+    # ---------- configuration ----------
+
+    def load(self, config=None):
+        """Compiles config (raises ValueError), or else the rules file, falling back to DEFAULT_CONFIG"""
+        if config is not None:
+            self.compile(config)
+            return
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.compile(json.load(f))
+                return
+            except (OSError, ValueError) as e:
+                print(f"Rules file error, using defaults: {e}")
+        self.compile(DEFAULT_CONFIG)
+
+    def compile(self, config):
+        """
+        Replaces the rules. Returns what was firing under the old rules
+        ({ip: {rule id: Rule}}), since every condition starts over.
+        """
+        groups = config.get("groups") or {}
+        if not isinstance(groups, dict):
+            raise ValueError("groups must map a name to a list of IPs")
+        rule_sets = {}
+        for spec in config.get("rules") or []:
+            rule = Rule(spec)
+            unknown = [name for name in rule.groups if name not in groups]
+            if unknown:
+                raise ValueError(f"Rule {rule.id}: unknown groups {', '.join(unknown)}")
+            rule_set = rule_sets.get(rule.id)
+            if rule_set is None:
+                rule_set = rule_sets[rule.id] = RuleSet(rule.id, rule.metric)
+            elif rule_set.metric != rule.metric:
+                raise ValueError(f"Rule {rule.id}: all rules with one id must watch the same metric")
+            rule_set.add(rule)
+
+        # A sample only visits the rule sets that can apply to its device:
+        # general ones, plus device/group-scoped ones indexed by IP
+        general, scoped = {}, {}
+        for rule_set in rule_sets.values():
+            if rule_set.default is not None or rule_set.by_type:
+                general.setdefault(rule_set.metric, []).append(rule_set)
+                continue
+            ips = set(rule_set.by_device)
+            for name in rule_set.by_group:
+                ips.update(groups[name])
+            for ip in ips:
+                scoped.setdefault((rule_set.metric, ip), []).append(rule_set)
+        groups_of = {}
+        for name, ips in groups.items():
+            for ip in ips:
+                groups_of.setdefault(ip, []).append(name)
+
+        self.config = {"groups": groups, "rules": list(config.get("rules") or [])}
+        self._general = {metric: tuple(sets) for metric, sets in general.items()}
+        self._scoped = {key: tuple(sets) for key, sets in scoped.items()}
+        self._groups_of = {ip: tuple(names) for ip, names in groups_of.items()}
+        # Rules may have changed meaning: start every condition over
+        firing, self._firing = self._firing, {}
+        self._state.clear()
+        return firing
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.config, f, indent=2)
+        os.replace(tmp, self.path)
+
+    # ---------- evaluation ----------
+
+    def evaluate(self, ip, device_type, sample, ts):
+        """
+        Evaluates one poll sample ({metric: value}) of a device.
+        Returns [(event, rule, value)] with event "firing" (every sample
+        while the rule fires) or "cleared" (once, when it stops).
+        """
+        events = []
+        groups = self._groups_of.get(ip, ())
+        for metric, value in sample.items():
+            if value is None:
+                continue
+            rule_sets = self._general.get(metric, ())
+            scoped = self._scoped.get((metric, ip))
+            if scoped is not None:
+                rule_sets += scoped
+            if not rule_sets:
+                continue
+            previous = self._last.get((ip, metric))
+            self._last[(ip, metric)] = (ts, value)
+            for rule_set in rule_sets:
+                rule = rule_set.resolve(ip, device_type, groups)
+                if rule is None:
+                    continue
+                if rule.kind == "rate":
+                    if previous is None or ts <= previous[0]:
+                        continue
+                    observed = (value - previous[1]) / (ts - previous[0]) * rule.per
+                else:
+                    observed = value
+                event = self._step(ip, rule, observed, ts)
+                if event is not None:
+                    events.append((event, rule, observed))
+        return events
+
+    def _step(self, ip, rule, value, ts):
+        key = (ip, rule.id)
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = RuleState()
+
+        if state.firing:
+            if rule.recovered(value):
+                state.firing = False
+                state.since = None
+                self._firing[ip].pop(rule.id, None)
+                return "cleared"
+            return "firing"
+
+        if not rule.breached(value):
+            state.since = None
+            return None
+        if state.since is None:
+            state.since = ts
+        if ts - state.since < rule.duration:
+            return None
+        state.firing = True
+        self._firing.setdefault(ip, {})[rule.id] = rule
+        return "firing"
+
+    def firing(self, ip):
+        """Rules currently firing for a device: {rule id: Rule}"""
+        return self._firing.get(ip, {})
+
+    def forget(self, ip):
+        """Drops the state of a removed device"""
+        self._firing.pop(ip, None)
+        for key in [key for key in self._state if key[0] == ip]:
+            del self._state[key]
+        for key in [key for key in self._last if key[0] == ip]:
+            del self._last[key]
+
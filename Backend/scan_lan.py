@@ -1,34 +1,30 @@
-from pysnmp.hlapi import SnmpEngine, CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity, getCmd
+import asyncio
+import sys
+from discovery import ScanJob, run_scan
 
 # --- ตั้งค่า Network ของคุณ ---
-# ให้แก้ 3 ตัวแรกให้ตรงกับ IP เครื่องคุณ (ดูจาก ipconfig) เช่น 192.168.1 หรือ 192.168.0
-NETWORK_PREFIX = '127.0.0.1' 
-COMMUNITY_STRING = 'public'
+# ระบุวงที่จะสแกนเป็น CIDR ได้หลายวง เช่น python scan_lan.py 192.168.1.0/24 10.20.0.0/16
+# (ค่า default สแกนแค่เครื่องตัวเอง)
+NETWORKS = sys.argv[1:] or ['127.0.0.1/32']
 
-# OID มาตรฐานสำหรับถาม "รายละเอียดเครื่อง" (System Description)
-OID_SYS_DESCR = '1.3.6.1.2.1.1.1.0'
+async def main():
+    job = ScanJob(NETWORKS, methods=("snmp",))
+    print(f"--- กำลังสแกนหาอุปกรณ์ SNMP ในวง {', '.join(str(n) for n in job.networks)} ({job.total} IP) ---")
+    print("อาจใช้เวลาสักพักนะครับ...")
 
-print(f"--- กำลังสแกนหาอุปกรณ์ SNMP ในวง {NETWORK_PREFIX}.1 ถึง .20 ---")
-print("อาจใช้เวลาสักพักนะครับ...")
+    def on_host(host):
+        # ถ้าตอบกลับมา แสดงว่าเจออุปกรณ์!
+        print(f"[เจอ!] IP: {host['ip']} | Info: {host.get('sysDescr')} | OID: {host.get('sysObjectID')}")
 
-for i in range(1, 21): # ลองสแกนแค่ 20 เลขแรกก่อน (แก้เลข 21 เป็น 255 ถ้าจะเอาทั้งหมด)
-    target_ip = f"{NETWORK_PREFIX}.{i}"
-    
-    # ส่งคำขอไปถาม
-    errorIndication, errorStatus, errorIndex, varBinds = next(
-        getCmd(SnmpEngine(),
-               CommunityData(COMMUNITY_STRING, mpModel=1),
-               UdpTransportTarget((target_ip, 161), timeout=0.5, retries=0), # timeout ไวๆ จะได้ไม่รอนาน
-               ContextData(),
-               ObjectType(ObjectIdentity(OID_SYS_DESCR)))
-    )
+    async def report():
+        while True:
+            await asyncio.sleep(2)
+            print(f"... {job.sent['snmp']}/{job.total} IP ({job.hosts_per_second} hosts/s, rate {job.sweep_rate:.0f}/s)")
 
-    if not errorIndication and not errorStatus:
-        # ถ้าตอบกลับมา แสดงว่าเจออุปกรณ์!
-        device_info = varBinds[0][1].prettyPrint()
-        print(f"[เจอ!] IP: {target_ip} | Info: {device_info}")
-    else:
-        # เงียบ = ไม่เจอ หรือไม่เปิด SNMP
-        pass
+    reporter = asyncio.create_task(report())
+    await run_scan(job, on_host)
+    reporter.cancel()
+
+    print(f"--- จบการสแกน: เจอ {len(job.hosts)} อุปกรณ์, {job.total} IP ใน {job.finished_at - job.started_at:.1f} วินาที ({job.hosts_per_second} hosts/s) ---")
 
-print("--- จบการสแกน ---")
\ No newline at end of file
+asyncio.run(main())
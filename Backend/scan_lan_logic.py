@@ -1,6 +1,9 @@
+import asyncio
+import ipaddress
 import socket
-from scapy.all import ARP, Ether, srp, conf
 import sys
+import psutil
+from discovery import ScanJob, run_scan, REPLY_TIMEOUT
 
 def get_local_network():
     """ฟังก์ชันหา IP เครื่องตัวเองและสร้างวง LAN (Subnet)"""
@@ -19,38 +22,37 @@ def get_local_network():
         print(f"[-] ไม่สามารถระบุ IP ของเครื่องได้: {e}")
         return None, None
 
+def get_local_networks():
+    """ทุกวง IPv4 ที่เครื่องต่ออยู่ (ไม่รวม loopback / link-local) เช่น ['192.168.1.0/24', '10.20.0.0/16']"""
+    networks = []
+    for nic, addrs in psutil.net_if_addrs().items():
+        for addr in addrs:
+            if addr.family != socket.AF_INET or not addr.netmask:
+                continue
+            net = ipaddress.ip_network(f"{addr.address}/{addr.netmask}", strict=False)
+            if net.prefixlen < 16:
+                # วงใหญ่กว่า /16 (เช่น 10.0.0.0/8) -> สแกนแค่ /16 ที่เครื่องอยู่
+                net = ipaddress.ip_network(f"{addr.address}/16", strict=False)
+            if net.is_loopback or net.is_link_local or str(net) in networks:
+                continue
+            networks.append(str(net))
+    if not networks:
+        # ไม่มีข้อมูล netmask -> เดาเป็น /24 จาก IP ที่ใช้ออกเน็ต
+        _, network_range = get_local_network()
+        if network_range:
+            networks.append(network_range)
+    return networks
+
 def scan(ip_range):
+    """สแกน ARP แบบ blocking (ใช้ engine เดียวกับ discovery job) คืนค่า list ของ {ip, mac, name}"""
     print(f"[*] เริ่มสแกนวงเครือข่าย: {ip_range}")
-    print("[*] กรุณารอสักครู่ (Timeout ตั้งไว้ที่ 3 วินาที)...")
-    
-    try:
-        # สร้าง ARP Request
-        # Ether(dst="ff:ff:ff:ff:ff:ff") คือการทำ Broadcast ไปทุกเครื่อง
-        arp_request = ARP(pdst=ip_range)
-        broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
-        packet = broadcast / arp_request
-
-        # ส่งแพ็กเกจ (srp = Send and Receive packets at layer 2)
-        # inter=0.1 ช่วยให้ไม่ยิงเร็วเกินไปจนโดน Firewall บล็อก
-        result = srp(packet, timeout=3, verbose=True, inter=0.1)[0]
+    print(f"[*] กรุณารอสักครู่ (รอ reply {REPLY_TIMEOUT:g} วินาทีหลังส่งครบ)...")
 
-        devices = []
-        for sent, received in result:
-            # พยายามหา Hostname
-            try:
-                hostname = socket.gethostbyaddr(received.psrc)[0]
-            except:
-                hostname = "Unknown"
-            
-            devices.append({'ip': received.psrc, 'mac': received.hwsrc, 'name': hostname})
-        
-        return devices
-
-    except Exception as e:
-        print(f"\n[!] เกิดข้อผิดพลาดขณะสแกน: {e}")
-        if "Npcap" in str(e) or "WinPcap" in str(e):
-            print("[!] ตรวจพบปัญหาเกี่ยวกับ Driver: คุณได้ติดตั้ง Npcap หรือยัง?")
+    job = asyncio.run(run_scan(ScanJob([ip_range], methods=("arp",))))
+    if job.status == "error":
         return []
+    print(f"[*] ส่ง {job.sent['arp']} requests ({job.hosts_per_second} hosts/s)")
+    return job.hosts
 
 if __name__ == "__main__":
     print("=== โปรแกรมทดสอบ SNMP Network Scanner ===")
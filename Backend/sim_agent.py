@@ -0,0 +1,293 @@
+"""
+Simulated SNMP v2c agents for benchmarks and local testing.
+
+Each agent serves one UDP port with the parts of the MIB the poller reads:
+system, HOST-RESOURCES (hrProcessorLoad, hrStorageTable) and IF-MIB
+(ifTable, ifXTable with 64-bit counters). Values move with time: sysUpTime
+ticks, octet counters grow at a per-interface rate (so the 32-bit columns
+wrap on fast links), CPU load drifts. Every agent can add response latency,
+drop a fraction of requests, or be dead (bound, but never answering).
+
+Run a fleet from the command line:
+
+    python sim_agent.py --agents 500 --port 16100 --interfaces 24 --latency 0.002 --loss 0.01 --dead 5
+
+It prints "ready <first port> <count>" once every agent listens.
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from bisect import bisect_right
+
+import snmp_codec
+from snmp_codec import (Counter32, Counter64, Gauge32, Integer32, ObjectIdentifier, OctetString,
+                        TimeTicks, EndOfMibView, NoSuchInstance, SnmpCodecError)
+
+MAX_RESPONSE_VARBINDS = 2048    # bound on GETBULK responses (one UDP datagram)
+
+OID_HR_STORAGE_RAM = '1.3.6.1.2.1.25.2.1.2'
+OID_HR_STORAGE_FIXED_DISK = '1.3.6.1.2.1.25.2.1.4'
+SPEEDS = (100_000_000, 1_000_000_000, 10_000_000_000)
+
+_layouts = {}   # (interfaces, cpus) -> MibLayout, shared by agents of the same shape
+
+
+def _oid_key(oid):
+    return tuple(int(arc) for arc in oid.split('.'))
+
+
+class MibLayout:
+    """Sorted OIDs of an agent shape, with the (column, index) each one maps to"""
+
+    def __init__(self, interfaces, cpus):
+        columns = {
+            '1.3.6.1.2.1.1.1.0': ('sysDescr', 0),
+            '1.3.6.1.2.1.1.2.0': ('sysObjectID', 0),
+            '1.3.6.1.2.1.1.3.0': ('sysUpTime', 0),
+            '1.3.6.1.2.1.1.5.0': ('sysName', 0),
+            '1.3.6.1.2.1.2.1.0': ('ifNumber', 0),
+        }
+        for i in range(cpus):
+            columns[f'1.3.6.1.2.1.25.3.3.1.2.{196608 + i}'] = ('hrProcessorLoad', i)
+        for idx in (1, 31):     # physical memory, root file system
+            for sub, name in ((2, 'hrStorageType'), (3, 'hrStorageDescr'), (4, 'hrStorageUnits'),
+                              (5, 'hrStorageSize'), (6, 'hrStorageUsed')):
+                columns[f'1.3.6.1.2.1.25.2.3.1.{sub}.{idx}'] = (name, idx)
+        for i in range(1, interfaces + 1):
+            for sub, name in ((1, 'ifIndex'), (2, 'ifDescr'), (3, 'ifType'), (5, 'ifSpeed'),
+                              (8, 'ifOperStatus'), (10, 'ifInOctets'), (13, 'ifInDiscards'),
+                              (14, 'ifInErrors'), (16, 'ifOutOctets'), (19, 'ifOutDiscards'),
+                              (20, 'ifOutErrors')):
+                columns[f'1.3.6.1.2.1.2.2.1.{sub}.{i}'] = (name, i)
+            for sub, name in ((1, 'ifName'), (6, 'ifHCInOctets'), (10, 'ifHCOutOctets'),
+                              (15, 'ifHighSpeed')):
+                columns[f'1.3.6.1.2.1.31.1.1.1.{sub}.{i}'] = (name, i)
+        self.columns = columns
+        self.oids = sorted(columns, key=_oid_key)
+        self.keys = [_oid_key(oid) for oid in self.oids]
+
+    @classmethod
+    def get(cls, interfaces, cpus):
+        layout = _layouts.get((interfaces, cpus))
+        if layout is None:
+            layout = _layouts[(interfaces, cpus)] = cls(interfaces, cpus)
+        return layout
+
+    def next_oid(self, oid):
+        """First OID after oid, or None at the end of the MIB"""
+        try:
+            i = bisect_right(self.keys, _oid_key(oid))
+        except ValueError:
+            return None
+        return self.oids[i] if i < len(self.oids) else None
+
+
+class SimAgent(asyncio.DatagramProtocol):
+    def __init__(self, seed=0, interfaces=24, cpus=4, latency=0.0, jitter=0.0, loss=0.0, dead=False,
+                 community=None):
+        rng = random.Random(seed)
+        self.layout = MibLayout.get(interfaces, cpus)
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.dead = dead
+        self.community = community      # bytes; None answers any community
+        self.requests = 0
+        self.responses = 0
+        self._rng = rng
+        self._transport = None
+
+        self.name = f"sim-{seed}"
+        self.started = time.time() - rng.uniform(3600, 30 * 86400)
+        self.cpu_phase = [rng.uniform(0, 2 * math.pi) for _ in range(cpus)]
+        self.cpu_base = rng.uniform(5, 60)
+        self.memory_kb = rng.choice((4, 8, 16, 32)) * 1024 * 1024
+        self.memory_used = rng.uniform(0.2, 0.9)
+        self.if_speed = {}
+        self.if_up = {}
+        self.if_rate = {}       # ifIndex -> (in Bps, out Bps)
+        self.if_base = {}       # ifIndex -> (in, out) octets at start
+        for i in range(1, interfaces + 1):
+            speed = rng.choice(SPEEDS)
+            self.if_speed[i] = speed
+            self.if_up[i] = rng.random() < 0.9
+            load = rng.uniform(0, 0.6) if self.if_up[i] else 0.0
+            self.if_rate[i] = (speed / 8 * load, speed / 8 * load * rng.uniform(0.2, 1.0))
+            self.if_base[i] = (rng.randrange(1 << 40), rng.randrange(1 << 40))
+
+    # ---------- MIB ----------
+
+    def value(self, oid, now):
+        entry = self.layout.columns.get(oid)
+        if entry is None:
+            return NoSuchInstance
+        column, idx = entry
+        elapsed = now - self.started
+
+        if column == 'sysUpTime':
+            return TimeTicks(int(elapsed * 100) & 0xffffffff)
+        if column == 'sysDescr':
+            return OctetString(b'Simulated agent')
+        if column == 'sysObjectID':
+            return ObjectIdentifier('1.3.6.1.4.1.8072.3.2.10')
+        if column == 'sysName':
+            return OctetString(self.name.encode())
+        if column == 'ifNumber':
+            return Integer32(len(self.if_speed))
+        if column == 'hrProcessorLoad':
+            load = self.cpu_base + 25 * math.sin(elapsed / 60 + self.cpu_phase[idx])
+            return Integer32(max(0, min(100, int(load))))
+        if column == 'hrStorageType':
+            return ObjectIdentifier(OID_HR_STORAGE_RAM if idx == 1 else OID_HR_STORAGE_FIXED_DISK)
+        if column == 'hrStorageDescr':
+            return OctetString(b'Physical memory' if idx == 1 else b'/')
+        if column == 'hrStorageUnits':
+            return Integer32(1024 if idx == 1 else 4096)
+        if column == 'hrStorageSize':
+            return Integer32(self.memory_kb if idx == 1 else 50_000_000)
+        if column == 'hrStorageUsed':
+            return Integer32(int(self.memory_kb * self.memory_used) if idx == 1 else 20_000_000)
+
+        # IF-MIB
+        if column == 'ifIndex':
+            return Integer32(idx)
+        if column in ('ifDescr', 'ifName'):
+            return OctetString(f'eth{idx}'.encode())
+        if column == 'ifType':
+            return Integer32(6)     # ethernetCsmacd
+        if column == 'ifSpeed':
+            return Gauge32(min(self.if_speed[idx], 0xffffffff))
+        if column == 'ifHighSpeed':
+            return Gauge32(self.if_speed[idx] // 1_000_000)
+        if column == 'ifOperStatus':
+            return Integer32(1 if self.if_up[idx] else 2)
+        if column in ('ifInOctets', 'ifOutOctets', 'ifHCInOctets', 'ifHCOutOctets'):
+            out = 'Out' in column
+            octets = self.if_base[idx][out] + int(self.if_rate[idx][out] * elapsed)
+            if column.startswith('ifHC'):
+                return Counter64(octets & 0xffffffffffffffff)
+            return Counter32(octets & 0xffffffff)
+        # errors / discards: a few per hour on busy ports
+        rate = self.if_rate[idx][0] / 1e9
+        return Counter32(int(elapsed * rate * (2 if 'Discards' in column else 1)) & 0xffffffff)
+
+    def _next(self, oid, now):
+        next_oid = self.layout.next_oid(oid)
+        if next_oid is None:
+            return oid, EndOfMibView
+        return next_oid, self.value(next_oid, now)
+
+    def respond(self, msg):
+        now = time.time()
+        oids = [oid for oid, _ in msg.varbinds]
+        if msg.pdu_type == snmp_codec.GET_REQUEST:
+            varbinds = [(oid, self.value(oid, now)) for oid in oids]
+        elif msg.pdu_type == snmp_codec.GET_NEXT_REQUEST:
+            varbinds = [self._next(oid, now) for oid in oids]
+        elif msg.pdu_type == snmp_codec.GET_BULK_REQUEST:
+            non_repeaters = max(0, min(msg.non_repeaters, len(oids)))
+            varbinds = [self._next(oid, now) for oid in oids[:non_repeaters]]
+            current = oids[non_repeaters:]
+            for _ in range(max(0, msg.max_repetitions)):
+                if not current or len(varbinds) + len(current) > MAX_RESPONSE_VARBINDS:
+                    break
+                row = [self._next(oid, now) for oid in current]
+                varbinds += row
+                if all(value is EndOfMibView for _, value in row):
+                    break
+                current = [oid for oid, _ in row]
+        else:
+            return None
+        return snmp_codec.encode_message(msg.version, msg.community, snmp_codec.RESPONSE,
+                                         msg.request_id, varbinds)
+
+    # ---------- transport ----------
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        if self.dead or (self.loss and self._rng.random() < self.loss):
+            return
+        try:
+            msg = snmp_codec.decode_message(data)
+        except SnmpCodecError:
+            return
+        if self.community is not None and msg.community != self.community:
+            return
+        response = self.respond(msg)
+        if response is None:
+            return
+        self.responses += 1
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._transport.sendto, response, addr)
+        else:
+            self._transport.sendto(response, addr)
+
+
+async def start_fleet(count, port=16100, host='127.0.0.1', interfaces=24, cpus=4,
+                      latency=0.0, jitter=0.0, loss=0.0, dead=0, seed=0, community=None):
+    """
+    Binds count agents on consecutive ports (the last `dead` ones never answer).
+    Returns [(transport, SimAgent)].
+    """
+    loop = asyncio.get_running_loop()
+    fleet = []
+    for i in range(count):
+        agent = SimAgent(seed + i, interfaces, cpus, latency, jitter, loss, dead=i >= count - dead,
+                         community=community)
+        transport, _ = await loop.create_datagram_endpoint(lambda agent=agent: agent,
+                                                           local_addr=(host, port + i))
+        fleet.append((transport, agent))
+    return fleet
+
+
+def _raise_file_limit():
+    """One socket per agent: lift the soft open-file limit to the hard one where there is one"""
+    try:
+        import resource
+    except ImportError:     # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fleet of simulated SNMP agents")
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=16100, help="port of the first agent")
+    parser.add_argument("--interfaces", type=int, default=24)
+    parser.add_argument("--cpus", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="response delay (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay up to this (seconds)")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of requests dropped")
+    parser.add_argument("--dead", type=int, default=0, help="agents that never answer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--community", help="only answer this community (default: any)")
+    args = parser.parse_args()
+    _raise_file_limit()
+
+    async def run():
+        await start_fleet(args.agents, args.port, args.host, args.interfaces, args.cpus,
+                          args.latency, args.jitter, args.loss, args.dead, args.seed,
+                          args.community.encode() if args.community else None)
+        print(f"ready {args.port} {args.agents}", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
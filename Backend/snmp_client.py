@@ -0,0 +1,444 @@
+"""
+Asyncio-native SNMP v1/v2c client.
+
+All requests, for every target, go through one shared UDP socket owned by
+the event loop. Responses are matched to their request by request-id and
+timeouts/retries are handled with loop timers, so thousands of outstanding
+requests cost futures rather than threads.
+
+Per-target state (resolved address, encoded community, encoded varbind
+lists) lives in pooled SnmpSession objects, so repeated polls of the same
+target skip DNS and most of the encoding work.
+
+Counted requests (polling) are bounded where their PDUs are sent: at most
+SNMP_MAX_IN_FLIGHT await a response across all targets and
+SNMP_MAX_PER_DEVICE per session, however many walks and GET chunks a
+collection starts at once. Discovery sweeps pace themselves and are exempt.
+
+Unless a request passes its own timeout, the timeout of each host follows
+its measured round-trip time (RFC 6298 style smoothed RTT + 4 x variance),
+so a LAN agent answering in 2 ms isn't waited on for 3 s when it's down.
+"""
+import asyncio
+import ipaddress
+import itertools
+import os
+import random
+import socket
+import time
+from collections import OrderedDict
+
+import snmp_codec
+from metrics import Counter, Gauge, Histogram
+from snmp_codec import SnmpCodecError
+
+DEFAULT_PORT = 161
+DEFAULT_TIMEOUT = 3.0
+DEFAULT_RETRIES = 1
+RECV_BUFFER_SIZE = 4 * 1024 * 1024  # absorb bursts of responses during fan-out
+
+RTT_TIMEOUT_MIN = 0.5       # floor of the adaptive timeout (agents stall on big walks)
+RTT_TIMEOUT_MAX = DEFAULT_TIMEOUT
+
+# In-flight request PDUs (retries reuse the slot of their request)
+SNMP_MAX_IN_FLIGHT = int(os.getenv("NMS_SNMP_MAX_IN_FLIGHT", "1000"))    # across all targets
+SNMP_MAX_PER_DEVICE = int(os.getenv("NMS_SNMP_MAX_PER_DEVICE", "4"))     # per target agent
+
+SESSION_TTL = 600.0         # idle seconds before a session is evicted
+SESSION_MAX = 20000         # LRU bound on pooled sessions
+VARBIND_CACHE_MAX = 64      # encoded OID lists kept per session
+
+# Round trips (request PDUs sent, retries excluded) per target host (host:port off port 161)
+SNMP_ROUND_TRIPS = {}
+
+# Prometheus metrics per target; uncounted requests (discovery sweeps) share target="sweep"
+SNMP_REQUESTS = Counter("nms_snmp_requests_total", "SNMP requests (retries excluded)", ("target",))
+SNMP_PDUS = Counter("nms_snmp_pdus_sent_total", "SNMP request PDUs sent (retries included)", ("target",))
+SNMP_RETRIES = Counter("nms_snmp_retries_total", "SNMP requests resent after a timeout", ("target",))
+SNMP_TIMEOUTS = Counter("nms_snmp_timeouts_total", "SNMP requests unanswered after every retry", ("target",))
+SNMP_RTT = Histogram("nms_snmp_round_trip_seconds", "Round-trip time of SNMP requests answered on the first attempt")
+SNMP_PENDING = Gauge("nms_snmp_pending_requests", "SNMP requests waiting for a response")
+SNMP_SESSIONS = Gauge("nms_snmp_sessions", "Pooled SNMP sessions")
+SNMP_WAITING = Gauge("nms_snmp_waiting_requests", "SNMP requests queued for an in-flight slot")
+
+
+class SnmpTimeout(Exception):
+    pass
+
+
+class SnmpError(Exception):
+    """Agent answered with a non-zero error-status"""
+
+    def __init__(self, error_status, error_index):
+        self.error_status = error_status
+        self.error_index = error_index
+        name = snmp_codec.ERROR_STATUS_NAMES.get(error_status, str(error_status))
+        super().__init__(f"{name} at varbind {error_index}")
+
+
+class TargetMetrics:
+    """Metric children of one target, bound once so a request only increments attributes"""
+
+    __slots__ = ('requests', 'pdus', 'retries', 'timeouts')
+
+    def __init__(self, target):
+        self.requests = SNMP_REQUESTS.labels(target)
+        self.pdus = SNMP_PDUS.labels(target)
+        self.retries = SNMP_RETRIES.labels(target)
+        self.timeouts = SNMP_TIMEOUTS.labels(target)
+
+
+_SWEEP_METRICS = TargetMetrics("sweep")
+
+
+class SnmpSession:
+    """Warm state for one (host, port, community, version) target"""
+
+    __slots__ = ('host', 'port', 'target', 'community', 'version', 'address', 'prefix',
+                 'last_used', 'metrics', 'slots', '_varbinds')
+
+    def __init__(self, host, port, community, version, address):
+        self.host = host
+        self.port = port
+        # Key of per-target stats (round trips, RTT): the host, with the port if it isn't 161
+        self.target = host if port == DEFAULT_PORT else f"{host}:{port}"
+        self.community = community
+        self.version = version
+        self.address = (address, port)
+        self.prefix = snmp_codec.encode_prefix(version, community)
+        self.last_used = time.monotonic()
+        self.metrics = None                # TargetMetrics, bound on the first counted request
+        self.slots = None                  # Semaphore of SNMP_MAX_PER_DEVICE, created on first use
+        self._varbinds = OrderedDict()   # tuple(oids) -> encoded VarBindList
+
+    def encoded_varbinds(self, oids):
+        key = tuple(oids)
+        encoded = self._varbinds.get(key)
+        if encoded is None:
+            encoded = snmp_codec.encode_request_varbinds(key)
+            self._varbinds[key] = encoded
+            if len(self._varbinds) > VARBIND_CACHE_MAX:
+                self._varbinds.popitem(last=False)
+        else:
+            self._varbinds.move_to_end(key)
+        return encoded
+
+    def encode(self, pdu_type, request_id, oids, error_status=0, error_index=0):
+        return snmp_codec.encode_raw(self.prefix, pdu_type, request_id,
+                                     self.encoded_varbinds(oids), error_status, error_index)
+
+
+class SessionPool:
+    """LRU/TTL pool of SnmpSession keyed by (host, port, community, version)"""
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def get(self, host, port, community, version):
+        key = (host, port, community, version)
+        now = time.monotonic()
+        session = self._sessions.get(key)
+        if session is not None and now - session.last_used <= self.ttl:
+            session.last_used = now
+            self._sessions.move_to_end(key)
+            return session
+
+        address = await _resolve(host)
+        session = SnmpSession(host, port, community, version, address)
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        self._evict(now)
+        return session
+
+    def _evict(self, now):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        # Oldest entries are at the front; stop at the first fresh one
+        if now - self._last_sweep >= self.ttl / 10:
+            self._last_sweep = now
+            while self._sessions:
+                key, session = next(iter(self._sessions.items()))
+                if now - session.last_used <= self.ttl:
+                    break
+                del self._sessions[key]
+
+    def clear(self):
+        self._sessions.clear()
+
+
+async def _resolve(host):
+    try:
+        ipaddress.IPv4Address(host)
+        return host
+    except ValueError:
+        pass
+    infos = await asyncio.get_running_loop().getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    return infos[0][4][0]
+
+
+class RttEstimator:
+    """Smoothed round-trip time of one host (RFC 6298 gains)"""
+
+    __slots__ = ('srtt', 'rttvar')
+
+    def __init__(self, rtt):
+        self.srtt = rtt
+        self.rttvar = rtt / 2
+
+    def update(self, rtt):
+        self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+        self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    @property
+    def timeout(self):
+        return min(max(self.srtt + 4 * self.rttvar, RTT_TIMEOUT_MIN), RTT_TIMEOUT_MAX)
+
+
+class _SnmpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client):
+        self.client = client
+
+    def datagram_received(self, data, addr):
+        self.client._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        # ICMP errors (port unreachable, ...) are reported per socket, not per
+        # request; the affected requests simply run into their timeout.
+        pass
+
+
+class SnmpClient:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 max_in_flight=SNMP_MAX_IN_FLIGHT, max_per_device=SNMP_MAX_PER_DEVICE):
+        self.timeout = timeout
+        self.retries = retries
+        self.max_in_flight = max_in_flight
+        self.max_per_device = max_per_device
+        self.waiting = 0    # counted requests queued for a slot
+
+        self._transport = None
+        self._loop = None
+        self._starting = None
+        self._pending = {}  # request-id -> (future, (ip, port))
+        self._slots = None  # global Semaphore, bound to the loop in start()
+        self._request_ids = itertools.count(random.randint(1, 0x3FFFFFFF))
+        self.sessions = SessionPool()
+        self.rtt = {}       # target (host, or host:port) -> RttEstimator
+
+    def timeout_for(self, host):
+        """Adaptive timeout of host (the default until it has answered once)"""
+        estimator = self.rtt.get(host)
+        return estimator.timeout if estimator is not None else self.timeout
+
+    def _observe_rtt(self, host, rtt):
+        estimator = self.rtt.get(host)
+        if estimator is None:
+            self.rtt[host] = RttEstimator(rtt)
+        else:
+            estimator.update(rtt)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def write_buffer_size(self):
+        """Bytes queued in the socket's send buffer (0 when the socket isn't open)"""
+        return self._transport.get_write_buffer_size() if self._transport is not None else 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self._transport is not None and self._loop is loop:
+            return
+        if self._starting is not None and self._loop is loop:
+            await self._starting
+            return
+
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.sessions.clear()   # their per-target semaphores belong to the previous loop
+        self._starting = loop.create_future()
+        try:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _SnmpProtocol(self), local_addr=('0.0.0.0', 0))
+            sock = self._transport.get_extra_info('socket')
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_SIZE)
+            except OSError:
+                pass
+            self._pending.clear()
+            self._starting.set_result(None)
+        except Exception as e:
+            self._starting.set_exception(e)
+            self._starting = None
+            raise
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        self._starting = None
+        for fut, _ in self._pending.values():
+            if not fut.done():
+                fut.cancel()
+        self._pending.clear()
+
+    def _next_request_id(self):
+        while True:
+            request_id = next(self._request_ids) & 0x7FFFFFFF
+            if request_id and request_id not in self._pending:
+                return request_id
+
+    def _on_datagram(self, data, addr):
+        try:
+            msg = snmp_codec.decode_message(data)
+        except SnmpCodecError:
+            return
+        entry = self._pending.get(msg.request_id)
+        if entry is None:
+            return  # late reply to a timed-out request, or not ours
+        fut, address = entry
+        if addr[0] != address[0] or fut.done():
+            return
+        fut.set_result(msg)
+
+    async def session(self, host, community, port=DEFAULT_PORT, version=snmp_codec.VERSION_2C):
+        if isinstance(community, str):
+            community = community.encode()
+        return await self.sessions.get(host, port, community, version)
+
+    async def request(self, session, pdu_type, oids, error_status=0, error_index=0,
+                      timeout=None, retries=None, count=True):
+        """
+        Sends one request PDU to a session and waits for the matching response.
+        Retries resend the same request-id, so a late reply to an earlier
+        attempt still completes the request.
+        count=False keeps the request out of SNMP_ROUND_TRIPS and the
+        in-flight limits (discovery sweeps).
+
+        Without an explicit timeout the host's adaptive timeout is used,
+        doubled on every retry; only replies to the first attempt update the
+        RTT estimate, since a reply after a resend can't be attributed.
+        """
+        await self.start()
+        if not count:
+            return await self._exchange(session, pdu_type, oids, error_status, error_index,
+                                        timeout, retries, _SWEEP_METRICS)
+
+        SNMP_ROUND_TRIPS[session.target] = SNMP_ROUND_TRIPS.get(session.target, 0) + 1
+        metrics = session.metrics
+        if metrics is None:
+            metrics = session.metrics = TargetMetrics(session.target)
+        slots = session.slots
+        if slots is None:
+            slots = session.slots = asyncio.Semaphore(self.max_per_device)
+        # Target slot first, so requests queued behind a busy agent never hold global slots
+        async with slots:
+            self.waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+            try:
+                return await self._exchange(session, pdu_type, oids, error_status, error_index,
+                                            timeout, retries, metrics)
+            finally:
+                self._slots.release()
+
+    async def _exchange(self, session, pdu_type, oids, error_status, error_index, timeout, retries, metrics):
+        """Sends the request (with retries) and waits for its response"""
+        adaptive = timeout is None
+        timeout = self.timeout_for(session.target) if adaptive else timeout
+        retries = self.retries if retries is None else retries
+
+        request_id = self._next_request_id()
+        data = session.encode(pdu_type, request_id, oids, error_status, error_index)
+        fut = self._loop.create_future()
+        self._pending[request_id] = (fut, session.address)
+        metrics.requests.value += 1
+
+        try:
+            for attempt in range(retries + 1):
+                if attempt:
+                    metrics.retries.value += 1
+                metrics.pdus.value += 1
+                sent_at = self._loop.time()
+                self._transport.sendto(data, session.address)
+                done, _ = await asyncio.wait((fut,), timeout=timeout)
+                if done:
+                    if attempt == 0:
+                        rtt = self._loop.time() - sent_at
+                        self._observe_rtt(session.target, rtt)
+                        SNMP_RTT.observe(rtt)
+                    return fut.result()
+                if adaptive:
+                    timeout = min(timeout * 2, RTT_TIMEOUT_MAX)
+            metrics.timeouts.value += 1
+            raise SnmpTimeout(f"No SNMP response received before timeout ({session.target})")
+        finally:
+            self._pending.pop(request_id, None)
+
+    @staticmethod
+    def _check(msg):
+        if msg.error_status:
+            raise SnmpError(msg.error_status, msg.error_index)
+        return msg.varbinds
+
+    async def get(self, host, oids, community, port=DEFAULT_PORT, version=snmp_codec.VERSION_2C, **kwargs):
+        """GET of many OIDs in one PDU; returns [(oid, value)]"""
+        session = await self.session(host, community, port, version)
+        msg = await self.request(session, snmp_codec.GET_REQUEST, oids, **kwargs)
+        return self._check(msg)
+
+    async def get_next(self, host, oids, community, port=DEFAULT_PORT, version=snmp_codec.VERSION_2C, **kwargs):
+        session = await self.session(host, community, port, version)
+        msg = await self.request(session, snmp_codec.GET_NEXT_REQUEST, oids, **kwargs)
+        return self._check(msg)
+
+    async def get_bulk(self, host, oids, community, max_repetitions, non_repeaters=0, port=DEFAULT_PORT, **kwargs):
+        session = await self.session(host, community, port, snmp_codec.VERSION_2C)
+        msg = await self.request(session, snmp_codec.GET_BULK_REQUEST, oids,
+                                 non_repeaters, max_repetitions, **kwargs)
+        return self._check(msg)
+
+    async def walk(self, host, oid, community, max_repetitions=25, port=DEFAULT_PORT, **kwargs):
+        """
+        Walks the subtree under oid with GETBULK.
+        Returns [(oid, value)] in agent order.
+        """
+        prefix = oid + '.'
+        results = []
+        next_oid = oid
+        while True:
+            varbinds = await self.get_bulk(host, [next_oid], community, max_repetitions, port=port, **kwargs)
+            if not varbinds:
+                return results
+            for name, value in varbinds:
+                if not name.startswith(prefix) or value is snmp_codec.EndOfMibView:
+                    return results
+                if results and name == results[-1][0]:
+                    return results  # agent not advancing, avoid looping forever
+                results.append((name, value))
+            next_oid = results[-1][0]
+
+
+_client = None
+
+
+async def get_client():
+    """Shared client for the running event loop (socket opened on first use)"""
+    global _client
+    if _client is None:
+        _client = SnmpClient()
+    await _client.start()
+    return _client
+
+
+SNMP_PENDING.set_function(lambda: _client.pending if _client is not None else 0)
+SNMP_SESSIONS.set_function(lambda: len(_client.sessions) if _client is not None else 0)
+SNMP_WAITING.set_function(lambda: _client.waiting if _client is not None else 0)
@@ -0,0 +1,408 @@
+"""
+Minimal BER codec for SNMP v1/v2c messages.
+
+Encodes and decodes whole messages with plain Python values, which is far
+cheaper per PDU than building pyasn1 objects. Used by the asyncio SNMP
+client, and anything else that needs to speak SNMP on a raw UDP socket.
+
+Decoded values are plain int/bytes/str subclasses, so the SNMP type is kept
+(Counter32, TimeTicks, ObjectIdentifier, ...) but callers can use them as
+ordinary numbers and strings.
+"""
+
+# SNMP versions (message 'version' field)
+VERSION_1 = 0
+VERSION_2C = 1
+
+# PDU types
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+RESPONSE = 0xA2
+SET_REQUEST = 0xA3
+TRAP_V1 = 0xA4
+GET_BULK_REQUEST = 0xA5
+INFORM_REQUEST = 0xA6
+TRAP_V2 = 0xA7
+REPORT = 0xA8
+
+# Universal / application tags
+_INTEGER = 0x02
+_OCTET_STRING = 0x04
+_NULL = 0x05
+_OID = 0x06
+_SEQUENCE = 0x30
+_IPADDRESS = 0x40
+_COUNTER32 = 0x41
+_GAUGE32 = 0x42
+_TIMETICKS = 0x43
+_OPAQUE = 0x44
+_COUNTER64 = 0x46
+_NO_SUCH_OBJECT = 0x80
+_NO_SUCH_INSTANCE = 0x81
+_END_OF_MIB_VIEW = 0x82
+
+# Error status values
+ERROR_STATUS_NAMES = {
+    0: 'noError', 1: 'tooBig', 2: 'noSuchName', 3: 'badValue', 4: 'readOnly',
+    5: 'genErr', 6: 'noAccess', 7: 'wrongType', 8: 'wrongLength',
+    9: 'wrongEncoding', 10: 'wrongValue', 11: 'noCreation',
+    12: 'inconsistentValue', 13: 'resourceUnavailable', 14: 'commitFailed',
+    15: 'undoFailed', 16: 'authorizationError', 17: 'notWritable',
+    18: 'inconsistentName',
+}
+
+
+class SnmpCodecError(ValueError):
+    pass
+
+
+# ==================== Value types ====================
+
+class Integer32(int):
+    tag = _INTEGER
+
+class Counter32(int):
+    tag = _COUNTER32
+
+class Gauge32(int):
+    tag = _GAUGE32
+
+class TimeTicks(int):
+    tag = _TIMETICKS
+
+class Counter64(int):
+    tag = _COUNTER64
+
+class OctetString(bytes):
+    tag = _OCTET_STRING
+
+class Opaque(bytes):
+    tag = _OPAQUE
+
+class ObjectIdentifier(str):
+    tag = _OID
+
+class IpAddress(str):
+    tag = _IPADDRESS
+
+
+class _Exception:
+    """noSuchObject / noSuchInstance / endOfMibView varbind values"""
+
+    def __init__(self, tag, name):
+        self.tag = tag
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+    def __bool__(self):
+        return False
+
+
+class _Null:
+    tag = _NULL
+
+    def __repr__(self):
+        return 'Null'
+
+    def __bool__(self):
+        return False
+
+
+Null = _Null()
+NoSuchObject = _Exception(_NO_SUCH_OBJECT, 'noSuchObject')
+NoSuchInstance = _Exception(_NO_SUCH_INSTANCE, 'noSuchInstance')
+EndOfMibView = _Exception(_END_OF_MIB_VIEW, 'endOfMibView')
+
+_EXCEPTIONS = {e.tag: e for e in (NoSuchObject, NoSuchInstance, EndOfMibView)}
+
+
+def is_exception(value):
+    return isinstance(value, _Exception)
+
+
+# ==================== Encoding ====================
+
+def _len(n):
+    if n < 0x80:
+        return bytes((n,))
+    body = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    return bytes((0x80 | len(body),)) + body
+
+
+def _tlv(tag, body):
+    return bytes((tag,)) + _len(len(body)) + body
+
+
+def _int_body(n):
+    return n.to_bytes(((n if n >= 0 else ~n).bit_length() + 8) // 8, 'big', signed=True)
+
+
+_oid_cache = {}
+
+def encode_oid(oid):
+    """BER-encode an OID (dotted string or tuple); results are cached"""
+    cached = _oid_cache.get(oid)
+    if cached is not None:
+        return cached
+
+    arcs = [int(x) for x in oid.strip('.').split('.')] if isinstance(oid, str) else list(oid)
+    if len(arcs) < 2:
+        raise SnmpCodecError(f"OID too short: {oid!r}")
+    body = bytearray()
+    for arc in [arcs[0] * 40 + arcs[1]] + arcs[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        body += bytes(reversed(chunk))
+
+    encoded = _tlv(_OID, bytes(body))
+    if len(_oid_cache) < 100_000:
+        _oid_cache[oid] = encoded
+    return encoded
+
+
+def encode_value(value):
+    if value is None or value is Null:
+        return b'\x05\x00'
+    tag = getattr(value, 'tag', None)
+    if isinstance(value, _Exception):
+        return bytes((value.tag, 0))
+    if tag == _OID:
+        return encode_oid(str(value))
+    if tag == _IPADDRESS:
+        return _tlv(_IPADDRESS, bytes(int(x) for x in value.split('.')))
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return _tlv(tag or _INTEGER, _int_body(value))
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, (bytes, bytearray)):
+        return _tlv(tag or _OCTET_STRING, bytes(value))
+    raise SnmpCodecError(f"Cannot encode value {value!r}")
+
+
+def encode_varbinds(varbinds):
+    """Encodes a VarBindList; the result can be reused across requests"""
+    body = b''.join(_tlv(_SEQUENCE, encode_oid(oid) + encode_value(value)) for oid, value in varbinds)
+    return _tlv(_SEQUENCE, body)
+
+
+def encode_request_varbinds(oids):
+    return encode_varbinds([(oid, None) for oid in oids])
+
+
+def encode_prefix(version, community):
+    """Encodes the version + community fields that start every message"""
+    if isinstance(community, str):
+        community = community.encode()
+    return _tlv(_INTEGER, _int_body(version)) + _tlv(_OCTET_STRING, community)
+
+
+def encode_raw(prefix, pdu_type, request_id, encoded_varbinds, error_status=0, error_index=0):
+    """Assembles a message from a pre-encoded prefix and VarBindList"""
+    pdu = _tlv(pdu_type,
+               _tlv(_INTEGER, _int_body(request_id))
+               + _tlv(_INTEGER, _int_body(error_status))
+               + _tlv(_INTEGER, _int_body(error_index))
+               + encoded_varbinds)
+    return _tlv(_SEQUENCE, prefix + pdu)
+
+
+def encode_message(version, community, pdu_type, request_id, varbinds,
+                   error_status=0, error_index=0):
+    """
+    Encodes a request/response style message.
+    For GETBULK, error_status/error_index carry non-repeaters/max-repetitions.
+    varbinds: list of (oid, value); use None for request varbinds.
+    """
+    return encode_raw(encode_prefix(version, community), pdu_type, request_id,
+                      encode_varbinds(varbinds), error_status, error_index)
+
+
+def encode_get(request_id, oids, community, version=VERSION_2C):
+    return encode_message(version, community, GET_REQUEST, request_id, [(oid, None) for oid in oids])
+
+
+def encode_get_next(request_id, oids, community, version=VERSION_2C):
+    return encode_message(version, community, GET_NEXT_REQUEST, request_id, [(oid, None) for oid in oids])
+
+
+def encode_get_bulk(request_id, oids, community, max_repetitions, non_repeaters=0):
+    return encode_message(VERSION_2C, community, GET_BULK_REQUEST, request_id,
+                          [(oid, None) for oid in oids], non_repeaters, max_repetitions)
+
+
+def encode_trap_v1(community, enterprise, agent_addr, generic_trap, specific_trap, timestamp, varbinds):
+    pdu = _tlv(TRAP_V1,
+               encode_oid(enterprise)
+               + _tlv(_IPADDRESS, bytes(int(x) for x in agent_addr.split('.')))
+               + _tlv(_INTEGER, _int_body(generic_trap))
+               + _tlv(_INTEGER, _int_body(specific_trap))
+               + _tlv(_TIMETICKS, _int_body(timestamp))
+               + encode_varbinds(varbinds))
+    return _tlv(_SEQUENCE, encode_prefix(VERSION_1, community) + pdu)
+
+
+# ==================== Decoding ====================
+
+def _read_tlv(data, pos):
+    """Returns (tag, start, end) of the TLV at pos"""
+    try:
+        tag = data[pos]
+        length = data[pos + 1]
+        pos += 2
+        if length & 0x80:
+            n = length & 0x7F
+            if n == 0 or n > 4:
+                raise SnmpCodecError("Unsupported BER length")
+            length = int.from_bytes(data[pos:pos + n], 'big')
+            pos += n
+    except IndexError:
+        raise SnmpCodecError("Truncated message")
+    end = pos + length
+    if end > len(data):
+        raise SnmpCodecError("Truncated message")
+    return tag, pos, end
+
+
+def _decode_int(data, start, end):
+    return int.from_bytes(data[start:end], 'big', signed=True)
+
+
+def _decode_uint(data, start, end):
+    return int.from_bytes(data[start:end], 'big', signed=False)
+
+
+def decode_oid(data, start, end):
+    arcs = []
+    value = 0
+    for b in data[start:end]:
+        value = (value << 7) | (b & 0x7F)
+        if not b & 0x80:
+            arcs.append(value)
+            value = 0
+    if not arcs:
+        raise SnmpCodecError("Empty OID")
+    first = arcs[0]
+    if first < 80:
+        head = [first // 40, first % 40]
+    else:
+        head = [2, first - 80]
+    return ObjectIdentifier('.'.join(map(str, head + arcs[1:])))
+
+
+def _decode_value(data, tag, start, end):
+    if tag == _INTEGER:
+        return Integer32(_decode_int(data, start, end))
+    if tag == _OCTET_STRING:
+        return OctetString(data[start:end])
+    if tag == _NULL:
+        return Null
+    if tag == _OID:
+        return decode_oid(data, start, end)
+    if tag == _COUNTER32:
+        return Counter32(_decode_uint(data, start, end))
+    if tag == _GAUGE32:
+        return Gauge32(_decode_uint(data, start, end))
+    if tag == _TIMETICKS:
+        return TimeTicks(_decode_uint(data, start, end))
+    if tag == _COUNTER64:
+        return Counter64(_decode_uint(data, start, end))
+    if tag == _IPADDRESS:
+        return IpAddress('.'.join(str(b) for b in data[start:end]))
+    if tag == _OPAQUE:
+        return Opaque(data[start:end])
+    if tag in _EXCEPTIONS:
+        return _EXCEPTIONS[tag]
+    raise SnmpCodecError(f"Unknown value tag 0x{tag:02x}")
+
+
+def _decode_varbinds(data, start, end):
+    varbinds = []
+    pos = start
+    while pos < end:
+        tag, vb_start, vb_end = _read_tlv(data, pos)
+        tag, oid_start, oid_end = _read_tlv(data, vb_start)
+        if tag != _OID:
+            raise SnmpCodecError("Varbind name is not an OID")
+        vtag, v_start, v_end = _read_tlv(data, oid_end)
+        varbinds.append((decode_oid(data, oid_start, oid_end), _decode_value(data, vtag, v_start, v_end)))
+        pos = vb_end
+    return varbinds
+
+
+class Message:
+    """Decoded SNMP message"""
+
+    __slots__ = ('version', 'community', 'pdu_type', 'request_id', 'error_status',
+                 'error_index', 'varbinds', 'enterprise', 'agent_addr',
+                 'generic_trap', 'specific_trap', 'timestamp')
+
+    def __init__(self, version, community, pdu_type):
+        self.version = version
+        self.community = community
+        self.pdu_type = pdu_type
+        self.request_id = 0
+        self.error_status = 0
+        self.error_index = 0
+        self.varbinds = []
+        # v1 Trap-PDU only
+        self.enterprise = None
+        self.agent_addr = None
+        self.generic_trap = None
+        self.specific_trap = None
+        self.timestamp = None
+
+    # GETBULK requests reuse the error fields
+    @property
+    def non_repeaters(self):
+        return self.error_status
+
+    @property
+    def max_repetitions(self):
+        return self.error_index
+
+
+def decode_message(data):
+    """Decodes an SNMP v1/v2c message; raises SnmpCodecError when malformed"""
+    tag, start, end = _read_tlv(data, 0)
+    if tag != _SEQUENCE:
+        raise SnmpCodecError("Not an SNMP message")
+    tag, v_start, v_end = _read_tlv(data, start)
+    version = _decode_int(data, v_start, v_end)
+    tag, c_start, c_end = _read_tlv(data, v_end)
+    community = bytes(data[c_start:c_end])
+    pdu_type, p_start, p_end = _read_tlv(data, c_end)
+
+    msg = Message(version, community, pdu_type)
+
+    if pdu_type == TRAP_V1:
+        tag, s, e = _read_tlv(data, p_start)
+        msg.enterprise = decode_oid(data, s, e)
+        tag, s, e = _read_tlv(data, e)
+        msg.agent_addr = '.'.join(str(b) for b in data[s:e])
+        tag, s, e = _read_tlv(data, e)
+        msg.generic_trap = _decode_int(data, s, e)
+        tag, s, e = _read_tlv(data, e)
+        msg.specific_trap = _decode_int(data, s, e)
+        tag, s, e = _read_tlv(data, e)
+        msg.timestamp = _decode_uint(data, s, e)
+        tag, s, e = _read_tlv(data, e)
+        msg.varbinds = _decode_varbinds(data, s, e)
+        return msg
+
+    tag, s, e = _read_tlv(data, p_start)
+    msg.request_id = _decode_int(data, s, e)
+    tag, s, e = _read_tlv(data, e)
+    msg.error_status = _decode_int(data, s, e)
+    tag, s, e = _read_tlv(data, e)
+    msg.error_index = _decode_int(data, s, e)
+    tag, s, e = _read_tlv(data, e)
+    msg.varbinds = _decode_varbinds(data, s, e)
+    return msg
+
@@ -1,134 +1,333 @@
 
-from pysnmp.hlapi.v1arch import *
+import asyncio
+import time
+from snmp_client import get_client, SnmpTimeout, SnmpError, SNMP_ROUND_TRIPS, DEFAULT_PORT
+from snmp_codec import is_exception
+from counters import InterfaceSample
 
-TARGET_IP = '127.0.0.1' 
+TARGET_IP = '127.0.0.1'
 COMMUNITY = 'dev4th_monitor'
 
-def snmp_walk(oid, target_ip=TARGET_IP, community=COMMUNITY):
+# GETBULK max-repetitions used for table walks
+SNMP_MAX_REPETITIONS = 25
+# Max varbinds packed into one GET PDU (keeps responses under one UDP datagram)
+SNMP_MAX_VARBINDS = 40
+
+def get_round_trips(target_ip=None):
+    """Returns round trips for one target, or the total across all targets"""
+    if target_ip is not None:
+        return SNMP_ROUND_TRIPS.get(target_ip, 0)
+    return sum(SNMP_ROUND_TRIPS.values())
+
+def reset_round_trips():
+    SNMP_ROUND_TRIPS.clear()
+
+def split_target(target_ip):
+    """(host, port) of a target: an IPv4 address/host name, optionally with ':port' (agents on non-standard ports)"""
+    host, sep, port = target_ip.rpartition(':')
+    if sep and port.isdigit() and ':' not in host:
+        return host, int(port)
+    return target_ip, DEFAULT_PORT
+
+async def snmp_walk(oid, target_ip=TARGET_IP, community=COMMUNITY,
+                    max_repetitions=SNMP_MAX_REPETITIONS):
     """
-    Performs an SNMP WALK operation for the given OID.
+    Performs an SNMP WALK of the subtree under the given OID using GETBULK.
+    Each request asks for up to max_repetitions rows.
     Returns a list of (oid, value) tuples.
     Returns None if connection failed (for offline detection).
     """
-    results = []
-    connection_failed = False
-    
     try:
-        snmpDispatcher = SnmpDispatcher()
-        
-        iterator = nextCmd(
-            snmpDispatcher,
-            CommunityData(community, mpModel=1),  # SNMPv2c
-            UdpTransportTarget((target_ip, 161), timeout=3.0, retries=1),
-            ObjectType(ObjectIdentity(oid)),
-            lexicographicMode=False
-        )
+        client = await get_client()
+        host, port = split_target(target_ip)
+        return await client.walk(host, oid, community, max_repetitions, port=port)
+    except SnmpTimeout as e:
+        print(f"SNMP Error for {target_ip}: {e}")
+        return None
+    except SnmpError as e:
+        print(f"SNMP Status Error for {target_ip}: {e}")
+        return []
+    except Exception as e:
+        print(f"SNMP Exception for {target_ip}: {e}")
+        return None
+
+async def snmp_get(oids, target_ip=TARGET_IP, community=COMMUNITY):
+    """
+    Fetches many scalar OIDs packed into as few GET PDUs as possible
+    (SNMP_MAX_VARBINDS per PDU, sent concurrently).
+    Returns a dict {oid: value}; missing instances are left out.
+    Returns None if connection failed.
+    """
+    values = {}
 
-        for errorIndication, errorStatus, errorIndex, varBinds in iterator:
-            if errorIndication:
-                print(f"SNMP Error for {target_ip}: {errorIndication}")
-                connection_failed = True
-                break
-            elif errorStatus:
-                print(f"SNMP Status Error for {target_ip}: {errorStatus.prettyPrint()}")
-                break
-            else:
-                for varBind in varBinds:
-                    results.append(varBind)
-                    
-        snmpDispatcher.transportDispatcher.closeDispatcher()
-        
+    try:
+        client = await get_client()
+        host, port = split_target(target_ip)
+        chunks = [oids[i:i + SNMP_MAX_VARBINDS] for i in range(0, len(oids), SNMP_MAX_VARBINDS)]
+        responses = await asyncio.gather(
+            *[client.get(host, chunk, community, port=port) for chunk in chunks],
+            return_exceptions=True
+        )
     except Exception as e:
         print(f"SNMP Exception for {target_ip}: {e}")
-        connection_failed = True
-    
-    # Return None if connection failed (no SNMP response)
-    if connection_failed and not results:
         return None
-        
-    return results
 
-def get_cpu_loader(target_ip=TARGET_IP):
+    for response in responses:
+        if isinstance(response, SnmpTimeout):
+            print(f"SNMP Error for {target_ip}: {response}")
+            return None
+        elif isinstance(response, SnmpError):
+            print(f"SNMP Status Error for {target_ip}: {response}")
+            continue
+        elif isinstance(response, Exception):
+            print(f"SNMP Exception for {target_ip}: {response}")
+            return None
+
+        for var, val in response:
+            if is_exception(val):
+                continue
+            values[var] = val
+
+    return values
+
+# Static table layout (which indices to read) is cached per device and only
+# re-walked every METADATA_TTL seconds, or right away when sysUpTime goes
+# backwards (agent restarted) or a cached index stops answering.
+METADATA_TTL = 300.0
+
+OID_SYS_UPTIME = '1.3.6.1.2.1.1.3.0'
+OID_HR_PROCESSOR_LOAD = '1.3.6.1.2.1.25.3.3.1.2'
+OID_HR_STORAGE_TYPE = '1.3.6.1.2.1.25.2.3.1.2'
+OID_HR_STORAGE_UNITS = '1.3.6.1.2.1.25.2.3.1.4'
+OID_HR_STORAGE_SIZE = '1.3.6.1.2.1.25.2.3.1.5'
+OID_HR_STORAGE_USED = '1.3.6.1.2.1.25.2.3.1.6'
+OID_HR_STORAGE_RAM = '1.3.6.1.2.1.25.2.1.2'
+OID_IF_DESCR = '1.3.6.1.2.1.2.2.1.2'
+OID_IF_SPEED = '1.3.6.1.2.1.2.2.1.5'
+OID_IF_OPER_STATUS = '1.3.6.1.2.1.2.2.1.8'
+OID_IF_IN_OCTETS = '1.3.6.1.2.1.2.2.1.10'
+OID_IF_OUT_OCTETS = '1.3.6.1.2.1.2.2.1.16'
+OID_IF_IN_DISCARDS = '1.3.6.1.2.1.2.2.1.13'
+OID_IF_IN_ERRORS = '1.3.6.1.2.1.2.2.1.14'
+OID_IF_OUT_DISCARDS = '1.3.6.1.2.1.2.2.1.19'
+OID_IF_OUT_ERRORS = '1.3.6.1.2.1.2.2.1.20'
+IF_EVENT_COLUMNS = (OID_IF_IN_ERRORS, OID_IF_OUT_ERRORS, OID_IF_IN_DISCARDS, OID_IF_OUT_DISCARDS)
+# ifXTable: 64-bit octet counters (a 32-bit counter wraps every 3.4 s at 10 Gbps) and speed in Mbps
+OID_IF_HC_IN_OCTETS = '1.3.6.1.2.1.31.1.1.1.6'
+OID_IF_HC_OUT_OCTETS = '1.3.6.1.2.1.31.1.1.1.10'
+OID_IF_HIGH_SPEED = '1.3.6.1.2.1.31.1.1.1.15'
+
+
+class DeviceMetadata:
+    """Slow-changing table layout of one device"""
+
+    __slots__ = ('cpu_indices', 'ram_units', 'if_descr', 'if_speed', 'if_status', 'if_hc',
+                 'sys_uptime', 'refreshed_at', 'sample_oids', 'missing')
+
+    def __init__(self):
+        self.cpu_indices = []      # hrProcessorLoad indices
+        self.ram_units = {}        # RAM hrStorage index -> allocation units
+        self.if_descr = {}         # ifIndex -> ifDescr
+        self.if_speed = {}         # ifIndex -> speed (bps, from ifHighSpeed when set)
+        self.if_status = {}        # ifIndex -> ifOperStatus
+        self.if_hc = set()         # ifIndex with 64-bit counters
+        self.sys_uptime = None     # last seen sysUpTime (ticks)
+        self.refreshed_at = 0.0
+        self.sample_oids = []      # volatile OIDs read on every poll
+        self.missing = set()       # sample OIDs the agent never answers (kept across refreshes)
+
+    @property
+    def up_indices(self):
+        return [idx for idx, status in self.if_status.items() if status == 1]
+
+    def build_sample_oids(self):
+        oids = [OID_SYS_UPTIME]
+        oids += [f'{OID_HR_PROCESSOR_LOAD}.{idx}' for idx in self.cpu_indices]
+        for idx in self.ram_units:
+            oids += [f'{OID_HR_STORAGE_SIZE}.{idx}', f'{OID_HR_STORAGE_USED}.{idx}']
+        for idx in self.up_indices:
+            in_oid, out_oid, _ = self.counter_oids(idx)
+            oids += [f'{in_oid}.{idx}', f'{out_oid}.{idx}']
+            oids += [f'{column}.{idx}' for column in IF_EVENT_COLUMNS]
+        self.sample_oids = oids
+
+    def counter_oids(self, idx):
+        """(in column, out column, bits) of the octet counters read for an interface"""
+        if idx in self.if_hc:
+            return OID_IF_HC_IN_OCTETS, OID_IF_HC_OUT_OCTETS, 64
+        return OID_IF_IN_OCTETS, OID_IF_OUT_OCTETS, 32
+
+
+METADATA_CACHE = {}     # target -> DeviceMetadata
+_metadata_refresh = {}  # target -> in-flight refresh task
+
+
+def _index_of(oid):
+    return oid.rsplit('.', 1)[-1]
+
+def invalidate_metadata(target_ip):
+    METADATA_CACHE.pop(target_ip, None)
+
+async def refresh_metadata(target_ip=TARGET_IP, community=COMMUNITY):
     """
-    Calculates average CPU load.
-    OID: 1.3.6.1.2.1.25.3.3.1.2 (hrProcessorLoad)
-    Returns None if SNMP connection failed.
+    Walks the static tables of a device (all walks run concurrently, once
+    sysUpTime has answered: a dead device costs one timeout, not a queue
+    of walks behind the per-device request limit).
+    Returns DeviceMetadata, or None if SNMP connection failed.
     """
-    oid = '1.3.6.1.2.1.25.3.3.1.2'
-    results = snmp_walk(oid, target_ip)
-    
+    uptime = await snmp_get([OID_SYS_UPTIME], target_ip, community)
+    if uptime is None:
+        return None
+
+    (cpu, types, units, descr, speed, status, hc_in, high_speed) = await asyncio.gather(
+        snmp_walk(OID_HR_PROCESSOR_LOAD, target_ip, community),
+        snmp_walk(OID_HR_STORAGE_TYPE, target_ip, community),
+        snmp_walk(OID_HR_STORAGE_UNITS, target_ip, community),
+        snmp_walk(OID_IF_DESCR, target_ip, community),
+        snmp_walk(OID_IF_SPEED, target_ip, community),
+        snmp_walk(OID_IF_OPER_STATUS, target_ip, community),
+        snmp_walk(OID_IF_HC_IN_OCTETS, target_ip, community),
+        snmp_walk(OID_IF_HIGH_SPEED, target_ip, community),
+    )
+
     # SNMP connection failed
-    if results is None:
+    if cpu is None:
         return None
-        
-    if not results:
-        return 0
 
+    meta = DeviceMetadata()
+    meta.sys_uptime = uptime.get(OID_SYS_UPTIME)
+    meta.cpu_indices = [_index_of(var) for var, _ in cpu]
+
+    units_by_index = {_index_of(var): val for var, val in (units or [])}
+    for var, val in (types or []):
+        # Physical RAM rows only
+        if OID_HR_STORAGE_RAM in str(val):
+            idx = _index_of(var)
+            try:
+                meta.ram_units[idx] = int(units_by_index[idx])
+            except (KeyError, ValueError):
+                pass
+
+    for var, val in (descr or []):
+        meta.if_descr[_index_of(var)] = bytes(val).decode('utf-8', errors='ignore')
+    for var, val in (speed or []):
+        meta.if_speed[_index_of(var)] = int(val)
+    for var, val in (status or []):
+        meta.if_status[_index_of(var)] = int(val)
+    # Agents without ifXTable (SNMPv1-only, minimal stacks) keep the 32-bit counters
+    meta.if_hc = {_index_of(var) for var, _ in (hc_in or [])}
+    for var, val in (high_speed or []):
+        # ifSpeed saturates at 4294967295 bps; ifHighSpeed is in Mbps
+        if int(val):
+            meta.if_speed[_index_of(var)] = int(val) * 1_000_000
+
+    meta.refreshed_at = time.monotonic()
+    meta.build_sample_oids()
+    previous = METADATA_CACHE.get(target_ip)
+    if previous is not None:
+        # TTL refresh: OIDs the agent didn't serve before still won't be, don't take them as stale
+        meta.missing = previous.missing.intersection(meta.sample_oids)
+    METADATA_CACHE[target_ip] = meta
+    return meta
+
+async def get_metadata(target_ip=TARGET_IP, community=COMMUNITY):
+    """Cached metadata; concurrent callers share one refresh"""
+    meta = METADATA_CACHE.get(target_ip)
+    if meta is not None and time.monotonic() - meta.refreshed_at < METADATA_TTL:
+        return meta
+
+    task = _metadata_refresh.get(target_ip)
+    if task is None:
+        task = asyncio.ensure_future(refresh_metadata(target_ip, community))
+        _metadata_refresh[target_ip] = task
+        task.add_done_callback(lambda t: _metadata_refresh.pop(target_ip, None))
+    return await asyncio.shield(task)
+
+async def probe_alive(target_ip=TARGET_IP, community=COMMUNITY):
+    """
+    Cheap liveness check: one GET of sysUpTime, no retry, adaptive timeout.
+    Returns True if the agent answered.
+    """
+    try:
+        client = await get_client()
+        host, port = split_target(target_ip)
+        await client.get(host, [OID_SYS_UPTIME], community, retries=0, port=port)
+        return True
+    except SnmpError:
+        return True     # an error-status is still an answer
+    except SnmpTimeout:
+        return False
+    except Exception as e:
+        print(f"SNMP Exception for {target_ip}: {e}")
+        return False
+
+async def collect_sample(target_ip=TARGET_IP, community=COMMUNITY):
+    """
+    Reads all volatile values of a device (sysUpTime, CPU loads, RAM used,
+    interface octets) with GETs built from the cached metadata.
+    Returns dict with cpu, ram, net, interfaces ({ifIndex: InterfaceSample}),
+    speeds ({ifIndex: bps}) and sysUpTime, or None if SNMP connection failed.
+    """
+    for attempt in range(2):
+        meta = await get_metadata(target_ip, community)
+        if meta is None:
+            return None
+
+        values = await snmp_get(meta.sample_oids, target_ip, community)
+        if values is None:
+            return None
+
+        uptime = values.get(OID_SYS_UPTIME)
+        restarted = uptime is not None and meta.sys_uptime is not None and uptime < meta.sys_uptime
+        stale = len(values) + len(meta.missing) < len(meta.sample_oids)
+        if (restarted or stale) and attempt == 0:
+            # Agent rebooted or indices moved: re-walk the layout and read again
+            invalidate_metadata(target_ip)
+            continue
+        if stale:
+            # Still incomplete right after a re-walk: the agent just doesn't serve these
+            meta.missing = {oid for oid in meta.sample_oids if oid not in values}
+        meta.sys_uptime = uptime
+        break
+
+    return {
+        "cpu": _cpu_from_values(meta, values),
+        "ram": _ram_from_values(meta, values),
+        "net": _net_from_values(meta, values),
+        "interfaces": _counters_from_values(meta, values),
+        "speeds": meta.if_speed,
+        "sysUpTime": uptime,
+    }
+
+def _cpu_from_values(meta, values):
     total_load = 0
     count = 0
-    for _, val in results:
+    for idx in meta.cpu_indices:
         try:
-            total_load += int(val)
+            total_load += int(values[f'{OID_HR_PROCESSOR_LOAD}.{idx}'])
             count += 1
-        except ValueError:
+        except (KeyError, ValueError):
             pass
-    
+
     if count == 0:
         return 0
-        
+
     return round(total_load / count, 2)
 
-def get_ram_usage(target_ip=TARGET_IP):
-    """
-    Calculates RAM usage.
-    Iterates hrStorageTable to find the Physical RAM unit.
-    Returns dict with total, used, free (in GB) and percent.
-    """
-    # 1. Get Storage Types to find RAM
-    # hrStorageType: 1.3.6.1.2.1.25.2.3.1.2
-    # Standard RAM type OID: 1.3.6.1.2.1.25.2.1.2
-    
-    ram_indices = []
-    
-    # Walk hrStorageType
-    type_results = snmp_walk('1.3.6.1.2.1.25.2.3.1.2', target_ip)
-    
-    for var, val in type_results:
-        # Check if value matches RAM OID
-        # val might be an OID object, convert to str
-        if '1.3.6.1.2.1.25.2.1.2' in str(val):
-            # Extract index from the OID (last component)
-            # var is like 1.3.6.1.2.1.25.2.3.1.2.X
-            idx = str(var).split('.')[-1]
-            ram_indices.append(idx)
-            
+def _ram_from_values(meta, values):
     total_bytes = 0
     used_bytes = 0
 
-    if not ram_indices:
-        # Fallback or empty
-        return {"total": 0, "used": 0, "free": 0, "percent": 0}
-
     # Usually there's only one Physical RAM, but let's sum if multiple
-    for idx in ram_indices:
-        # hrStorageAllocationUnits: 1.3.6.1.2.1.25.2.3.1.4.idx
-        # hrStorageSize: 1.3.6.1.2.1.25.2.3.1.5.idx
-        # hrStorageUsed: 1.3.6.1.2.1.25.2.3.1.6.idx
-        
-        units_res = snmp_walk(f'1.3.6.1.2.1.25.2.3.1.4.{idx}', target_ip)
-        size_res = snmp_walk(f'1.3.6.1.2.1.25.2.3.1.5.{idx}', target_ip)
-        used_res = snmp_walk(f'1.3.6.1.2.1.25.2.3.1.6.{idx}', target_ip)
-        
-        if units_res and size_res and used_res:
-            try:
-                units = int(units_res[0][1])
-                size = int(size_res[0][1])
-                used = int(used_res[0][1])
-                
-                total_bytes += (size * units)
-                used_bytes += (used * units)
-            except:
-                pass
+    for idx, units in meta.ram_units.items():
+        try:
+            size = int(values[f'{OID_HR_STORAGE_SIZE}.{idx}'])
+            used = int(values[f'{OID_HR_STORAGE_USED}.{idx}'])
+
+            total_bytes += (size * units)
+            used_bytes += (used * units)
+        except (KeyError, ValueError):
+            pass
 
     if total_bytes == 0:
         return {"total": 0, "used": 0, "free": 0, "percent": 0}
@@ -146,39 +345,51 @@ def get_ram_usage(target_ip=TARGET_IP):
         "percent": percent
     }
 
-def get_net_io_counters(target_ip=TARGET_IP):
+def _counters_from_values(meta, values):
+    counters = {}
+    for idx in meta.up_indices:
+        in_oid, out_oid, bits = meta.counter_oids(idx)
+        in_val = values.get(f'{in_oid}.{idx}')
+        out_val = values.get(f'{out_oid}.{idx}')
+        if in_val is not None and out_val is not None:
+            events = [values.get(f'{column}.{idx}') for column in IF_EVENT_COLUMNS]
+            counters[idx] = InterfaceSample(int(in_val), int(out_val), bits,
+                                            *(None if v is None else int(v) for v in events))
+    return counters
+
+def _net_from_values(meta, values):
+    total_recv = 0
+    total_sent = 0
+
+    for sample in _counters_from_values(meta, values).values():
+        total_recv += sample.in_octets
+        total_sent += sample.out_octets
+
+    return total_recv, total_sent
+
+async def get_cpu_loader(target_ip=TARGET_IP):
+    """
+    Calculates average CPU load.
+    OID: 1.3.6.1.2.1.25.3.3.1.2 (hrProcessorLoad)
+    Returns None if SNMP connection failed.
+    """
+    sample = await collect_sample(target_ip)
+    return None if sample is None else sample["cpu"]
+
+async def get_ram_usage(target_ip=TARGET_IP):
+    """
+    Calculates RAM usage from the Physical RAM rows of hrStorageTable.
+    Returns dict with total, used, free (in GB) and percent.
+    Returns None if SNMP connection failed.
+    """
+    sample = await collect_sample(target_ip)
+    return None if sample is None else sample["ram"]
+
+async def get_net_io_counters(target_ip=TARGET_IP):
     """
     Returns total bytes received and sent across all UP interfaces.
     Returns: (bytes_recv, bytes_sent)
+    Returns None if SNMP connection failed.
     """
-    total_recv = 0
-    total_sent = 0
-    
-    # 1. Find UP interfaces
-    # ifOperStatus: 1.3.6.1.2.1.2.2.1.8
-    status_results = snmp_walk('1.3.6.1.2.1.2.2.1.8', target_ip)
-    
-    up_indices = []
-    for var, val in status_results:
-        # val=1 means Up
-        if val == 1: 
-            idx = str(var).split('.')[-1]
-            up_indices.append(idx)
-            
-    if not up_indices:
-        return 0, 0
-        
-    # 2. Sum Octets for UP interfaces
-    for idx in up_indices:
-        # ifInOctets: 1.3.6.1.2.1.2.2.1.10.idx
-        # ifOutOctets: 1.3.6.1.2.1.2.2.1.16.idx
-        try:
-            in_res = snmp_walk(f'1.3.6.1.2.1.2.2.1.10.{idx}', target_ip)
-            out_res = snmp_walk(f'1.3.6.1.2.1.2.2.1.16.{idx}', target_ip)
-            
-            if in_res: total_recv += int(in_res[0][1])
-            if out_res: total_sent += int(out_res[0][1])
-        except:
-            pass
-            
-    return total_recv, total_sent
+    sample = await collect_sample(target_ip)
+    return None if sample is None else sample["net"]
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+SUBSCRIBER_QUEUE_SIZE = 256     # frames buffered per client before it is dropped
+KEEPALIVE_INTERVAL = 15.0       # seconds between SSE comments on an idle stream
+RECONNECT_DELAY_MS = 3000       # EventSource retry hint
+
+# Topics a client can subscribe to (realtime is per target)
+TOPICS = ("devices", "alerts", "realtime")
+
+
+def sse_frame(event, data):
+    """Encode one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    __slots__ = ('queue', 'topics', 'targets')
+
+    def __init__(self, topics, targets):
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.topics = topics
+        self.targets = targets
+
+    def push(self, frame):
+        """Queue a frame; returns False when the client can't keep up"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self):
+        # Drop whatever is pending and tell the stream to end; the client
+        # reconnects and starts again from a fresh snapshot
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class StreamHub:
+    """
+    Fan-out of server events to streaming clients.
+
+    Every event is serialized once and the same frame is queued for each
+    subscriber of its topic (and, for realtime data, of its target), so the
+    cost of a poll does not grow with the number of open dashboards.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._by_topic = {topic: set() for topic in TOPICS}
+        self._by_target = {}    # target -> set of Subscriber
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, topics=TOPICS, targets=()):
+        sub = Subscriber(frozenset(topics), frozenset(targets))
+        self._subscribers.add(sub)
+        for topic in sub.topics:
+            self._by_topic[topic].add(sub)
+        if "realtime" in sub.topics:
+            for target in sub.targets:
+                self._by_target.setdefault(target, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self._subscribers.discard(sub)
+        for topic in sub.topics:
+            self._by_topic[topic].discard(sub)
+        for target in sub.targets:
+            subs = self._by_target.get(target)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_target[target]
+
+    def watched(self, target):
+        return target in self._by_target
+
+    def watched_targets(self):
+        return list(self._by_target)
+
+    def has_subscribers(self, topic):
+        return bool(self._by_topic[topic])
+
+    def publish(self, topic, event, data, target=None):
+        """Send an event to every subscriber of topic (and target, if given)"""
+        subs = self._by_target.get(target) if target is not None else self._by_topic[topic]
+        if not subs:
+            return
+        frame = sse_frame(event, data)
+        for sub in list(subs):
+            if not sub.push(frame):
+                self.unsubscribe(sub)
+                sub.close()
+
+    async def stream(self, sub, first_frame=None):
+        """Async generator of SSE frames for one subscriber"""
+        yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+        if first_frame is not None:
+            yield first_frame
+        while True:
+            try:
+                frame = await asyncio.wait_for(sub.queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if frame is None:
+                return
+            yield frame
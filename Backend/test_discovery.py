@@ -0,0 +1,72 @@
+"""
+Discovery scan lifecycle. Run with: python -m unittest test_discovery
+"""
+import asyncio
+import ipaddress
+import unittest
+from unittest import mock
+
+import discovery
+
+
+class FakeSniffer:
+    def __init__(self, started_callback=None, **kwargs):
+        self.started_callback = started_callback
+
+    def start(self):
+        self.started_callback()
+
+    def stop(self):
+        pass
+
+
+class ArpFailureTest(unittest.IsolatedAsyncioTestCase):
+    async def test_snmp_sweep_finishes_when_arp_send_fails(self):
+        sweep_done = asyncio.Event()
+
+        async def snmp_sweep(job, on_host):
+            await asyncio.sleep(0.05)
+            sweep_done.set()
+
+        def send_arp(job, iface, addresses):
+            raise PermissionError("Operation not permitted")
+
+        network = ipaddress.ip_network("192.0.2.0/30")
+        job = discovery.ScanJob(["192.0.2.0/30"], timeout=0)
+        with mock.patch.object(discovery, "_arp_interfaces", return_value={"eth0": [network]}), \
+                mock.patch.object(discovery, "_send_arp", send_arp), \
+                mock.patch.object(discovery, "_snmp_sweep", snmp_sweep), \
+                mock.patch("scapy.all.AsyncSniffer", FakeSniffer), \
+                mock.patch("scapy.all.get_if_hwaddr", return_value="02:00:00:00:00:01"):
+            await discovery.run_scan(job)
+
+        self.assertTrue(sweep_done.is_set())
+        self.assertEqual(job.status, "done")
+        self.assertIn("Operation not permitted", job.error)
+        # Addresses ARP never asked about are not counted as ARP-probed
+        self.assertEqual(job.arp_networks, [])
+
+    async def test_failing_probe_cancels_the_other(self):
+        sweep = asyncio.Event()
+
+        async def snmp_sweep(job, on_host):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                sweep.set()
+                raise
+
+        async def arp_scan(job, on_host):
+            raise RuntimeError("boom")
+
+        job = discovery.ScanJob(["192.0.2.0/30"], timeout=0)
+        with mock.patch.object(discovery, "_arp_scan", arp_scan), \
+                mock.patch.object(discovery, "_snmp_sweep", snmp_sweep):
+            await discovery.run_scan(job)
+
+        self.assertTrue(sweep.is_set())
+        self.assertEqual(job.status, "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
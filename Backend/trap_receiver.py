@@ -0,0 +1,188 @@
+"""
+SNMP trap / inform listener.
+
+Receives SNMPv1 Trap, SNMPv2c Trap and Inform PDUs on a UDP socket owned
+by the event loop, acknowledges Informs with a Response PDU, and hands
+every notification to a callback as a Trap with a v2-style trap OID
+(v1 traps are translated as in RFC 3584), so consumers see one format.
+"""
+import asyncio
+import os
+import time
+
+import snmp_codec
+from snmp_codec import SnmpCodecError
+
+TRAP_PORT = int(os.getenv("NMS_TRAP_PORT", "162"))        # 0 disables the listener
+TRAP_BIND = os.getenv("NMS_TRAP_BIND", "0.0.0.0")
+# Accepted communities (comma-separated); empty accepts any
+TRAP_COMMUNITIES = {c.encode() for c in os.getenv("NMS_TRAP_COMMUNITIES", "").split(",") if c}
+
+OID_SYS_UPTIME = '1.3.6.1.2.1.1.3.0'
+OID_SNMP_TRAP_OID = '1.3.6.1.6.3.1.1.4.1.0'
+OID_SNMP_TRAP_ENTERPRISE = '1.3.6.1.6.3.1.1.4.3.0'
+OID_SNMP_TRAPS = '1.3.6.1.6.3.1.1.5'        # coldStart.1 ... authenticationFailure.5
+
+# Standard notifications
+TRAP_COLD_START = OID_SNMP_TRAPS + '.1'
+TRAP_WARM_START = OID_SNMP_TRAPS + '.2'
+TRAP_LINK_DOWN = OID_SNMP_TRAPS + '.3'
+TRAP_LINK_UP = OID_SNMP_TRAPS + '.4'
+TRAP_AUTH_FAILURE = OID_SNMP_TRAPS + '.5'
+
+OID_IF_INDEX = '1.3.6.1.2.1.2.2.1.1'
+OID_IF_DESCR = '1.3.6.1.2.1.2.2.1.2'
+
+
+class Trap:
+    """One received notification"""
+
+    __slots__ = ('source', 'agent', 'version', 'community', 'trap_oid', 'uptime',
+                 'varbinds', 'inform', 'received_at')
+
+    def __init__(self, source, agent, version, community, trap_oid, uptime, varbinds, inform=False):
+        self.source = source            # IP the datagram came from
+        self.agent = agent              # agent address (v1 agent-addr, else source)
+        self.version = version
+        self.community = community
+        self.trap_oid = trap_oid        # snmpTrapOID, e.g. TRAP_LINK_DOWN
+        self.uptime = uptime            # sysUpTime of the agent (ticks)
+        self.varbinds = varbinds        # [(oid, value)] without sysUpTime/snmpTrapOID
+        self.inform = inform
+        self.received_at = time.time()
+
+    def value(self, prefix):
+        """First varbind value whose OID starts with prefix (e.g. ifIndex.N), or None"""
+        prefix += '.'
+        for oid, value in self.varbinds:
+            if oid.startswith(prefix):
+                return value
+        return None
+
+    @property
+    def if_index(self):
+        value = self.value(OID_IF_INDEX)
+        if value is not None:
+            return int(value)
+        # Without an ifIndex varbind, the index is the last arc of ifDescr.N etc.
+        for oid, _ in self.varbinds:
+            if oid.startswith('1.3.6.1.2.1.2.2.1.'):
+                return int(oid.rsplit('.', 1)[-1])
+        return None
+
+    def to_dict(self):
+        return {
+            "source": self.source,
+            "agent": self.agent,
+            "version": "v1" if self.version == snmp_codec.VERSION_1 else "v2c",
+            "trapOid": self.trap_oid,
+            "uptime": self.uptime,
+            "inform": self.inform,
+            "varbinds": [[oid, _display(value)] for oid, value in self.varbinds],
+            "receivedAt": self.received_at,
+        }
+
+
+def _display(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if snmp_codec.is_exception(value) or value is snmp_codec.Null:
+        return None
+    return value
+
+
+def v1_trap_oid(msg):
+    """snmpTrapOID of a v1 trap (RFC 3584 section 3.1)"""
+    if msg.generic_trap != 6:
+        return f"{OID_SNMP_TRAPS}.{msg.generic_trap + 1}"
+    return f"{msg.enterprise}.0.{msg.specific_trap}"
+
+
+def parse_trap(msg, source):
+    """Trap from a decoded message, or None if it isn't a notification"""
+    if msg.pdu_type == snmp_codec.TRAP_V1:
+        agent = msg.agent_addr if msg.agent_addr and msg.agent_addr != '0.0.0.0' else source
+        return Trap(source, agent, msg.version, msg.community, v1_trap_oid(msg), msg.timestamp,
+                    list(msg.varbinds))
+    if msg.pdu_type not in (snmp_codec.TRAP_V2, snmp_codec.INFORM_REQUEST):
+        return None
+    uptime, trap_oid, varbinds = None, None, []
+    for oid, value in msg.varbinds:
+        if oid == OID_SYS_UPTIME:
+            uptime = int(value)
+        elif oid == OID_SNMP_TRAP_OID:
+            trap_oid = str(value)
+        else:
+            varbinds.append((oid, value))
+    if trap_oid is None:
+        return None
+    return Trap(source, source, msg.version, msg.community, trap_oid, uptime, varbinds,
+                inform=msg.pdu_type == snmp_codec.INFORM_REQUEST)
+
+
+class _TrapProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver._on_datagram(data, addr)
+
+
+class TrapReceiver:
+    """
+    Listens for notifications and calls on_trap(trap) for each one.
+    Stats: received, informs, rejected (wrong community), malformed.
+    """
+
+    def __init__(self, on_trap, port=TRAP_PORT, host=TRAP_BIND, communities=None):
+        self.on_trap = on_trap
+        self.port = port
+        self.host = host
+        self.communities = TRAP_COMMUNITIES if communities is None else communities
+        self.stats = {"received": 0, "informs": 0, "rejected": 0, "malformed": 0}
+        self._transport = None
+
+    @property
+    def listening(self):
+        return self._transport is not None
+
+    async def start(self):
+        if self._transport is not None or not self.port:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _TrapProtocol(self), local_addr=(self.host, self.port))
+        except OSError as e:
+            # Port 162 needs privileges; the rest of the app works without traps
+            print(f"Trap receiver disabled ({self.host}:{self.port}): {e}")
+
+    def stop(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _on_datagram(self, data, addr):
+        try:
+            msg = snmp_codec.decode_message(data)
+            trap = parse_trap(msg, addr[0])
+        except (SnmpCodecError, ValueError):
+            self.stats["malformed"] += 1
+            return
+        if trap is None:
+            self.stats["malformed"] += 1
+            return
+        if self.communities and msg.community not in self.communities:
+            self.stats["rejected"] += 1
+            return
+
+        if trap.inform:
+            # Acknowledge first, so the sender stops retransmitting even if handling fails
+            self.stats["informs"] += 1
+            self._transport.sendto(snmp_codec.encode_message(
+                msg.version, msg.community, snmp_codec.RESPONSE, msg.request_id, msg.varbinds), addr)
+        self.stats["received"] += 1
+        try:
+            self.on_trap(trap)
+        except Exception as e:
+            print(f"Trap handler error for {trap.source}: {e}")
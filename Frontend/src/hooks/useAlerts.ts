@@ -1,7 +1,8 @@
-// Custom hook for managing alerts state with auto-refresh
+// Custom hook for managing alerts state with live updates from /api/stream
 import { useState, useEffect, useCallback } from 'react';
 import { Alert } from '@/lib/types';
 import { fetchAlerts, acknowledgeAlert as apiAcknowledgeAlert, acknowledgeAllAlerts as apiAcknowledgeAllAlerts } from '@/lib/api';
+import { nmsStream, streamSupported, StreamEvent } from '@/lib/stream';
 
 interface UseAlertsReturn {
     alerts: Alert[];
@@ -15,9 +16,10 @@ interface UseAlertsReturn {
     infoCount: number;
 }
 
+// refreshInterval is only used for polling when the browser has no EventSource
 export function useAlerts(autoRefresh: boolean = true, refreshInterval: number = 10000): UseAlertsReturn {
-    const [alerts, setAlerts] = useState<Alert[]>([]);
-    const [loading, setLoading] = useState(true);
+    const [alerts, setAlerts] = useState<Alert[]>(() => nmsStream.alerts);
+    const [loading, setLoading] = useState(!nmsStream.connected);
     const [error, setError] = useState<string | null>(null);
 
     const refresh = useCallback(async () => {
@@ -56,12 +58,23 @@ export function useAlerts(autoRefresh: boolean = true, refreshInterval: number =
     }, []);
 
     useEffect(() => {
-        refresh();
-
-        if (autoRefresh) {
-            const interval = setInterval(refresh, refreshInterval);
-            return () => clearInterval(interval);
+        if (!autoRefresh || !streamSupported()) {
+            refresh();
+            if (autoRefresh) {
+                const interval = setInterval(refresh, refreshInterval);
+                return () => clearInterval(interval);
+            }
+            return;
         }
+
+        if (!nmsStream.connected) refresh();
+
+        return nmsStream.subscribe((event: StreamEvent) => {
+            if (event === 'snapshot' || event === 'alert' || event === 'alert_ack') {
+                setAlerts(nmsStream.alerts);
+                setLoading(false);
+            }
+        });
     }, [refresh, autoRefresh, refreshInterval]);
 
     const criticalCount = alerts.filter(a => a.severity === 'critical' && !a.acknowledged).length;
@@ -1,7 +1,8 @@
-// Custom hook for managing devices state with auto-refresh
+// Custom hook for managing devices state with live updates from /api/stream
 import { useState, useEffect, useCallback } from 'react';
 import { Device, DeviceStats } from '@/lib/types';
 import { fetchDevices, scanLan, fetchStats } from '@/lib/api';
+import { nmsStream, streamSupported, StreamEvent } from '@/lib/stream';
 
 interface UseDevicesReturn {
     devices: Device[];
@@ -21,10 +22,11 @@ const defaultStats: DeviceStats = {
     avgLatency: 0,
 };
 
+// refreshInterval is only used for polling when the browser has no EventSource
 export function useDevices(autoRefresh: boolean = true, refreshInterval: number = 10000): UseDevicesReturn {
-    const [devices, setDevices] = useState<Device[]>([]);
-    const [stats, setStats] = useState<DeviceStats>(defaultStats);
-    const [loading, setLoading] = useState(true);
+    const [devices, setDevices] = useState<Device[]>(() => Array.from(nmsStream.devices.values()));
+    const [stats, setStats] = useState<DeviceStats>(() => nmsStream.stats || defaultStats);
+    const [loading, setLoading] = useState(!nmsStream.connected);
     const [error, setError] = useState<string | null>(null);
 
     const refresh = useCallback(async () => {
@@ -59,12 +61,27 @@ export function useDevices(autoRefresh: boolean = true, refreshInterval: number
     }, [refresh]);
 
     useEffect(() => {
-        refresh();
-
-        if (autoRefresh) {
-            const interval = setInterval(refresh, refreshInterval);
-            return () => clearInterval(interval);
+        if (!autoRefresh || !streamSupported()) {
+            refresh();
+            if (autoRefresh) {
+                const interval = setInterval(refresh, refreshInterval);
+                return () => clearInterval(interval);
+            }
+            return;
         }
+
+        // Already-open stream: its state is current; otherwise wait for the snapshot
+        if (!nmsStream.connected) refresh();
+
+        return nmsStream.subscribe((event: StreamEvent) => {
+            if (event === 'snapshot' || event === 'device' || event === 'devices' || event === 'device_removed') {
+                setDevices(Array.from(nmsStream.devices.values()));
+                setLoading(false);
+            }
+            if ((event === 'snapshot' || event === 'stats') && nmsStream.stats) {
+                setStats(nmsStream.stats);
+            }
+        });
     }, [refresh, autoRefresh, refreshInterval]);
 
     return { devices, stats, loading, error, refresh, scanNetwork };
@@ -1,7 +1,8 @@
-// Custom hook for real-time data with auto-refresh
+// Custom hook for real-time data pushed over /api/stream
 import { useState, useEffect, useCallback } from 'react';
 import { RealtimeData, TrafficDataPoint } from '@/lib/types';
 import { fetchRealtime } from '@/lib/api';
+import { nmsStream, streamSupported, StreamEvent } from '@/lib/stream';
 
 interface UseRealtimeReturn {
     data: RealtimeData | null;
@@ -11,44 +12,77 @@ interface UseRealtimeReturn {
     refresh: () => Promise<void>;
 }
 
+// The backend samples each target once per poll and pushes the result to every
+// viewer; refreshInterval is only used for polling when EventSource is missing.
 export function useRealtime(target: string = '127.0.0.1', refreshInterval: number = 1000): UseRealtimeReturn {
     const [data, setData] = useState<RealtimeData | null>(null);
     const [trafficHistory, setTrafficHistory] = useState<TrafficDataPoint[]>([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
 
+    const apply = useCallback((realtimeData: RealtimeData) => {
+        setData(realtimeData);
+
+        // Add to traffic history
+        const now = new Date();
+        const timeStr = now.toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
+
+        setTrafficHistory(prev => {
+            const newHistory = [...prev, {
+                time: timeStr,
+                inbound: realtimeData.net_in_mbps,
+                outbound: realtimeData.net_out_mbps,
+            }];
+            // Keep last 60 data points
+            return newHistory.slice(-60);
+        });
+    }, []);
+
     const refresh = useCallback(async () => {
         try {
             setError(null);
-            const realtimeData = await fetchRealtime(target);
-            setData(realtimeData);
-
-            // Add to traffic history
-            const now = new Date();
-            const timeStr = now.toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
-
-            setTrafficHistory(prev => {
-                const newHistory = [...prev, {
-                    time: timeStr,
-                    inbound: realtimeData.net_in_mbps,
-                    outbound: realtimeData.net_out_mbps,
-                }];
-                // Keep last 60 data points
-                return newHistory.slice(-60);
-            });
+            apply(await fetchRealtime(target));
         } catch (err) {
             setError(err instanceof Error ? err.message : 'Failed to fetch realtime data');
             console.error('Error fetching realtime data:', err);
         } finally {
             setLoading(false);
         }
-    }, [target]);
+    }, [target, apply]);
 
     useEffect(() => {
-        refresh();
-        const interval = setInterval(refresh, refreshInterval);
-        return () => clearInterval(interval);
-    }, [refresh, refreshInterval]);
+        if (!streamSupported()) {
+            refresh();
+            const interval = setInterval(refresh, refreshInterval);
+            return () => clearInterval(interval);
+        }
+
+        // Last sample shown; realtime events for other targets leave it unchanged
+        let shown = nmsStream.realtime.get(target);
+        if (shown) {
+            apply(shown);
+            setLoading(false);
+        }
+
+        const unwatch = nmsStream.watch(target);
+        const unsubscribe = nmsStream.subscribe((event: StreamEvent) => {
+            if (event === 'error') {
+                setError('Live connection lost, reconnecting...');
+                return;
+            }
+            const latest = nmsStream.realtime.get(target);
+            if ((event === 'realtime' || event === 'snapshot') && latest && latest !== shown) {
+                shown = latest;
+                setError(null);
+                apply(latest);
+                setLoading(false);
+            }
+        });
+        return () => {
+            unsubscribe();
+            unwatch();
+        };
+    }, [target, refresh, apply, refreshInterval]);
 
     return { data, trafficHistory, loading, error, refresh };
 }
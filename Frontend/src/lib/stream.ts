@@ -0,0 +1,139 @@
+// Shared live connection to /api/stream (Server-Sent Events)
+// One EventSource per browser tab, whatever the number of hooks using it.
+// The server sends a snapshot on connect and deltas afterwards; the latest
+// state is kept here so hooks mounted later start from current data.
+import { Device, Alert, RealtimeData, DeviceStats } from './types';
+
+const API_BASE = '/api';
+const MAX_ALERTS = 100;
+
+export type StreamEvent = 'snapshot' | 'realtime' | 'device' | 'devices' | 'device_removed' | 'stats' | 'alert' | 'alert_ack' | 'error';
+
+type Listener = (event: StreamEvent) => void;
+
+interface Snapshot {
+    devices?: Device[];
+    stats?: DeviceStats;
+    alerts?: Alert[];
+    realtime?: Record<string, RealtimeData & { target: string }>;
+}
+
+export function streamSupported(): boolean {
+    return typeof window !== 'undefined' && 'EventSource' in window;
+}
+
+class NmsStream {
+    devices = new Map<string, Device>();
+    alerts: Alert[] = [];
+    stats: DeviceStats | null = null;
+    realtime = new Map<string, RealtimeData>();
+    connected = false;
+
+    private source: EventSource | null = null;
+    private listeners = new Set<Listener>();
+    private targets = new Map<string, number>();  // target -> number of hooks watching it
+    private reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+
+    subscribe(listener: Listener): () => void {
+        this.listeners.add(listener);
+        this.scheduleConnect();
+        return () => {
+            this.listeners.delete(listener);
+            if (this.listeners.size === 0) this.scheduleConnect();
+        };
+    }
+
+    watch(target: string): () => void {
+        const count = this.targets.get(target) || 0;
+        this.targets.set(target, count + 1);
+        if (count === 0) this.scheduleConnect();
+        return () => {
+            const remaining = (this.targets.get(target) || 1) - 1;
+            if (remaining > 0) {
+                this.targets.set(target, remaining);
+            } else {
+                this.targets.delete(target);
+                this.realtime.delete(target);
+                this.scheduleConnect();
+            }
+        };
+    }
+
+    // Batches subscription changes made in the same render into one reconnect
+    private scheduleConnect() {
+        if (this.reconnectTimer) return;
+        this.reconnectTimer = setTimeout(() => {
+            this.reconnectTimer = null;
+            this.connect();
+        }, 0);
+    }
+
+    private connect() {
+        this.source?.close();
+        this.source = null;
+        this.connected = false;
+        if (this.listeners.size === 0 || !streamSupported()) return;
+
+        const params = new URLSearchParams();
+        this.targets.forEach((_, target) => params.append('targets', target));
+        const source = new EventSource(`${API_BASE}/stream?${params.toString()}`);
+        this.source = source;
+
+        const on = (event: StreamEvent, handler: (data: any) => void) => {
+            source.addEventListener(event, (e) => {
+                handler(JSON.parse((e as MessageEvent).data));
+                this.emit(event);
+            });
+        };
+
+        on('snapshot', (data: Snapshot) => {
+            this.connected = true;
+            if (data.devices) this.devices = new Map(data.devices.map(d => [d.id, d]));
+            if (data.stats) this.stats = data.stats;
+            if (data.alerts) this.alerts = data.alerts;
+            if (data.realtime) {
+                Object.entries(data.realtime).forEach(([target, value]) => this.realtime.set(target, value));
+            }
+        });
+        on('realtime', (data: RealtimeData & { target: string }) => {
+            this.realtime.set(data.target, data);
+        });
+        on('device', (data: Device) => {
+            this.devices = new Map(this.devices).set(data.id, data);
+        });
+        on('devices', (data: Device[]) => {
+            this.devices = new Map(data.map(d => [d.id, d]));
+        });
+        on('device_removed', (data: { id: string }) => {
+            const next = new Map(this.devices);
+            next.delete(data.id);
+            this.devices = next;
+        });
+        on('stats', (data: DeviceStats) => {
+            this.stats = data;
+        });
+        // Repeats and clears of an active alert are sent again with the same id
+        on('alert', (data: Alert) => {
+            const known = this.alerts.some(a => a.id === data.id);
+            this.alerts = known
+                ? this.alerts.map(a => a.id === data.id ? data : a)
+                : [data, ...this.alerts].slice(0, MAX_ALERTS);
+        });
+        on('alert_ack', (data: { ids?: string[]; all?: boolean }) => {
+            const ids = new Set(data.ids || []);
+            this.alerts = this.alerts.map(a => (data.all || ids.has(a.id)) ? { ...a, acknowledged: true } : a);
+        });
+
+        // EventSource reconnects by itself; the next snapshot resyncs the state
+        source.onerror = () => {
+            this.connected = false;
+            this.emit('error');
+        };
+    }
+
+    private emit(event: StreamEvent) {
+        this.listeners.forEach(listener => listener(event));
+    }
+}
+
+export const nmsStream = new NmsStream();
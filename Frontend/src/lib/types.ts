@@ -9,8 +9,13 @@ export interface Device {
     uptime: string;
     cpuLoad: number;
     memoryUsage: number;
-    lastResponse: number;
+    lastResponse: number;   // average ping RTT in ms (0 = not measured or no reply)
+    rttMin?: number | null;
+    rttMax?: number | null;
+    packetLoss?: number | null;
     vendor: string;
+    lastPolled?: string;
+    pollInterval?: number | null;
 }
 
 export interface Alert {
@@ -21,6 +26,10 @@ export interface Alert {
     message: string;
     acknowledged: boolean;
     oid?: string;
+    condition?: string;
+    count?: number;
+    lastSeen?: string;
+    cleared?: boolean;
 }
 
 export interface RealtimeData {
@@ -31,6 +40,7 @@ export interface RealtimeData {
     ram_usage_percent: number;
     net_in_mbps: number;
     net_out_mbps: number;
+    lastPolled?: string;
 }
 
 export interface DeviceStats {
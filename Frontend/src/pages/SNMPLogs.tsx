@@ -170,7 +170,7 @@ const SNMPLogs = () => {
                                             <TableCell><Icon className={cn('w-5 h-5', alert.severity === 'critical' && 'text-nms-offline', alert.severity === 'warning' && 'text-nms-warning', alert.severity === 'info' && 'text-nms-info')} /></TableCell>
                                             <TableCell className="font-mono text-sm">{alert.timestamp}</TableCell>
                                             <TableCell>{alert.source}</TableCell>
-                                            <TableCell>{alert.message}</TableCell>
+                                            <TableCell>{alert.message}{(alert.count ?? 1) > 1 && <Badge variant="secondary" className="ml-2" title={`Last seen ${alert.lastSeen}`}>×{alert.count}</Badge>}</TableCell>
                                             <TableCell>{alert.acknowledged ? <Badge variant="secondary">ACK</Badge> : <Badge variant="outline" className="border-nms-warning text-nms-warning">NEW</Badge>}</TableCell>
                                             <TableCell>{!alert.acknowledged && <Button variant="ghost" size="icon" onClick={() => handleAcknowledge(alert.id)}><CheckCircle className="w-4 h-4 text-nms-online" /></Button>}</TableCell>
                                         </TableRow>